@@ -8,11 +8,19 @@ from telethon import TelegramClient, events, Button
 # Import configuration
 from config import (
     API_ID, API_HASH, BOT_TOKEN, SOURCE_GROUP_ID, 
-    ADMIN_USER_ID, DB_PATH, TARGET_CHANNEL_ID, validate_config
+    ADMIN_USER_ID, DB_PATH, TARGET_CHANNEL_ID, JOB_WORKERS, TIMEZONE, SCHEDULE_CATCHUP, SCHEDULE_STAGE_LEAD,
+    PUBLISH_RATE_PER_MINUTE, PUBLISH_BURST, MEDIA_TEMP_DIR, ENGAGEMENT_REFRESH_MINUTES, ENGAGEMENT_MAX_AGE_DAYS,
+    validate_config
 )
 
 # Import database
 from database.db import Database
+from core.job_queue import JobQueue
+from core.publisher import Publisher
+from core.publish_queue import PublishQueue
+from core.scheduler import ScheduleEngine
+from core.dedup import get_dedup_index
+from core.engagement import EngagementCollector
 
 # Import handlers
 from handlers import menu, books, content, schedule, stats, settings, env_settings, hashtags, footer
@@ -21,12 +29,28 @@ from handlers import menu, books, content, schedule, stats, settings, env_settin
 from utils.helpers import parse_callback_data, is_admin
 from utils.env_manager import EnvManager
 from utils.state_manager import StateManager
+from utils.dispatcher import UserDispatcher, shutdown_process_pool
+from utils.downloader import prepare_temp_dir
+from utils.router import router
 
 
 # Initialize bot
 bot = TelegramClient('ketabrooz_bot', API_ID, API_HASH)
 db = Database(DB_PATH)
 env_manager = EnvManager('.env')
+job_queue = JobQueue(db, workers=JOB_WORKERS)
+dispatcher = UserDispatcher()
+publish_queue = PublishQueue(db, Publisher(bot, TARGET_CHANNEL_ID, db),
+                             rate_per_minute=PUBLISH_RATE_PER_MINUTE, burst=PUBLISH_BURST)
+scheduler = ScheduleEngine(db, publish_queue, TIMEZONE, SCHEDULE_CATCHUP,
+                           stage_lead=SCHEDULE_STAGE_LEAD * 60)
+engagement = EngagementCollector(db, bot, TARGET_CHANNEL_ID, interval=ENGAGEMENT_REFRESH_MINUTES * 60,
+                                 max_age_days=ENGAGEMENT_MAX_AGE_DAYS)
+job_queue.register('process_book', lambda job: books.process_book_job(db, bot, job['book_id']))
+job_queue.register('process_all_books', lambda job: books.process_all_books_job(db, bot))
+
+# Handler modules register their callback routes on import; fail fast on conflicts
+router.check()
 
 
 @bot.on(events.NewMessage(pattern='/start'))
@@ -40,125 +64,19 @@ async def start_handler(event):
 
 @bot.on(events.CallbackQuery)
 async def callback_handler(event):
-    """Handle all callback queries with full routing"""
+    """Route callback queries to the handlers registered with the router"""
     user_id = event.sender_id
     if not is_admin(user_id, ADMIN_USER_ID):
         await event.answer("❌ شما دسترسی ندارید.", alert=True)
         return
     
     try:
-        data = event.data.decode('utf-8')
-        
-        # --- Main & Sub-Menus ---
-        if data == 'main_menu': await menu.show_main_menu(event, db)
-        elif data == 'menu_books': await books.show_books_menu(event, db)
-        elif data == 'menu_content': await content.show_content_menu(event, db)
-        elif data == 'menu_schedule': await schedule.show_schedule_menu(event, db)
-        elif data == 'menu_stats': await stats.show_stats(event, db)
-        elif data == 'menu_settings': await settings.show_settings_menu(event, db)
-
-        # --- Books Management ---
-        elif data.startswith('books_list_'):
-            page = int(data.split('_')[-1])
-            await books.show_books_list(event, db, page)
-        elif data == 'books_scan':
-            await books.scan_group_for_pdfs(event, db, bot)
-        elif data == 'books_process':
-            await books.show_process_book_list(event, db)
-        elif data.startswith('books_process_list_'):
-            page = int(data.split('_')[-1])
-            await books.show_process_book_list(event, db, page)
-        elif data.startswith('book_process_'):
-            book_id = int(data.split('_')[-1])
-            await books.process_existing_book(event, db, bot, book_id)
-        elif data.startswith('book_view_'):
-            book_id = int(data.split('_')[-1])
-            await books.show_book_details(event, db, book_id)
-        elif data.startswith('book_analyze_'):
-            book_id = int(data.split('_')[-1])
-            await books.analyze_book_content(event, db, bot, book_id)
-
-        # --- Content Management ---
-        elif data.startswith('content_pending_'):
-            page = int(data.split('_')[-1])
-            await content.show_pending_content(event, db, page)
-        elif data.startswith('content_approved_'):
-            page = int(data.split('_')[-1])
-            await content.show_approved_content(event, db, page)
-        elif data.startswith('content_published_'):
-            page = int(data.split('_')[-1])
-            await content.show_published_content(event, db, page)
-        elif data.startswith('content_approve_'):
-            content_id = int(data.split('_')[-1])
-            await content.approve_content(event, db, content_id)
-        elif data.startswith('content_reject_'):
-            content_id = int(data.split('_')[-1])
-            await content.reject_content(event, db, content_id)
-        elif data.startswith('content_publish_confirm_'):
-            content_id = int(data.split('_')[-1])
-            await content.publish_content_to_channel(event, db, bot, content_id)
-        elif data.startswith('content_view_'):
-            content_id = int(data.split('_')[-1])
-            await content.show_content_for_approval(event, db, content_id)
-        elif data == 'content_manual':
-            await content.show_manual_content_form(event, db)
-        elif data == 'content_ai_generate':
-            await content.show_ai_content_generator(event, db, bot)
-        elif data == 'ai_generate_quote':
-            await content.generate_ai_content(event, db, bot, 'quote')
-        elif data == 'ai_generate_description':
-            await content.generate_ai_content(event, db, bot, 'description')
-        elif data == 'ai_generate_summary':
-            await content.generate_ai_content(event, db, bot, 'summary')
-
-        # --- Schedule & Stats ---
-        elif data == 'schedule_add': await schedule.show_add_schedule_form(event, db)
-        elif data == 'schedule_list': await schedule.show_schedule_list(event, db)
-        elif data == 'stats_refresh': await stats.show_stats(event, db)
-        elif data == 'stats_full': await stats.show_full_stats(event, db)
-
-        # --- Detailed Settings (DB Settings) ---
-        elif data == 'settings_ai': await settings.show_ai_settings(event, db)
-        elif data == 'settings_design': await settings.show_design_settings(event, db)
-        elif data == 'settings_content': await settings.show_content_settings(event, db)
-        elif data.startswith('set_edit_'):
-            key = data.replace('set_edit_', '')
-            label_map = {
-                'ai_model': 'مدل AI', 'quote_count': 'تعداد نقل‌قول',
-                'summary_length_min': 'حداقل خلاصه', 'summary_length_max': 'حداکثر خلاصه',
-                'design_template': 'قالب طراحی', 'font_size': 'اندازه فونت', 'bg_color': 'رنگ پس‌زمینه'
-            }
-            await settings.start_edit_setting(event, db, key, label_map.get(key, key))
-
-        # --- Hashtags & Footer ---
-        elif data == 'hashtags_menu': await hashtags.show_hashtags_menu(event, db)
-        elif data == 'hashtag_add': await hashtags.show_add_hashtag_form(event, db)
-        elif data == 'hashtag_list': await hashtags.show_hashtags_list(event, db, 1, 'all')
-        elif data == 'hashtag_approved': await hashtags.show_hashtags_list(event, db, 1, 'approved')
-        elif data == 'hashtag_pending': await hashtags.show_hashtags_list(event, db, 1, 'pending')
-        elif data.startswith('hashtag_approve_'):
-            await hashtags.approve_hashtag(event, db, int(data.split('_')[-1]))
-        elif data.startswith('hashtag_delete_'):
-            await hashtags.delete_hashtag(event, db, int(data.split('_')[-1]))
-
-        elif data == 'footer_settings': await footer.show_footer_settings(event, db)
-        elif data == 'footer_toggle_id': await footer.toggle_footer_id(event, db)
-        elif data == 'footer_edit_format': await footer.show_edit_footer_format(event, db)
-        elif data == 'footer_edit_custom': await footer.show_edit_footer_custom(event, db)
-
-        # --- Env Settings (.env) ---
-        elif data == 'env_settings': await env_settings.show_env_settings_menu(event, env_manager)
-        elif data == 'env_telegram': await env_settings.show_env_category(event, env_manager, 'telegram')
-        elif data == 'env_groups': await env_settings.show_env_category(event, env_manager, 'groups')
-        elif data == 'env_openrouter': await env_settings.show_env_category(event, env_manager, 'openrouter')
-        elif data == 'env_database': await env_settings.show_env_category(event, env_manager, 'database')
-        elif data == 'env_other': await env_settings.show_env_category(event, env_manager, 'other')
-        elif data == 'env_view_all': await env_settings.show_all_env_vars(event, env_manager)
-        elif data.startswith('env_edit_'):
-            await env_settings.start_edit_env_var(event, env_manager, data.replace('env_edit_', ''))
-        
-        elif data == 'noop': await event.answer()
-        else: await event.answer("دستور نامعتبر است.", alert=True)
+        handled = await router.dispatch(
+            event, event.data, db=db, bot=bot, job_queue=job_queue, env_manager=env_manager,
+            publish_queue=publish_queue, scheduler=scheduler
+        )
+        if not handled:
+            await event.answer("دستور نامعتبر است.", alert=True)
 
     except Exception as e:
         print(f"Callback error: {e}")
@@ -176,10 +94,18 @@ async def cancel_handler(event):
 
 @bot.on(events.NewMessage(func=lambda e: e.is_private and not e.message.text.startswith('/')))
 async def global_input_handler(event):
-    """Smart input handler for all states and content"""
+    """Queue private messages per admin so each admin's input is handled in order"""
     user_id = event.sender_id
     if not is_admin(user_id, ADMIN_USER_ID): return
 
+    if not dispatcher.submit(user_id, lambda: handle_private_message(event)):
+        await event.respond("⏳ پیام‌های قبلی شما هنوز در حال پردازش است. لطفا کمی صبر کنید.")
+
+
+async def handle_private_message(event):
+    """Smart input handler for all states and content"""
+    user_id = event.sender_id
+
     # 0. Check if PDF file - highest priority for file handling
     if event.message.media:
         # Check if it's a PDF file
@@ -200,6 +126,9 @@ async def global_input_handler(event):
     if user_id in footer.pending_footer_edits:
         if await footer.handle_footer_input(event, db): return
 
+    if StateManager.is_waiting(user_id, 'ADD_SCHEDULE'):
+        if await schedule.handle_schedule_input(event, db, scheduler): return
+
     # 2. Specific Functional Input
     if event.message.text and event.message.text.startswith('#'):
         if await hashtags.handle_hashtag_input(event, db): return
@@ -214,9 +143,29 @@ async def main():
     """Start the bot"""
     validate_config()
     print("🤖 Bot is starting...")
+    prepare_temp_dir(MEDIA_TEMP_DIR)
     await bot.start(bot_token=BOT_TOKEN)
     print("✅ Bot is online!")
-    await bot.run_until_disconnected()
+    # Jobs interrupted by the last shutdown are resumed; their books start over
+    reset = db.reset_interrupted_books()
+    if reset:
+        print(f"🔄 Reset {reset} interrupted book(s) to pending")
+    await job_queue.start()
+    await publish_queue.start()
+    scheduler.start()
+    engagement.start()
+    # Load the near-duplicate index off the event loop before the first AI request needs it
+    dedup_load = asyncio.create_task(get_dedup_index(db).sync_async())
+    try:
+        await bot.run_until_disconnected()
+    finally:
+        dedup_load.cancel()
+        await engagement.stop()
+        await scheduler.stop()
+        await publish_queue.stop()
+        await job_queue.stop()
+        await dispatcher.stop()
+        shutdown_process_pool()
 
 
 if __name__ == '__main__':
@@ -2,6 +2,7 @@
 Configuration management for KetabeRooz bot
 """
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -35,12 +36,60 @@ ADMIN_USER_ID = ADMIN_USER_IDS[0] if ADMIN_USER_IDS else 0
 # OpenRouter Configuration
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY', '')
 OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL', 'google/gemini-2.5-flash:free')
+# API root (point at tools/mock_openrouter.py for offline testing)
+OPENROUTER_BASE_URL = os.getenv('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1')
+# Retries for 429/5xx responses and connection errors
+AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', '3'))
+
+# Vision requests: image encoding ('JPEG', 'WEBP' or 'PNG') and longest edge (0 = per model default)
+VISION_IMAGE_FORMAT = os.getenv('VISION_IMAGE_FORMAT', 'JPEG').upper()
+VISION_IMAGE_FORMATS = ('JPEG', 'WEBP', 'PNG')
+VISION_MAX_EDGE = int(os.getenv('VISION_MAX_EDGE', '0'))
+
+# Background job workers (concurrent book processing jobs)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+
+# Bulk book pipeline: concurrent downloads, extraction processes (0 = by CPU count), AI workers
+PIPELINE_DOWNLOAD_WORKERS = int(os.getenv('PIPELINE_DOWNLOAD_WORKERS', '3'))
+PIPELINE_EXTRACT_WORKERS = int(os.getenv('PIPELINE_EXTRACT_WORKERS', '0'))
+PIPELINE_AI_WORKERS = int(os.getenv('PIPELINE_AI_WORKERS', '4'))
+
+# Parallel downloads: concurrent 512 KB part requests per large file
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '4'))
+
+# Temporary media files (videos, large images); leftovers are removed at startup
+MEDIA_TEMP_DIR = os.getenv('MEDIA_TEMP_DIR', os.path.join(tempfile.gettempdir(), 'ketabrooz-media'))
+# Images up to this size are watermarked in memory, larger ones spill to MEDIA_TEMP_DIR
+IMAGE_SPOOL_MB = int(os.getenv('IMAGE_SPOOL_MB', '16'))
+# Concurrent ffmpeg video watermark encodes, and the time limit of one encode (seconds)
+VIDEO_ENCODE_WORKERS = int(os.getenv('VIDEO_ENCODE_WORKERS', '1'))
+VIDEO_ENCODE_TIMEOUT = int(os.getenv('VIDEO_ENCODE_TIMEOUT', '1800'))
+# Video encode profile ('fast', 'balanced', 'quality'; see utils/watermark.py) and encoder threads (0 = auto)
+VIDEO_PROFILE = os.getenv('VIDEO_PROFILE', 'fast')
+VIDEO_ENCODE_THREADS = int(os.getenv('VIDEO_ENCODE_THREADS', '0'))
+# Video watermark: 'overlay' (pre-rendered PNG stamp) or 'drawtext'
+VIDEO_WATERMARK_MODE = os.getenv('VIDEO_WATERMARK_MODE', 'overlay')
+# Watermarked outputs kept for retries and re-posts (least recently used evicted; 0 = off)
+WATERMARK_CACHE_DIR = os.getenv('WATERMARK_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'ketabrooz-watermarks'))
+WATERMARK_CACHE_MB = int(os.getenv('WATERMARK_CACHE_MB', '1024'))
+
+# Channel publishing: sustained posts per minute and back-to-back burst (Telegram allows ~20/min)
+PUBLISH_RATE_PER_MINUTE = float(os.getenv('PUBLISH_RATE_PER_MINUTE', '20'))
+PUBLISH_BURST = int(os.getenv('PUBLISH_BURST', '3'))
+
+# Channel engagement: minutes between view/reaction collections (0 = off) and how far back posts are re-read
+ENGAGEMENT_REFRESH_MINUTES = float(os.getenv('ENGAGEMENT_REFRESH_MINUTES', '60'))
+ENGAGEMENT_MAX_AGE_DAYS = int(os.getenv('ENGAGEMENT_MAX_AGE_DAYS', '30'))
 
 # Database Configuration
 DB_PATH = os.getenv('DB_PATH', 'database/ketabrooz.db')
 
 # Settings
 TIMEZONE = os.getenv('TIMEZONE', 'Asia/Tehran')
+# Slots missed while the bot was down: 'skip', 'once' (latest only) or 'all'
+SCHEDULE_CATCHUP = os.getenv('SCHEDULE_CATCHUP', 'skip')
+# Minutes before a slot its posts are prepared and uploaded (0 = at the slot)
+SCHEDULE_STAGE_LEAD = int(os.getenv('SCHEDULE_STAGE_LEAD', '10'))
 
 # Validate required configuration
 def validate_config():
@@ -58,5 +107,9 @@ def validate_config():
     missing = [key for key, value in required.items() if not value]
     if missing:
         raise ValueError(f"Missing required configuration: {', '.join(missing)}")
+
+    if VISION_IMAGE_FORMAT not in VISION_IMAGE_FORMATS:
+        raise ValueError(f"VISION_IMAGE_FORMAT must be one of {', '.join(VISION_IMAGE_FORMATS)}, "
+                         f"not {VISION_IMAGE_FORMAT!r}")
     
     return True
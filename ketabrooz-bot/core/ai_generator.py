@@ -10,9 +10,50 @@ Recommended model: google/gemini-2.5-flash:free
 See MODELS_INFO.md for detailed model comparison
 """
 import aiohttp
+import asyncio
 import json
 import base64
-from typing import List, Dict, Any, Optional, Union
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, Optional, Union, Callable, Awaitable
+from core.json_extractor import JSONStreamExtractor, extract_json, validate_item
+from core.image_prep import prepare_image_data_url, max_edge_for_model
+from config import VISION_IMAGE_FORMAT, VISION_MAX_EDGE, OPENROUTER_BASE_URL, AI_MAX_RETRIES
+
+
+# Receives the accumulated completion text while a streamed response arrives
+ProgressCallback = Callable[[str], Awaitable[None]]
+
+
+class AIBudgetExceeded(Exception):
+    """Raised when a request would exceed the configured token budget"""
+
+
+# Responses worth retrying (rate limit and transient upstream errors)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# Process-wide request counters (attempts, retries, failed requests, by status)
+request_stats: Dict[str, Any] = {'attempts': 0, 'retries': 0, 'failures': 0, 'statuses': {}}
+
+
+# Item format and requirements used by batch (bundle) generation
+BUNDLE_ITEM_SPECS = {
+    "quote": {
+        "format": '{"quote": "...", "context": "توضیح کوتاه درباره نقل‌قول"}',
+        "rules": "نقل‌قول الهام‌بخش (2-3 جمله) که مستقیما از متن کتاب استخراج شده باشد"
+    },
+    "description": {
+        "format": '{"description": "...", "key_points": ["نکته 1", "نکته 2", "نکته 3"]}',
+        "rules": "معرفی جذاب و تشویق‌کننده (150-250 کلمه) شامل نکات کلیدی کتاب"
+    },
+    "summary": {
+        "format": '{"summary": "...", "key_points": ["نکته 1", "نکته 2", "نکته 3"], "genre": "ژانر کتاب"}',
+        "rules": "خلاصه جذاب و قابل فهم (200-300 کلمه) شامل نکات اصلی کتاب"
+    }
+}
 
 
 class AIGenerator:
@@ -25,25 +66,269 @@ class AIGenerator:
     - Vision-capable models (Gemini 2.5 Flash recommended)
     """
     
-    def __init__(self, api_key: str, model: str):
+    def __init__(self, api_key: str, model: str, db=None, book_id: Optional[int] = None,
+                 base_url: Optional[str] = None, max_retries: Optional[int] = None):
         """
         Initialize AI generator
         
         Args:
             api_key: OpenRouter API key
             model: Model name (e.g., 'google/gemini-2.5-flash:free')
+            db: Optional Database; enables usage accounting and token budgets
+            book_id: Book the requests are made for (per-book budget)
+            base_url: API root (defaults to OPENROUTER_BASE_URL)
+            max_retries: Retries for 429/5xx and connection errors (defaults to AI_MAX_RETRIES)
         """
         self.api_key = api_key
         self.model = model
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.db = db
+        self.book_id = book_id
+        self.base_url = f"{(base_url or OPENROUTER_BASE_URL).rstrip('/')}/chat/completions"
+        self.max_retries = AI_MAX_RETRIES if max_retries is None else max_retries
+    
+    def _budget(self, key: str) -> int:
+        """
+        Get a token budget setting (0 = unlimited)
+        
+        Raises:
+            AIBudgetExceeded: If the stored value is not a non-negative integer, so a
+                mistyped budget stops spending instead of being ignored
+        """
+        value = str(self.db.get_setting(key, '0') or '0').strip()
+        if not value.isdecimal():
+            print(f"Error reading {key}: invalid token budget {value!r}")
+            raise AIBudgetExceeded(f"مقدار تنظیم {key} نامعتبر است ({value}); یک عدد صحیح وارد کنید")
+        return int(value)
+    
+    def _check_budget(self):
+        """Raise AIBudgetExceeded if the daily or per-book budget is used up"""
+        if not self.db:
+            return
+        
+        daily_budget = self._budget('ai_daily_token_budget')
+        if daily_budget and self.db.get_ai_tokens_used(today_only=True) >= daily_budget:
+            raise AIBudgetExceeded(f"بودجه روزانه توکن AI ({daily_budget}) تمام شده است")
+        
+        book_budget = self._budget('ai_book_token_budget')
+        if book_budget and self.book_id is not None:
+            if self.db.get_ai_tokens_used(book_id=self.book_id) >= book_budget:
+                raise AIBudgetExceeded(f"بودجه توکن این کتاب ({book_budget}) تمام شده است")
+    
+    def _record_usage(self, model: str, usage: Optional[Dict[str, Any]], latency_ms: int,
+                      messages: List[Dict[str, Any]], completion: str,
+                      usage_type: Optional[str]):
+        """Store token usage of a request (estimated if the API sent none)"""
+        if not self.db:
+            return
+        
+        try:
+            if usage:
+                details = usage.get('prompt_tokens_details') or {}
+                self.db.add_ai_usage(
+                    model=model,
+                    prompt_tokens=usage.get('prompt_tokens', 0),
+                    completion_tokens=usage.get('completion_tokens', 0),
+                    total_tokens=usage.get('total_tokens'),
+                    cached_tokens=details.get('cached_tokens') or 0,
+                    cost=usage.get('cost'),
+                    latency_ms=latency_ms,
+                    book_id=self.book_id,
+                    content_type=usage_type
+                )
+            else:
+                # Streams closed early carry no usage block
+                self.db.add_ai_usage(
+                    model=model,
+                    prompt_tokens=self._estimate_prompt_tokens(messages),
+                    completion_tokens=self._estimate_tokens(completion),
+                    latency_ms=latency_ms,
+                    book_id=self.book_id,
+                    content_type=usage_type,
+                    is_estimated=True
+                )
+        except Exception as e:
+            print(f"Error recording AI usage: {str(e)}")
+    
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Rough token estimate (Persian averages about 3 characters per token)"""
+        return len(text) // 3 + 1 if text else 0
+    
+    @classmethod
+    def _estimate_prompt_tokens(cls, messages: List[Dict[str, Any]]) -> int:
+        """Rough token estimate of request messages"""
+        total = 0
+        for message in messages:
+            content = message.get('content')
+            if isinstance(content, str):
+                total += cls._estimate_tokens(content)
+                continue
+            for part in content or []:
+                if part.get('type') == 'text':
+                    total += cls._estimate_tokens(part.get('text', ''))
+                else:
+                    total += 800  # Typical cost of one downscaled image
+        return total
+    
+    async def _chat_completion(self, messages: List[Dict[str, Any]], model: Optional[str] = None,
+                               temperature: float = 0.7, timeout: int = 60,
+                               on_progress: Optional[ProgressCallback] = None,
+                               usage_type: Optional[str] = None) -> str:
+        """
+        Send a chat completion request and return the message content
+        
+        Args:
+            messages: Chat messages
+            model: Model name (defaults to self.model)
+            temperature: Sampling temperature
+            timeout: Total request timeout in seconds
+            on_progress: If given, the response is streamed (SSE) and the
+                callback receives the accumulated text after each chunk
+            usage_type: Content type recorded with the token usage
+        
+        Returns:
+            Completion text
+        """
+        self._check_budget()
+        
+        model = model or self.model
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "usage": {"include": True}
+        }
+        if on_progress:
+            payload["stream"] = True
+        
+        started = time.monotonic()
+        async with aiohttp.ClientSession() as session:
+            attempt = 0
+            while True:
+                request_stats['attempts'] += 1
+                retry_after = None
+                try:
+                    async with session.post(
+                        self.base_url,
+                        headers={
+                            "Authorization": f"Bearer {self.api_key}",
+                            "Content-Type": "application/json"
+                        },
+                        json=payload,
+                        timeout=aiohttp.ClientTimeout(total=timeout)
+                    ) as resp:
+                        statuses = request_stats['statuses']
+                        statuses[resp.status] = statuses.get(resp.status, 0) + 1
+                        
+                        if resp.status != 200:
+                            error_text = await resp.text()
+                            error = Exception(f"OpenRouter API error: {resp.status} - {error_text}")
+                            if resp.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                                request_stats['failures'] += 1
+                                raise error
+                            retry_after = resp.headers.get('Retry-After')
+                        elif not on_progress:
+                            data = await resp.json()
+                            content = data['choices'][0]['message']['content']
+                            usage = data.get('usage')
+                            break
+                        else:
+                            content, usage = await self._read_stream(resp, on_progress)
+                            break
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    if attempt >= self.max_retries:
+                        request_stats['failures'] += 1
+                        raise Exception(f"OpenRouter connection error: {str(e) or type(e).__name__}")
+                
+                delay = self._retry_delay(attempt, retry_after)
+                attempt += 1
+                request_stats['retries'] += 1
+                print(f"OpenRouter request failed, retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        
+        latency_ms = int((time.monotonic() - started) * 1000)
+        self._record_usage(model, usage, latency_ms, messages, content, usage_type)
+        return content
+    
+    @staticmethod
+    def _retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        Get the wait before the next attempt
+        
+        Honors a Retry-After header (seconds or HTTP date), otherwise uses
+        exponential backoff with jitter.
+        """
+        if retry_after:
+            try:
+                return min(RETRY_MAX_DELAY, max(0.0, float(retry_after)))
+            except ValueError:
+                try:
+                    retry_at = parsedate_to_datetime(retry_after).timestamp()
+                    return min(RETRY_MAX_DELAY, max(0.0, retry_at - time.time()))
+                except (TypeError, ValueError):
+                    pass
+        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+    
+    async def _read_stream(self, resp: aiohttp.ClientResponse,
+                           on_progress: ProgressCallback) -> tuple:
+        """
+        Read an SSE completion stream
+        
+        Stops as soon as the first JSON value in the output is closed, so
+        parsing can start without waiting for the model to finish talking.
+        
+        Returns:
+            Tuple of (completion text, usage dict or None)
+        """
+        parts = []
+        usage = None
+        extractor = JSONStreamExtractor()
+        buffer = b''
+        
+        async for raw in resp.content.iter_any():
+            buffer += raw
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                line = line.decode('utf-8').strip()
+                # Blank lines separate events, ':' lines are keep-alive comments
+                if not line.startswith('data:'):
+                    continue
+                
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    return ''.join(parts), usage
+                
+                chunk = json.loads(data)
+                if 'error' in chunk:
+                    raise Exception(f"OpenRouter stream error: {chunk['error']}")
+                
+                # The final chunk carries the usage block
+                usage = chunk.get('usage') or usage
+                
+                choices = chunk.get('choices') or [{}]
+                delta = (choices[0].get('delta') or {}).get('content') or ''
+                if not delta:
+                    continue
+                
+                parts.append(delta)
+                text = ''.join(parts)
+                await on_progress(text)
+                
+                if extractor.feed(delta):
+                    return text, usage
+        
+        return ''.join(parts), usage
     
-    async def generate_quotes(self, book_text: str, count: int = 5) -> List[Dict[str, str]]:
+    async def generate_quotes(self, book_text: str, count: int = 5,
+                              on_progress: Optional[ProgressCallback] = None) -> List[Dict[str, str]]:
         """
         Generate quotes from book text
         
         Args:
             book_text: Book text content
             count: Number of quotes to generate
+            on_progress: Optional streaming progress callback
         
         Returns:
             List of quote dictionaries with 'quote' and 'context' keys
@@ -61,39 +346,19 @@ class AIGenerator:
 [{{"quote": "...", "context": "..."}}, ...]"""
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url,
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.7
-                    },
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as resp:
-                    if resp.status != 200:
-                        error_text = await resp.text()
-                        raise Exception(f"OpenRouter API error: {resp.status} - {error_text}")
-                    
-                    data = await resp.json()
-                    content = data['choices'][0]['message']['content']
-                    
-                    # Extract JSON from response (might be wrapped in markdown)
-                    content = content.strip()
-                    if content.startswith('```'):
-                        # Remove markdown code blocks
-                        lines = content.split('\n')
-                        content = '\n'.join(lines[1:-1])
-                    
-                    # Parse JSON
-                    quotes = json.loads(content)
-                    return quotes if isinstance(quotes, list) else []
-        
-        except json.JSONDecodeError as e:
+            content = await self._chat_completion(
+                [{"role": "user", "content": prompt}],
+                on_progress=on_progress,
+                usage_type='quote'
+            )
+            
+            # Extract JSON from response (might be wrapped in markdown or prose)
+            quotes = extract_json(content)
+            if not isinstance(quotes, list):
+                return []
+            return [quote for quote in quotes if not validate_item('quote', quote)]
+        
+        except ValueError as e:
             print(f"Failed to parse quotes JSON: {str(e)}")
             return []
         except Exception as e:
@@ -101,7 +366,8 @@ class AIGenerator:
             return []
     
     async def generate_summary(self, book_text: str, min_words: int = 150, 
-                              max_words: int = 300) -> Dict[str, Any]:
+                              max_words: int = 300,
+                              on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
         """
         Generate book summary
         
@@ -109,6 +375,7 @@ class AIGenerator:
             book_text: Book text content
             min_words: Minimum words in summary
             max_words: Maximum words in summary
+            on_progress: Optional streaming progress callback
         
         Returns:
             Dictionary with 'summary', 'key_points', and 'genre'
@@ -126,38 +393,21 @@ class AIGenerator:
 {{"summary": "...", "key_points": ["...", "...", "..."], "genre": "..."}}"""
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url,
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.7
-                    },
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as resp:
-                    if resp.status != 200:
-                        error_text = await resp.text()
-                        raise Exception(f"OpenRouter API error: {resp.status} - {error_text}")
-                    
-                    data = await resp.json()
-                    content = data['choices'][0]['message']['content']
-                    
-                    # Extract JSON from response
-                    content = content.strip()
-                    if content.startswith('```'):
-                        lines = content.split('\n')
-                        content = '\n'.join(lines[1:-1])
-                    
-                    # Parse JSON
-                    summary = json.loads(content)
-                    return summary if isinstance(summary, dict) else {}
-        
-        except json.JSONDecodeError as e:
+            content = await self._chat_completion(
+                [{"role": "user", "content": prompt}],
+                on_progress=on_progress,
+                usage_type='summary'
+            )
+            
+            # Extract JSON from response
+            summary = extract_json(content)
+            errors = validate_item('summary', summary)
+            if errors:
+                print(f"Invalid summary JSON: {', '.join(errors)}")
+                return {}
+            return summary
+        
+        except ValueError as e:
             print(f"Failed to parse summary JSON: {str(e)}")
             return {}
         except Exception as e:
@@ -166,7 +416,9 @@ class AIGenerator:
     
     async def analyze_image(self, image_data: Union[bytes, str], 
                            prompt: Optional[str] = None,
-                           vision_model: Optional[str] = None) -> Dict[str, Any]:
+                           vision_model: Optional[str] = None,
+                           on_progress: Optional[ProgressCallback] = None,
+                           schema: Optional[str] = None) -> Dict[str, Any]:
         """
         Analyze image using vision-capable model
         
@@ -174,6 +426,9 @@ class AIGenerator:
             image_data: Image as bytes or base64 string
             prompt: Custom prompt for image analysis (if None, uses default)
             vision_model: Vision model name (if None, uses default vision model)
+            on_progress: Optional streaming progress callback
+            schema: Content schema to validate against (defaults to 'cover'
+                for the default prompt, no validation for custom prompts)
         
         Returns:
             Dictionary with analysis results
@@ -183,6 +438,7 @@ class AIGenerator:
         
         # Default prompt for book cover analysis
         if not prompt:
+            schema = schema or 'cover'
             prompt = """این تصویر جلد یک کتاب است. لطفا اطلاعات زیر را استخراج کن:
 - عنوان کتاب (اگر قابل خواندن است)
 - نام نویسنده (اگر قابل خواندن است)
@@ -193,68 +449,57 @@ class AIGenerator:
 خروجی را به صورت JSON بده:
 {"title": "...", "author": "...", "category": "...", "cover_description": "...", "tags": ["...", "..."]}"""
         
-        # Convert image to base64 if it's bytes
-        if isinstance(image_data, bytes):
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-            image_url = f"data:image/jpeg;base64,{image_base64}"
-        else:
-            # Assume it's already base64 or a URL
-            if image_data.startswith('http'):
+        try:
+            # Downscale and encode the image (base64 strings are decoded first)
+            if isinstance(image_data, str) and image_data.startswith('http'):
                 image_url = image_data
             else:
-                image_url = f"data:image/jpeg;base64,{image_data}"
-        
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url,
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": model,
-                        "messages": [
+                if isinstance(image_data, str):
+                    image_data = base64.b64decode(image_data.split(',')[-1])
+                image_url = await prepare_image_data_url(
+                    image_data,
+                    max_edge=VISION_MAX_EDGE or max_edge_for_model(model),
+                    image_format=VISION_IMAGE_FORMAT
+                )
+            
+            content = await self._chat_completion(
+                [
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": prompt
+                            },
                             {
-                                "role": "user",
-                                "content": [
-                                    {
-                                        "type": "text",
-                                        "text": prompt
-                                    },
-                                    {
-                                        "type": "image_url",
-                                        "image_url": {
-                                            "url": image_url
-                                        }
-                                    }
-                                ]
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": image_url
+                                }
                             }
-                        ],
-                        "temperature": 0.7
-                    },
-                    timeout=aiohttp.ClientTimeout(total=90)
-                ) as resp:
-                    if resp.status != 200:
-                        error_text = await resp.text()
-                        raise Exception(f"OpenRouter API error: {resp.status} - {error_text}")
-                    
-                    data = await resp.json()
-                    content = data['choices'][0]['message']['content']
-                    
-                    # Extract JSON from response
-                    content = content.strip()
-                    if content.startswith('```'):
-                        lines = content.split('\n')
-                        content = '\n'.join(lines[1:-1])
-                    
-                    # Parse JSON
-                    try:
-                        analysis = json.loads(content)
-                        return analysis if isinstance(analysis, dict) else {"description": content}
-                    except json.JSONDecodeError:
-                        # If not JSON, return as description
-                        return {"description": content}
+                        ]
+                    }
+                ],
+                model=model,
+                timeout=90,
+                on_progress=on_progress,
+                usage_type=schema or 'image'
+            )
+            
+            # Extract JSON from response
+            try:
+                analysis = extract_json(content)
+            except ValueError:
+                # If not JSON, return as description
+                return {"description": content.strip()}
+            
+            if not isinstance(analysis, dict):
+                return {"description": content.strip()}
+            
+            errors = validate_item(schema, analysis) if schema else []
+            if errors:
+                return {"error": f"Invalid response: {', '.join(errors)}"}
+            return analysis
         
         except Exception as e:
             print(f"Error analyzing image: {str(e)}")
@@ -262,7 +507,8 @@ class AIGenerator:
     
     async def generate_content_from_image(self, image_data: Union[bytes, str],
                                          content_type: str = "quote",
-                                         book_title: Optional[str] = None) -> Dict[str, Any]:
+                                         book_title: Optional[str] = None,
+                                         on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
         """
         Generate content (quote, description, etc.) from book cover image
         
@@ -270,6 +516,7 @@ class AIGenerator:
             image_data: Image as bytes or base64 string
             content_type: Type of content to generate (quote, description, summary)
             book_title: Optional book title for context
+            on_progress: Optional streaming progress callback
         
         Returns:
             Generated content dictionary
@@ -294,15 +541,18 @@ class AIGenerator:
 {{"summary": "...", "genre": "...", "target_audience": "..."}}"""
         }
         
-        prompt = prompts.get(content_type, prompts["description"])
+        if content_type not in prompts:
+            content_type = "description"
         
-        return await self.analyze_image(image_data, prompt=prompt)
+        return await self.analyze_image(image_data, prompt=prompts[content_type],
+                                        on_progress=on_progress, schema=content_type)
     
     async def generate_content_from_history(self, published_content_history: List[Dict[str, Any]], 
                                            content_type: str = "quote",
                                            book_title: Optional[str] = None,
                                            book_author: Optional[str] = None,
-                                           book_text: Optional[str] = None) -> Dict[str, Any]:
+                                           book_text: Optional[str] = None,
+                                           on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
         """
         Generate content based on published content history to learn patterns
         
@@ -311,16 +561,13 @@ class AIGenerator:
             content_type: Type of content to generate (quote, description, summary)
             book_title: Book title
             book_author: Book author
+            book_text: Optional book text to extract unique content from
+            on_progress: Optional streaming progress callback
         
         Returns:
             Generated content dictionary matching the pattern
         """
-        # Extract patterns from history
-        history_texts = []
-        for content in published_content_history[:20]:  # Use last 20 posts
-            text = content.get('text') or content.get('caption') or ''
-            if text and len(text) > 20:  # Only meaningful content
-                history_texts.append(text[:500])  # Limit length
+        history_texts = self._history_texts(published_content_history)
         
         if not history_texts:
             # If no history, use default generation
@@ -333,17 +580,8 @@ class AIGenerator:
         recent_snippets = "\n".join([f"- {t[:80]}..." for t in history_texts[:5]])
         
         # Book text context for unique content
-        book_context = ""
-        if book_text and len(book_text) > 100:
-            # Use middle section for variety (not always start)
-            text_len = len(book_text)
-            start_pos = text_len // 4  # Start from 25% into the text
-            book_chunk = book_text[start_pos:start_pos+1500]
-            book_context = f"\n\n**متن کتاب (برای استخراج محتوای منحصر به فرد):**\n{book_chunk}"
-        
-        book_info = f'"{book_title}"' if book_title else "این کتاب"
-        if book_author:
-            book_info += f" نوشته {book_author}"
+        book_context = self._book_context(book_text)
+        book_info = self._book_info(book_title, book_author)
 
         prompts = {
             "quote": f"""یک نقل‌قول کاملا جدید و منحصر به فرد از {book_info} استخراج کن.
@@ -410,44 +648,148 @@ class AIGenerator:
         prompt = prompts.get(content_type, prompts["description"])
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url,
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.9  # Higher temperature for more variety and creativity
-                    },
-                    timeout=aiohttp.ClientTimeout(total=90)
-                ) as resp:
-                    if resp.status != 200:
-                        error_text = await resp.text()
-                        raise Exception(f"OpenRouter API error: {resp.status} - {error_text}")
-                    
-                    data = await resp.json()
-                    content = data['choices'][0]['message']['content']
-                    
-                    # Extract JSON from response
-                    content = content.strip()
-                    if content.startswith('```'):
-                        lines = content.split('\n')
-                        content = '\n'.join(lines[1:-1])
-                    
-                    # Parse JSON
-                    result = json.loads(content)
-                    return result if isinstance(result, dict) else {"error": "Invalid response format"}
-        
-        except json.JSONDecodeError as e:
+            content = await self._chat_completion(
+                [{"role": "user", "content": prompt}],
+                temperature=0.9,  # Higher temperature for more variety and creativity
+                timeout=90,
+                on_progress=on_progress,
+                usage_type=content_type
+            )
+            
+            # Extract JSON from response
+            result = extract_json(content)
+            errors = validate_item(content_type if content_type in prompts else "description", result)
+            if errors:
+                return {"error": f"Invalid response format: {', '.join(errors)}"}
+            return result
+        
+        except ValueError as e:
             print(f"Failed to parse AI response JSON: {str(e)}")
             return {"error": f"Failed to parse response: {str(e)}"}
         except Exception as e:
             print(f"Error generating content from history: {str(e)}")
             return {"error": str(e)}
     
+    async def generate_bundle(self, book: Dict[str, Any], types: Optional[List[str]] = None,
+                              n_per_type: int = 1,
+                              published_content_history: Optional[List[Dict[str, Any]]] = None,
+                              book_text: Optional[str] = None,
+                              max_retries: int = 1,
+                              on_progress: Optional[ProgressCallback] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Generate several content items for one book in a single request
+        
+        The book excerpt and style examples are sent once for all types.
+        Each returned item is validated separately and only the invalid or
+        missing items are requested again.
+        
+        Args:
+            book: Book dictionary from database (title, author, notes)
+            types: Content types to generate (defaults to quote, description, summary)
+            n_per_type: Number of items per content type
+            published_content_history: Published content used as style examples
+            book_text: Book text (defaults to book notes)
+            max_retries: How many follow-up requests may be made for failed items
+            on_progress: Optional streaming progress callback
+        
+        Returns:
+            Dictionary of content type -> list of valid item dictionaries
+        """
+        types = [t for t in (types or list(BUNDLE_ITEM_SPECS)) if t in BUNDLE_ITEM_SPECS]
+        results: Dict[str, List[Dict[str, Any]]] = {t: [] for t in types}
+        missing = {t: n_per_type for t in types}
+        
+        history_texts = self._history_texts(published_content_history or [])
+        history_examples = "\n".join([f"- {text[:200]}" for text in history_texts[:5]])
+        book_context = self._book_context(book_text or book.get('notes') or '', length=3000)
+        book_info = self._book_info(book.get('title'), book.get('author'))
+        
+        for attempt in range(max_retries + 1):
+            if not any(missing.values()):
+                break
+            
+            requested = {t: count for t, count in missing.items() if count}
+            items_text = "\n".join(
+                f"- \"{t}\": آرایه‌ای از {count} مورد، هر مورد: {BUNDLE_ITEM_SPECS[t]['rules']}\n"
+                f"  قالب هر مورد: {BUNDLE_ITEM_SPECS[t]['format']}"
+                for t, count in requested.items()
+            )
+            keys_example = ", ".join(f'"{t}": [...]' for t in requested)
+            style_section = ""
+            if history_examples:
+                style_section = f"\n\n**الگوی سبک نوشتاری قبلی (فقط برای سبک، نه برای محتوا):**\n{history_examples}"
+            
+            prompt = f"""برای {book_info} محتوای کاملا جدید و منحصر به فرد تولید کن.
+{book_context}{style_section}
+
+**موارد مورد نیاز:**
+{items_text}
+
+**نیازها:**
+- همه موارد متفاوت از هم و از الگوهای بالا باشند
+- به زبان فارسی روان
+
+خروجی را فقط به صورت یک شیء JSON بده که کلیدهای آن نوع محتوا و مقدار هر کلید آرایه‌ای از موارد است:
+{{{keys_example}}}"""
+            
+            try:
+                content = await self._chat_completion(
+                    [{"role": "user", "content": prompt}],
+                    temperature=0.9,
+                    timeout=120,
+                    on_progress=on_progress,
+                    usage_type='bundle'
+                )
+                
+                bundle = extract_json(content)
+            except ValueError as e:
+                print(f"Failed to parse bundle JSON (attempt {attempt + 1}): {str(e)}")
+                continue
+            except Exception as e:
+                print(f"Error generating bundle: {str(e)}")
+                break
+            
+            if not isinstance(bundle, dict):
+                continue
+            
+            for content_type, count in requested.items():
+                items = bundle.get(content_type) or []
+                if isinstance(items, dict):
+                    items = [items]
+                valid = [item for item in items if not validate_item(content_type, item)][:count]
+                results[content_type].extend(valid)
+                missing[content_type] = count - len(valid)
+        
+        return results
+    
+    @staticmethod
+    def _history_texts(published_content_history: List[Dict[str, Any]]) -> List[str]:
+        """Extract meaningful texts from published content history"""
+        history_texts = []
+        for content in published_content_history[:20]:  # Use last 20 posts
+            text = content.get('text') or content.get('caption') or ''
+            if text and len(text) > 20:  # Only meaningful content
+                history_texts.append(text[:500])  # Limit length
+        return history_texts
+    
+    @staticmethod
+    def _book_context(book_text: Optional[str], length: int = 1500) -> str:
+        """Build the book text section of a prompt"""
+        if not book_text or len(book_text) <= 100:
+            return ""
+        # Use middle section for variety (not always start)
+        start_pos = len(book_text) // 4  # Start from 25% into the text
+        book_chunk = book_text[start_pos:start_pos + length]
+        return f"\n\n**متن کتاب (برای استخراج محتوای منحصر به فرد):**\n{book_chunk}"
+    
+    @staticmethod
+    def _book_info(book_title: Optional[str], book_author: Optional[str]) -> str:
+        """Describe the book for prompts"""
+        book_info = f'"{book_title}"' if book_title else "این کتاب"
+        if book_author:
+            book_info += f" نوشته {book_author}"
+        return book_info
+    
     async def _generate_default_content(self, content_type: str, book_title: Optional[str], 
                                        book_author: Optional[str]) -> Dict[str, Any]:
         """Generate default content when no history is available"""
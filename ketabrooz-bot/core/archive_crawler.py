@@ -0,0 +1,134 @@
+"""
+Source group crawler for PDF books
+
+Walks the source group's documents oldest-first from a stored checkpoint
+(last scanned message id), so re-scans only read new messages. Messages
+are handled in large batches: one set-based query finds which files are
+already stored and the new ones are inserted with a single executemany.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from telethon import TelegramClient
+from telethon.tl.types import InputMessagesFilterDocument
+
+
+# Receives the crawl counters after every batch
+CrawlProgress = Callable[[Dict[str, int]], Awaitable[None]]
+
+
+def checkpoint_key(chat_id: int) -> str:
+    """Settings key holding the last scanned message id of a chat"""
+    return f"scan_checkpoint_{chat_id}"
+
+
+def book_from_message(message, chat_id: int) -> Optional[Dict[str, Any]]:
+    """Build a book row from a PDF message (None for other documents)"""
+    file = message.file
+    if not file or file.mime_type != 'application/pdf':
+        return None
+
+    title = "کتاب بدون عنوان"
+    if file.name:
+        title = file.name.replace('.pdf', '').replace('_', ' ')
+
+    return {
+        'title': title,
+        'pdf_file_id': str(message.document.id),
+        'pdf_message_id': message.id,
+        'source_chat_id': chat_id,
+    }
+
+
+class ArchiveCrawler:
+    """Incremental, batched PDF crawler for one chat"""
+
+    def __init__(self, db, client: TelegramClient, chat_id: int, batch_size: int = 500):
+        """
+        Initialize crawler
+
+        Args:
+            db: Database instance
+            client: Client that can read the chat history (a user account;
+                bot accounts cannot call messages.getHistory)
+            chat_id: Source group/channel ID
+            batch_size: Messages per dedup/insert batch
+        """
+        self.db = db
+        self.client = client
+        self.chat_id = chat_id
+        self.batch_size = batch_size
+        self.stats = {'scanned': 0, 'pdfs': 0, 'added': 0, 'duplicates': 0, 'last_id': 0}
+
+    def get_checkpoint(self) -> int:
+        """Get the last scanned message id"""
+        return int(self.db.get_setting(checkpoint_key(self.chat_id), '0') or 0)
+
+    async def crawl(self, on_progress: Optional[CrawlProgress] = None,
+                    full: bool = False) -> Dict[str, int]:
+        """
+        Scan the chat for new PDF documents
+
+        Args:
+            on_progress: Optional callback receiving the counters per batch
+            full: Ignore the checkpoint and scan the whole history
+
+        Returns:
+            Counters: scanned, pdfs, added, duplicates, last_id
+        """
+        min_id = 0 if full else self.get_checkpoint()
+        self.stats['last_id'] = min_id
+        batch: List[Any] = []
+
+        # reverse=True walks oldest to newest, so the checkpoint only moves forward
+        async for message in self.client.iter_messages(
+            self.chat_id,
+            filter=InputMessagesFilterDocument,
+            min_id=min_id,
+            reverse=True,
+            wait_time=1
+        ):
+            batch.append(message)
+            if len(batch) >= self.batch_size:
+                await self._flush(batch, on_progress)
+                batch = []
+
+        if batch:
+            await self._flush(batch, on_progress)
+        return self.stats
+
+    async def _flush(self, messages: List[Any], on_progress: Optional[CrawlProgress]):
+        """Dedup and store one batch, then advance the checkpoint"""
+        books = {}
+        pdf_count = 0
+        for message in messages:
+            book = book_from_message(message, self.chat_id)
+            if book:
+                pdf_count += 1
+                # The same file forwarded twice within a batch counts once
+                books.setdefault(book['pdf_file_id'], book)
+
+        # Large batches take a while in SQLite; keep the event loop responsive
+        added, duplicates = await asyncio.get_running_loop().run_in_executor(
+            None, self._store, list(books.values())
+        )
+
+        last_id = max(message.id for message in messages)
+        self.db.set_setting(checkpoint_key(self.chat_id), str(last_id), 'integer')
+
+        self.stats['scanned'] += len(messages)
+        self.stats['pdfs'] += pdf_count
+        self.stats['added'] += added
+        self.stats['duplicates'] += duplicates + pdf_count - len(books)
+        self.stats['last_id'] = last_id
+
+        if on_progress:
+            await on_progress(dict(self.stats))
+
+    def _store(self, books: List[Dict[str, Any]]) -> tuple:
+        """Insert books whose file is not stored yet; returns (added, duplicates)"""
+        if not books:
+            return 0, 0
+        existing = self.db.get_existing_pdf_file_ids([book['pdf_file_id'] for book in books])
+        new_books = [book for book in books if book['pdf_file_id'] not in existing]
+        self.db.add_books_bulk(new_books)
+        return len(new_books), len(books) - len(new_books)
@@ -0,0 +1,198 @@
+"""
+Bulk book processing pipeline
+
+Books flow through three stages with separate worker counts:
+download (network), extraction (CPU, in a process pool) and AI analysis
+plus content generation (network, rate limited). Stages are connected
+by bounded asyncio queues, so a slow stage makes the earlier ones wait
+instead of piling PDFs up in memory.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from telethon import TelegramClient
+from config import OPENROUTER_API_KEY, OPENROUTER_MODEL
+from core.ai_generator import AIGenerator
+from core.book_processing import download_book_pdf, extract_pdf, analyze_and_save_book, generate_book_quote
+
+
+# Receives the pipeline counters after every change
+PipelineProgress = Callable[[Dict[str, Any]], Awaitable[None]]
+
+_DONE = object()
+
+
+class BookPipeline:
+    """Processes many books concurrently with per-stage limits"""
+
+    def __init__(self, db, bot: TelegramClient, download_workers: int = 3,
+                 extract_workers: int = 2, ai_workers: int = 4, queue_size: int = 4):
+        """
+        Initialize pipeline
+
+        Args:
+            db: Database instance
+            bot: Telegram client used for downloads and cover uploads
+            download_workers: Concurrent downloads
+            extract_workers: Processes used for PDF extraction
+            ai_workers: Books analyzed by AI concurrently
+            queue_size: Capacity of the queues between stages
+        """
+        self.db = db
+        self.bot = bot
+        self.download_workers = max(1, download_workers)
+        self.extract_workers = max(1, extract_workers)
+        self.ai_workers = max(1, ai_workers)
+        self.queue_size = max(1, queue_size)
+        self.stats: Dict[str, Any] = {}
+        self.errors: List[str] = []
+        self._on_progress: Optional[PipelineProgress] = None
+
+    async def run(self, book_ids: List[int], on_progress: Optional[PipelineProgress] = None) -> Dict[str, Any]:
+        """
+        Process books and wait until all of them are finished
+
+        Args:
+            book_ids: Books to process (books no longer pending are skipped)
+            on_progress: Optional callback receiving the counters
+
+        Returns:
+            Counters: total, downloading, extracting, analyzing, done,
+            failed, skipped, content, elapsed
+        """
+        self.stats = {
+            'total': len(book_ids), 'downloading': 0, 'extracting': 0, 'analyzing': 0,
+            'done': 0, 'failed': 0, 'skipped': 0, 'content': 0, 'elapsed': 0.0
+        }
+        self.errors = []
+        self._on_progress = on_progress
+        started = time.monotonic()
+
+        download_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        extract_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        ai_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        with ProcessPoolExecutor(max_workers=self.extract_workers) as executor:
+            stages = [
+                self._stage(download_queue, extract_queue, self.download_workers, self._download),
+                self._stage(extract_queue, ai_queue, self.extract_workers,
+                            lambda item: self._extract(item, executor)),
+                self._stage(ai_queue, None, self.ai_workers, self._analyze),
+            ]
+            await asyncio.gather(self._feed(book_ids, download_queue), *stages)
+
+        self.stats['elapsed'] = time.monotonic() - started
+        await self._report()
+        return self.stats
+
+    async def _feed(self, book_ids: List[int], queue: asyncio.Queue):
+        """Put book IDs into the first stage (waits while it is full)"""
+        for book_id in book_ids:
+            await queue.put(book_id)
+        await queue.put(_DONE)
+
+    async def _stage(self, in_queue: asyncio.Queue, out_queue: Optional[asyncio.Queue],
+                     workers: int, handler: Callable[[Any], Awaitable[Any]]):
+        """Run a stage with a fixed number of workers until its input ends"""
+
+        async def worker():
+            while True:
+                item = await in_queue.get()
+                if item is _DONE:
+                    # Let the other workers of this stage see the end too
+                    await in_queue.put(_DONE)
+                    return
+                result = await handler(item)
+                if result is not None and out_queue is not None:
+                    await out_queue.put(result)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if out_queue is not None:
+            await out_queue.put(_DONE)
+
+    async def _download(self, book_id: int) -> Optional[tuple]:
+        """Stage 1: fetch the book row and download its PDF"""
+        book = None
+        self.stats['downloading'] += 1
+        try:
+            # Inside the try: a database error fails this book, not the worker
+            book = self.db.get_book(book_id)
+            if not book or book.get('status') != 'pending':
+                self.stats['skipped'] += 1
+                await self._report()
+                return None
+
+            self.db.update_book(book_id, status='processing')
+            await self._report()
+            return book, await download_book_pdf(self.bot, book)
+        except Exception as e:
+            if book:
+                self._fail(book, f"دانلود: {str(e)}")
+            else:
+                # The row could not be read, so its status is left alone
+                print(f"Pipeline error for book {book_id}: {str(e)}")
+                self.stats['failed'] += 1
+                self.errors.append(f"{book_id}: {str(e)}")
+            return None
+        finally:
+            self.stats['downloading'] -= 1
+
+    async def _extract(self, item: tuple, executor: ProcessPoolExecutor) -> Optional[tuple]:
+        """Stage 2: extract text, page count and cover in a worker process"""
+        book, pdf_data = item
+        self.stats['extracting'] += 1
+        await self._report()
+        try:
+            extracted = await asyncio.get_running_loop().run_in_executor(executor, extract_pdf, pdf_data)
+            return book, extracted
+        except Exception as e:
+            self._fail(book, f"استخراج: {str(e)}")
+            return None
+        finally:
+            self.stats['extracting'] -= 1
+
+    async def _analyze(self, item: tuple) -> None:
+        """Stage 3: AI analysis, cover upload and quote generation"""
+        book, extracted = item
+        self.stats['analyzing'] += 1
+        await self._report()
+        try:
+            ai = AIGenerator(OPENROUTER_API_KEY, OPENROUTER_MODEL, db=self.db, book_id=book['id'])
+            metadata = await analyze_and_save_book(self.db, self.bot, ai, book, extracted)
+            try:
+                await generate_book_quote(self.db, ai, book, metadata, extracted.get('text') or '')
+                self.stats['content'] += 1
+            except Exception as e:
+                # The book itself is processed; only the quote is missing
+                print(f"Error generating content for book {book['id']}: {str(e)}")
+            self.stats['done'] += 1
+        except Exception as e:
+            self._fail(book, f"تحلیل: {str(e)}")
+        finally:
+            self.stats['analyzing'] -= 1
+            await self._report()
+
+    def _fail(self, book: Dict[str, Any], error: str):
+        """Count a failed book and put it back to pending"""
+        print(f"Pipeline error for book {book['id']}: {error}")
+        self.stats['failed'] += 1
+        self.errors.append(f"{book.get('title', book['id'])}: {error}")
+        try:
+            self.db.update_book(book['id'], status='pending')
+        except Exception as e:
+            print(f"Error resetting book status: {str(e)}")
+
+    async def _report(self):
+        """Send the counters to the progress callback"""
+        if self._on_progress:
+            try:
+                await self._on_progress(dict(self.stats))
+            except Exception as e:
+                print(f"Pipeline progress error: {str(e)}")
+
+
+def default_extract_workers() -> int:
+    """Extraction processes to use when not configured"""
+    return max(1, min(4, (os.cpu_count() or 2) - 1))
@@ -0,0 +1,223 @@
+"""
+Book processing stages
+
+Download, extraction, AI analysis and content generation for a stored
+book, shared by the single-book job (handlers/books.py) and the bulk
+pipeline (core/book_pipeline.py).
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+from telethon import TelegramClient
+from config import ADMIN_USER_ID, DOWNLOAD_WORKERS
+from core.ai_generator import AIGenerator, ProgressCallback
+from core.dedup import get_dedup_index, generate_unique
+from core.history_selector import get_history_selector
+from core.pdf_processor import PDFProcessor
+from utils.downloader import ParallelDownloader
+
+
+# Builds a streaming progress callback for a status prefix
+ProgressFactory = Callable[[str], ProgressCallback]
+
+
+async def download_book_pdf(bot: TelegramClient, book: Dict[str, Any]) -> bytes:
+    """
+    Download a book's PDF from the chat it was found in (the admin chat
+    for uploaded books, the source group for scanned ones)
+
+    Raises:
+        ValueError: If the message or its file no longer exists
+    """
+    chat_id = book.get('source_chat_id') or ADMIN_USER_ID
+    msg = await bot.get_messages(chat_id, ids=book['pdf_message_id'])
+    if not msg or not msg.media:
+        raise ValueError("فایل کتاب یافت نشد")
+
+    return await ParallelDownloader(bot, workers=DOWNLOAD_WORKERS).download_bytes(msg.media)
+
+
+def extract_pdf(pdf_data: bytes, max_pages: int = 50) -> Dict[str, Any]:
+    """
+    Extract text, page count and cover from a PDF
+
+    CPU-bound and free of shared state, so it can run in a process pool.
+
+    Returns:
+        Dictionary with 'text', 'total_pages' (None if extraction failed)
+        and 'cover' (PNG bytes or None)
+    """
+    try:
+        return {
+            'text': PDFProcessor.extract_text(pdf_data, max_pages=max_pages),
+            'total_pages': PDFProcessor.get_page_count(pdf_data),
+            'cover': PDFProcessor.extract_cover(pdf_data),
+        }
+    except Exception as e:
+        print(f"Error extracting PDF: {str(e)}")
+        return {'text': '', 'total_pages': None, 'cover': None}
+
+
+async def analyze_book(ai: AIGenerator, extracted: Dict[str, Any],
+                       progress: Optional[ProgressFactory] = None) -> Dict[str, Any]:
+    """
+    Get author, category and tags from the cover and the text
+
+    Returns:
+        Book fields to update (may be empty)
+    """
+    metadata = {}
+    cover_image = extracted.get('cover')
+    text = extracted.get('text') or ''
+
+    if cover_image:
+        try:
+            cover_analysis = await ai.analyze_image(
+                cover_image, on_progress=progress("🤖 در حال تحلیل جلد کتاب...") if progress else None
+            )
+            if cover_analysis.get('author'):
+                metadata['author'] = cover_analysis['author']
+            if cover_analysis.get('category'):
+                metadata['category'] = cover_analysis['category']
+            if cover_analysis.get('tags'):
+                tags_list = cover_analysis['tags'] if isinstance(cover_analysis['tags'], list) else [cover_analysis['tags']]
+                metadata['tags'] = ', '.join(tags_list)
+        except Exception as e:
+            print(f"Cover analysis error: {str(e)}")
+
+    if len(text) > 200:
+        try:
+            summary_result = await ai.generate_summary(
+                text, min_words=150, max_words=300,
+                on_progress=progress("🤖 در حال تحلیل متن کتاب...") if progress else None
+            )
+            if summary_result.get('genre') and not metadata.get('category'):
+                metadata['category'] = summary_result['genre']
+        except Exception as e:
+            print(f"Text analysis error: {str(e)}")
+
+    return metadata
+
+
+async def save_cover(bot: TelegramClient, book: Dict[str, Any], cover_image: bytes) -> Dict[str, Any]:
+    """
+    Send the extracted cover to the admin chat to get a file_id
+
+    Returns:
+        Dictionary with cover_file_id and cover_message_id (empty on error)
+    """
+    try:
+        cover_msg = await bot.send_file(
+            ADMIN_USER_ID,
+            cover_image,
+            caption=f"📖 جلد: {book.get('title', 'کتاب')}",
+            force_document=False
+        )
+        if hasattr(cover_msg.media, 'photo'):
+            cover_file_id = str(cover_msg.media.photo.id)
+        elif hasattr(cover_msg.media, 'document'):
+            cover_file_id = str(cover_msg.media.document.id)
+        else:
+            return {}
+        return {'cover_file_id': cover_file_id, 'cover_message_id': cover_msg.id}
+    except Exception as e:
+        print(f"Error saving cover: {str(e)}")
+        return {}
+
+
+async def analyze_and_save_book(db, bot: TelegramClient, ai: AIGenerator, book: Dict[str, Any],
+                                extracted: Dict[str, Any],
+                                progress: Optional[ProgressFactory] = None) -> Dict[str, Any]:
+    """
+    Run AI analysis, store the cover and mark the book as processed
+
+    Returns:
+        The fields written to the book
+    """
+    metadata = await analyze_book(ai, extracted, progress)
+
+    if extracted.get('cover') and not book.get('cover_file_id'):
+        metadata.update(await save_cover(bot, book, extracted['cover']))
+
+    total_pages = extracted.get('total_pages')
+    metadata['total_pages'] = total_pages if total_pages is not None else book.get('total_pages', 0)
+    metadata['status'] = 'processed'
+    if extracted.get('text'):
+        metadata['notes'] = extracted['text'][:5000]
+
+    db.update_book(book['id'], **metadata)
+    return metadata
+
+
+async def generate_book_quote(db, ai: AIGenerator, book: Dict[str, Any], metadata: Dict[str, Any],
+                              extracted_text: str,
+                              on_progress: Optional[ProgressCallback] = None) -> Tuple[int, Optional[tuple]]:
+    """
+    Generate a quote for a processed book and save it for approval
+
+    Returns:
+        Tuple of (content_id, duplicate) where duplicate is (content_id,
+        similarity) if the quote is still close to existing content
+
+    Raises:
+        ValueError: With a user-facing message if no quote could be made
+    """
+    content_type = 'quote'
+
+    # Get the best published examples for style learning
+    published_content = get_history_selector(db).select(content_type, limit=5)
+
+    # Use extracted text (full) or notes (limited) - prefer extracted_text as it's more complete
+    book_text_for_gen = extracted_text if extracted_text else (book.get('notes', '') or '')
+
+    # Use more text for better quality (up to 3000 chars for variety)
+    if book_text_for_gen and len(book_text_for_gen) > 3000:
+        # Use middle section for variety (not always from start)
+        start_pos = len(book_text_for_gen) // 4  # Start from 25% into the text
+        book_text_for_gen = book_text_for_gen[start_pos:start_pos+3000]
+
+    if not published_content and not book_text_for_gen:
+        raise ValueError("نمی‌توان محتوا تولید کرد (نیاز به تاریخچه یا متن کتاب)")
+
+    # Regenerate quotes that repeat already stored content
+    result, duplicate = await generate_unique(
+        lambda: ai.generate_content_from_history(
+            published_content_history=published_content,
+            content_type=content_type,
+            book_title=book.get('title'),
+            book_author=metadata.get('author') or book.get('author'),
+            book_text=book_text_for_gen,
+            on_progress=on_progress
+        ),
+        lambda r: r.get('quote', ''),
+        get_dedup_index(db)
+    )
+
+    if 'error' in result:
+        raise ValueError(f"خطا در تولید محتوا: {result.get('error', 'خطای نامشخص')}")
+
+    text_content = result.get('quote', '')
+    if not text_content:
+        raise ValueError("محتوا تولید شد اما خالی است.")
+
+    # Get book cover for content - use the updated book data
+    updated_book = db.get_book(book['id']) or book
+    use_cover = bool(updated_book.get('cover_file_id'))
+
+    # Build better caption with book info
+    caption = result.get('context', f"از کتاب {book.get('title')}")
+    author_name = metadata.get('author') or updated_book.get('author')
+    if author_name:
+        caption = f"از کتاب {book.get('title')}\n✍️ نویسنده: {author_name}"
+    elif book.get('title'):
+        caption = f"از کتاب {book.get('title')}"
+
+    content_id = db.add_content(
+        book_id=book['id'],
+        content_type=content_type,
+        text=text_content,
+        caption=caption,
+        file_id=updated_book.get('cover_file_id') if use_cover else None,
+        is_manual=False,
+        use_cover=use_cover,
+        status='pending_approval'
+    )
+    return content_id, duplicate
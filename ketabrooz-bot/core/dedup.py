@@ -0,0 +1,282 @@
+"""
+Near-duplicate detection for content text
+
+Every content row is reduced to a MinHash signature of its character
+shingles and bucketed with LSH banding, so a new quote is compared only
+against the few stored items that share a band with it instead of the
+whole history. Signatures are stored in SQLite and loaded into memory
+once (band buckets are recomputed from them); new rows are indexed
+incrementally. Editing a row's text drops its stored signature
+(Database.update_content), and the next sync indexes it again.
+
+Loading and syncing read the database, so they run in a thread: the
+bot loads the index at startup, and async callers await sync_async().
+"""
+import asyncio
+import hashlib
+import operator
+import re
+import threading
+from array import array
+from typing import Any, Callable, Awaitable, Dict, List, Optional, Tuple
+
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+NUM_BANDS = 16
+DEFAULT_THRESHOLD = 0.6
+
+_BIN_BITS = 6  # log2(NUM_PERM)
+_BIN_MASK = NUM_PERM - 1
+_EMPTY = (1 << 64) - 1
+
+_ARABIC_TO_PERSIAN = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', '‌': ' ',
+})
+_DIACRITICS = re.compile(r'[ً-ٰٟـ]')
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def normalize_text(text: str) -> str:
+    """Normalize Persian/Arabic letter variants, diacritics and punctuation"""
+    text = (text or '').translate(_ARABIC_TO_PERSIAN).lower()
+    text = _DIACRITICS.sub('', text)
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def _hash64(data: bytes) -> int:
+    """Stable 64-bit hash (Python's hash() is salted per process)"""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> set:
+    """Get the set of hashed character k-shingles of normalized text"""
+    text = normalize_text(text)
+    if len(text) <= k:
+        return {_hash64(text.encode('utf-8'))} if text else set()
+    return {_hash64(text[i:i + k].encode('utf-8')) for i in range(len(text) - k + 1)}
+
+
+def minhash_signature(text: str) -> Optional[array]:
+    """
+    Compute the MinHash signature of a text
+
+    Uses one-permutation hashing: each shingle hash is split into a bin
+    (low bits) and a value, and every bin keeps its minimum. Empty bins
+    borrow from the next non-empty bin, which keeps the Jaccard estimate
+    unbiased while hashing every shingle once instead of NUM_PERM times.
+
+    Returns:
+        Array of NUM_PERM values, or None for empty text
+    """
+    hashes = shingles(text)
+    if not hashes:
+        return None
+
+    bins = [_EMPTY] * NUM_PERM
+    for h in hashes:
+        index = h & _BIN_MASK
+        value = h >> _BIN_BITS
+        if value < bins[index]:
+            bins[index] = value
+
+    signature = array('Q', bins)
+    for i in range(NUM_PERM):
+        if bins[i] == _EMPTY:
+            for distance in range(1, NUM_PERM):
+                borrowed = bins[(i + distance) & _BIN_MASK]
+                if borrowed != _EMPTY:
+                    signature[i] = borrowed + (distance << 58)
+                    break
+    return signature
+
+
+def band_buckets(signature: array) -> List[int]:
+    """Hash each band of a signature to a bucket id"""
+    rows = NUM_PERM // NUM_BANDS
+    return [hash(tuple(signature[i:i + rows])) for i in range(0, NUM_PERM, rows)]
+
+
+def estimate_similarity(sig_a: array, sig_b: array) -> float:
+    """Estimate Jaccard similarity from two signatures"""
+    return sum(map(operator.eq, sig_a, sig_b)) / NUM_PERM
+
+
+def _content_text(row: Dict[str, Any]) -> str:
+    """Text used for similarity (caption when there is no text)"""
+    return row.get('text') or row.get('caption') or ''
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH similarity index over all content text"""
+
+    def __init__(self, db, threshold: float = DEFAULT_THRESHOLD):
+        """
+        Initialize index
+
+        Args:
+            db: Database instance
+            threshold: Estimated Jaccard similarity that counts as a duplicate
+        """
+        self.db = db
+        self.threshold = threshold
+        self._signatures: Dict[int, array] = {}
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(NUM_BANDS)]
+        self._last_id = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _insert(self, content_id: int, signature: array, buckets: List[int]):
+        """Add a signature to the in-memory tables"""
+        self._signatures[content_id] = signature
+        for band, bucket in enumerate(buckets):
+            self._bands[band].setdefault(bucket, []).append(content_id)
+        if content_id > self._last_id:
+            self._last_id = content_id
+
+    def _remove(self, content_id: int):
+        """Drop a row's signature from the in-memory tables"""
+        signature = self._signatures.pop(content_id, None)
+        if signature is None:
+            return
+        for band, bucket in enumerate(band_buckets(signature)):
+            ids = self._bands[band].get(bucket)
+            if ids and content_id in ids:
+                ids.remove(content_id)
+
+    def _index_rows(self, rows: List[Dict[str, Any]]) -> int:
+        """Compute, store and insert the signatures of content rows"""
+        items = []
+        for row in rows:
+            self._remove(row['id'])
+            signature = minhash_signature(_content_text(row))
+            if signature is None:
+                # Stored empty, so the row counts as indexed
+                items.append((row['id'], b''))
+                self._last_id = max(self._last_id, row['id'])
+                continue
+            self._insert(row['id'], signature, band_buckets(signature))
+            items.append((row['id'], signature.tobytes()))
+        if items:
+            self.db.add_minhash_signatures(items)
+        return sum(1 for _, blob in items if blob)
+
+    def _load(self):
+        """Load stored signatures from the database"""
+        for content_id, blob in self.db.get_all_minhash_signatures():
+            if not blob:
+                self._last_id = max(self._last_id, content_id)
+                continue
+            signature = array('Q')
+            signature.frombytes(blob)
+            self._insert(content_id, signature, band_buckets(signature))
+        self._loaded = True
+
+    def sync(self, batch_size: int = 1000) -> int:
+        """
+        Index content rows added or edited since the last sync
+
+        Blocks on the database; call sync_async() from the event loop.
+
+        Returns:
+            Number of newly indexed rows
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+            indexed = 0
+            while True:
+                rows = self.db.get_content_texts_after(self._last_id, batch_size)
+                if not rows:
+                    break
+                indexed += self._index_rows(rows)
+            # Rows whose text was edited after they were indexed
+            while True:
+                rows = self.db.get_unindexed_content_texts(self._last_id, batch_size)
+                if not rows:
+                    break
+                indexed += self._index_rows(rows)
+            return indexed
+
+    async def sync_async(self) -> int:
+        """sync() in a worker thread"""
+        return await asyncio.to_thread(self.sync)
+
+    def find_similar(self, text: str, signature: Optional[array] = None) -> Optional[Tuple[int, float]]:
+        """
+        Find the most similar stored content
+
+        Only what the last sync() indexed is compared; it does not touch
+        the database.
+
+        Args:
+            text: Text to check
+            signature: Precomputed signature of text (optional)
+
+        Returns:
+            Tuple of (content_id, similarity) above the threshold, or None
+        """
+        if signature is None:
+            signature = minhash_signature(text)
+        if signature is None:
+            return None
+
+        candidates = set()
+        for band, bucket in enumerate(band_buckets(signature)):
+            candidates.update(self._bands[band].get(bucket, ()))
+
+        best = None
+        for content_id in candidates:
+            stored = self._signatures.get(content_id)
+            if stored is None:
+                # Removed by a sync running in another thread
+                continue
+            similarity = estimate_similarity(signature, stored)
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (content_id, similarity)
+        return best
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+
+_indexes: Dict[str, NearDuplicateIndex] = {}
+
+
+def get_dedup_index(db) -> NearDuplicateIndex:
+    """Get the shared index for a database"""
+    index = _indexes.get(db.db_path)
+    if index is None:
+        index = _indexes[db.db_path] = NearDuplicateIndex(db)
+    return index
+
+
+async def generate_unique(generate: Callable[[], Awaitable[Any]],
+                          get_text: Callable[[Any], str],
+                          index: NearDuplicateIndex,
+                          max_attempts: int = 3) -> Tuple[Any, Optional[Tuple[int, float]]]:
+    """
+    Generate content, retrying while it is a near-duplicate of stored content
+
+    Args:
+        generate: Coroutine function producing one result
+        get_text: Extracts the text to compare from a result
+        index: Similarity index
+        max_attempts: Total generation attempts
+
+    Returns:
+        Tuple of (result, duplicate) where duplicate is (content_id, similarity)
+        of the last attempt's closest match, or None if it is unique
+    """
+    result, duplicate = None, None
+    for _ in range(max_attempts):
+        result = await generate()
+        text = get_text(result)
+        await index.sync_async()
+        duplicate = index.find_similar(text) if text else None
+        if duplicate is None:
+            break
+        print(f"Near-duplicate of content #{duplicate[0]} ({duplicate[1]:.0%}), regenerating")
+    return result, duplicate
@@ -0,0 +1,115 @@
+"""
+Channel engagement collection
+
+Published posts keep gaining views and reactions for days, so the
+collector periodically reads the channel messages recorded in
+published_messages, stores each content's views and reactions and
+re-ranks it for the AI style examples (core/history_selector.py).
+"""
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from telethon import TelegramClient
+from database.db import Database
+from core.history_selector import get_history_selector
+
+
+# Messages per channels.getMessages request (Telegram limit)
+FETCH_BATCH = 100
+
+
+def _reaction_count(message) -> int:
+    """Total reactions on a message"""
+    reactions = getattr(message, 'reactions', None)
+    if not reactions or not reactions.results:
+        return 0
+    return sum(result.count for result in reactions.results)
+
+
+class EngagementCollector:
+    """Periodically stores views and reactions of recently published content"""
+
+    def __init__(self, db: Database, bot: TelegramClient, channel_id: int,
+                 interval: float = 3600, max_age_days: int = 30):
+        """
+        Args:
+            db: Database instance
+            bot: Telegram client
+            channel_id: Channel the content is published to
+            interval: Seconds between collections
+            max_age_days: Only posts published within this many days are re-read
+        """
+        self.db = db
+        self.bot = bot
+        self.channel_id = channel_id
+        self.interval = interval
+        self.max_age_days = max_age_days
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start collecting in the running event loop"""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop collecting"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                updated = await self.collect()
+                if updated:
+                    print(f"📈 Engagement updated for {updated} posts")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error collecting engagement: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def collect(self) -> int:
+        """
+        Read the channel messages of recent posts and store their engagement
+
+        An album counts its most viewed message and the reactions of all
+        its messages.
+
+        Returns:
+            Number of content items whose engagement changed
+        """
+        rows = await asyncio.to_thread(self.db.get_recent_published_messages,
+                                       self.channel_id, self.max_age_days)
+        if not rows:
+            return 0
+
+        content_of = {row['message_id']: row['content_id'] for row in rows}
+        message_ids = list(content_of)
+        engagement: Dict[int, Tuple[int, int]] = {}
+        for start in range(0, len(message_ids), FETCH_BATCH):
+            batch: List[int] = message_ids[start:start + FETCH_BATCH]
+            messages = await self.bot.get_messages(self.channel_id, ids=batch)
+            for message_id, message in zip(batch, messages):
+                if message is None:
+                    # Deleted from the channel
+                    continue
+                content_id = content_of[message_id]
+                views, reactions = engagement.get(content_id, (0, 0))
+                engagement[content_id] = (max(views, message.views or 0),
+                                          reactions + _reaction_count(message))
+
+        return await asyncio.to_thread(self._store, engagement)
+
+    def _store(self, engagement: Dict[int, Tuple[int, int]]) -> int:
+        """Write changed engagement to the database and the style example ranking"""
+        selector = get_history_selector(self.db)
+        updated = 0
+        for content_id, (views, reactions) in engagement.items():
+            content = self.db.get_content(content_id)
+            if not content or (content.get('views') or 0, content.get('reactions') or 0) == (views, reactions):
+                continue
+            self.db.update_content(content_id, views=views, reactions=reactions)
+            selector.update_engagement(content_id, views, reactions)
+            updated += 1
+        return updated
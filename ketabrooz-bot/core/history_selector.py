@@ -0,0 +1,194 @@
+"""
+Style example selection for AI prompts
+
+Published content is ranked per content type by engagement (views and
+reactions) with an exponential recency decay. Because the decay applies
+to every item at the same rate, the ranking order does not change over
+time, so each item gets a fixed sort key and the per-type rankings are
+kept as sorted lists updated incrementally when content is published or
+its engagement changes.
+"""
+import bisect
+import itertools
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+HALF_LIFE_DAYS = 30.0
+REACTION_WEIGHT = 3.0
+MAX_PER_BOOK = 2
+MIN_TEXT_LENGTH = 20
+ENGAGEMENT_REFRESH_SECONDS = 900
+
+
+def _timestamp(value: Any) -> float:
+    """Convert a stored date to a POSIX timestamp (0 if missing)"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if value:
+        try:
+            return datetime.fromisoformat(str(value)).timestamp()
+        except ValueError:
+            pass
+    return 0.0
+
+
+def rank_key(published_ts: float, views: int = 0, reactions: int = 0) -> float:
+    """
+    Time-invariant sort key of an item
+
+    The score engagement * 0.5 ** (age / half_life) has the same order as
+    log(engagement) + published_ts / half_life * log(2), which does not
+    depend on the current time.
+
+    Returns:
+        Sort key (higher is better)
+    """
+    engagement = 1.0 + math.log1p(views or 0) + REACTION_WEIGHT * math.log1p(reactions or 0)
+    return math.log(engagement) + published_ts / (HALF_LIFE_DAYS * 86400) * math.log(2)
+
+
+class HistorySelector:
+    """Incrementally maintained ranking of published content"""
+
+    def __init__(self, db):
+        """
+        Initialize selector
+
+        Args:
+            db: Database instance
+        """
+        self.db = db
+        self._items: Dict[int, Dict[str, Any]] = {}
+        # content type (None = all types) -> sorted list of (-key, content_id)
+        self._rankings: Dict[Optional[str], List[tuple]] = {None: []}
+        self._published_since = ''
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def _remove(self, content_id: int):
+        """Remove an item from the rankings"""
+        item = self._items.pop(content_id, None)
+        if item is None:
+            return
+        entry = (-item['rank_key'], content_id)
+        for ranking in (self._rankings[None], self._rankings[item['type']]):
+            position = bisect.bisect_left(ranking, entry)
+            if position < len(ranking) and ranking[position] == entry:
+                del ranking[position]
+
+    def _add(self, row: Dict[str, Any]):
+        """Add or replace an item in the rankings"""
+        self._remove(row['id'])
+        text = row.get('text') or row.get('caption') or ''
+        if len(text) <= MIN_TEXT_LENGTH:
+            return
+        item = {
+            'id': row['id'],
+            'type': row.get('type'),
+            'book_id': row.get('book_id'),
+            'text': row.get('text'),
+            'caption': row.get('caption'),
+            'published_ts': _timestamp(row.get('ranked_date')),
+            'views': row.get('views') or 0,
+            'reactions': row.get('reactions') or 0,
+        }
+        self._insert(item)
+
+    def _insert(self, item: Dict[str, Any]):
+        """Insert a prepared item into the rankings"""
+        item['rank_key'] = rank_key(item['published_ts'], item['views'], item['reactions'])
+        self._items[item['id']] = item
+        entry = (-item['rank_key'], item['id'])
+        bisect.insort(self._rankings[None], entry)
+        bisect.insort(self._rankings.setdefault(item['type'], []), entry)
+
+    def _set_engagement(self, content_id: int, views: int, reactions: int):
+        """Re-rank an item if its counters changed"""
+        item = self._items.get(content_id)
+        if item is None or (item['views'], item['reactions']) == (views, reactions):
+            return
+        self._remove(content_id)
+        item['views'], item['reactions'] = views, reactions
+        self._insert(item)
+
+    def sync(self):
+        """Pick up newly published content and, periodically, engagement changes"""
+        with self._lock:
+            for row in self.db.get_published_content_since(self._published_since):
+                self._add(row)
+                ranked_date = str(row.get('ranked_date') or '')
+                if ranked_date > self._published_since:
+                    self._published_since = ranked_date
+
+            now = time.monotonic()
+            if now - self._last_refresh >= ENGAGEMENT_REFRESH_SECONDS:
+                self._last_refresh = now
+                self._refresh_engagement()
+
+    def _refresh_engagement(self):
+        """Re-rank items whose views/reactions changed (reads id and counters only)"""
+        published_ids = set()
+        for row in self.db.get_published_engagement():
+            published_ids.add(row['id'])
+            self._set_engagement(row['id'], row['views'] or 0, row['reactions'] or 0)
+        # Content deleted or unpublished since it was ranked
+        for content_id in set(self._items) - published_ids:
+            self._remove(content_id)
+
+    def update_engagement(self, content_id: int, views: int, reactions: int):
+        """Re-rank one item after its engagement was updated"""
+        with self._lock:
+            self._set_engagement(content_id, views, reactions)
+
+    def select(self, content_type: Optional[str] = None, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Get the best style examples
+
+        Args:
+            content_type: Preferred content type (None for any type)
+            limit: Number of examples
+
+        Returns:
+            List of content dicts (id, type, book_id, text, caption), best first.
+            Other types fill in when there are not enough of the requested type.
+        """
+        self.sync()
+        with self._lock:
+            rankings = [self._rankings.get(content_type, [])]
+            if content_type is not None:
+                rankings.append(self._rankings[None])
+
+            selected: List[int] = []
+            per_book: Dict[Any, int] = {}
+            # First pass spreads examples over books, second pass fills up
+            for book_limit in (MAX_PER_BOOK, None):
+                for _, content_id in itertools.chain(*rankings):
+                    if len(selected) >= limit:
+                        break
+                    if content_id in selected:
+                        continue
+                    book_id = self._items[content_id]['book_id']
+                    if book_limit and book_id is not None and per_book.get(book_id, 0) >= book_limit:
+                        continue
+                    per_book[book_id] = per_book.get(book_id, 0) + 1
+                    selected.append(content_id)
+
+            return [
+                {key: self._items[content_id][key] for key in ('id', 'type', 'book_id', 'text', 'caption')}
+                for content_id in selected
+            ]
+
+
+_selectors: Dict[str, HistorySelector] = {}
+
+
+def get_history_selector(db) -> HistorySelector:
+    """Get the shared selector for a database"""
+    selector = _selectors.get(db.db_path)
+    if selector is None:
+        selector = _selectors[db.db_path] = HistorySelector(db)
+    return selector
@@ -0,0 +1,135 @@
+"""
+Image preparation for vision model requests
+
+Book covers come from PDFProcessor.extract_cover as 2x PNG renders, which
+are several megabytes. Images are downscaled to a model-appropriate size,
+re-encoded as JPEG/WebP with the matching MIME type and cached by content
+hash so repeated analysis of the same cover costs nothing.
+"""
+import asyncio
+import base64
+import hashlib
+import io
+from collections import OrderedDict
+from typing import Optional, Tuple
+from PIL import Image, features
+
+
+# Longest edge sent to each model family (pixels beyond this only add tokens)
+MODEL_MAX_EDGE = {
+    'anthropic/': 1568,
+    'openai/': 2048,
+    'google/': 1536,
+}
+DEFAULT_MAX_EDGE = 1024
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'PNG': 'image/png',
+}
+
+# Skip re-encoding JPEGs that already fit and are smaller than this
+PASSTHROUGH_MAX_BYTES = 512 * 1024
+
+
+def max_edge_for_model(model: str) -> int:
+    """Get the longest image edge worth sending to a model"""
+    for prefix, edge in MODEL_MAX_EDGE.items():
+        if model and model.startswith(prefix):
+            return edge
+    return DEFAULT_MAX_EDGE
+
+
+def prepare_image(image_bytes: bytes, max_edge: int = DEFAULT_MAX_EDGE,
+                  image_format: str = 'JPEG', quality: int = 85) -> Tuple[str, bytes]:
+    """
+    Downscale and encode an image for a vision request
+
+    Args:
+        image_bytes: Source image bytes (any format Pillow can read)
+        max_edge: Longest edge of the output image
+        image_format: 'JPEG', 'WEBP' or 'PNG' (falls back to JPEG for any other
+            format and without WebP support)
+        quality: Encoder quality
+
+    Returns:
+        Tuple of (mime type, encoded bytes)
+    """
+    image_format = image_format.upper()
+    if image_format not in MIME_TYPES or (image_format == 'WEBP' and not features.check('webp')):
+        image_format = 'JPEG'
+
+    img = Image.open(io.BytesIO(image_bytes))
+
+    if (img.format == image_format and max(img.size) <= max_edge
+            and len(image_bytes) <= PASSTHROUGH_MAX_BYTES):
+        return MIME_TYPES[image_format], image_bytes
+
+    # Let the JPEG decoder skip detail we are going to throw away
+    if img.format == 'JPEG':
+        img.draft('RGB', (max_edge, max_edge))
+
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    if max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    output = io.BytesIO()
+    img.save(output, format=image_format, quality=quality)
+    return MIME_TYPES[image_format], output.getvalue()
+
+
+class ImagePayloadCache:
+    """LRU cache of encoded image payloads keyed by content hash"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[tuple, Tuple[str, str]]" = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[Tuple[str, str]]:
+        """Get (mime, base64) for a key"""
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+        return item
+
+    def put(self, key: tuple, value: Tuple[str, str]):
+        """Store (mime, base64) for a key"""
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+
+_payload_cache = ImagePayloadCache()
+
+
+async def prepare_image_data_url(image_bytes: bytes, max_edge: int = DEFAULT_MAX_EDGE,
+                                 image_format: str = 'JPEG', quality: int = 85) -> str:
+    """
+    Prepare an image and return it as a data URL
+
+    Resizing and encoding run in a worker thread so the event loop keeps
+    serving Telegram updates while large covers are processed.
+
+    Returns:
+        data:<mime>;base64,<payload>
+    """
+    key = (hashlib.sha256(image_bytes).hexdigest(), max_edge, image_format.upper(), quality)
+    cached = _payload_cache.get(key)
+    if cached is None:
+        mime, encoded = await asyncio.get_running_loop().run_in_executor(
+            None, prepare_image, image_bytes, max_edge, image_format, quality
+        )
+        cached = (mime, base64.b64encode(encoded).decode('utf-8'))
+        _payload_cache.put(key, cached)
+
+    mime, payload = cached
+    return f"data:{mime};base64,{payload}"
@@ -0,0 +1,140 @@
+"""
+Durable background job queue
+
+Jobs are rows in the jobs table, so a restart never loses work: the bot
+is a single process, so every job still running at startup was
+interrupted and is put back to pending. A
+fixed pool of asyncio workers inside the bot process claims and runs
+them with a per-type handler.
+"""
+import asyncio
+import json
+import traceback
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+# Receives the claimed job row (payload already decoded)
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobQueue:
+    """Async worker pool backed by the jobs table"""
+
+    def __init__(self, db, workers: int = 2, poll_interval: float = 5.0,
+                 heartbeat_interval: float = 15.0):
+        """
+        Initialize queue
+
+        Args:
+            db: Database instance
+            workers: Number of jobs run concurrently
+            poll_interval: Seconds an idle worker waits before checking again
+            heartbeat_interval: Seconds between heartbeats of a running job
+        """
+        self.db = db
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.running_jobs: Dict[int, Dict[str, Any]] = {}
+
+    def register(self, job_type: str, handler: JobHandler):
+        """Register the coroutine function that runs jobs of a type"""
+        self._handlers[job_type] = handler
+
+    def enqueue(self, job_type: str, book_id: Optional[int] = None,
+                payload: Optional[Dict[str, Any]] = None, max_attempts: int = 3) -> tuple:
+        """
+        Add a job (no-op if the same job is already pending or running)
+
+        Returns:
+            Tuple of (job_id, created)
+        """
+        job_id, created = self.db.add_job(
+            job_type,
+            book_id=book_id,
+            payload=json.dumps(payload, ensure_ascii=False) if payload else None,
+            max_attempts=max_attempts
+        )
+        if created and self._wakeup:
+            self._wakeup.set()
+        return job_id, created
+
+    async def start(self):
+        """Resume interrupted jobs and start the workers"""
+        if self._tasks:
+            return
+        resumed = self.db.requeue_interrupted_jobs()
+        if resumed:
+            print(f"🔄 Resumed {resumed} interrupted job(s)")
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers (their jobs are resumed on next start)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, number: int):
+        """Claim and run jobs until cancelled"""
+        while True:
+            try:
+                job = self.db.claim_next_job()
+            except Exception as e:
+                print(f"Error claiming job: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Let other idle workers check for more work
+            self._wakeup.set()
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]):
+        """Run one job with heartbeats and record its outcome"""
+        handler = self._handlers.get(job['job_type'])
+        if handler is None:
+            self.db.finish_job(job['id'], 'failed', f"No handler for job type {job['job_type']}")
+            return
+
+        job['payload'] = json.loads(job['payload']) if job.get('payload') else {}
+        self.running_jobs[job['id']] = job
+        heartbeat = asyncio.create_task(self._heartbeat(job['id']))
+        try:
+            await handler(job)
+            self.db.finish_job(job['id'], 'done')
+        except asyncio.CancelledError:
+            # Shutdown: leave the job running, it is resumed on next start
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            error = str(e) or type(e).__name__
+            if job['attempts'] < job['max_attempts']:
+                retry_in = 30 * (2 ** (job['attempts'] - 1))
+                print(f"Job {job['id']} failed (attempt {job['attempts']}), retrying in {retry_in}s: {error}")
+                self.db.finish_job(job['id'], 'pending', error, retry_in=retry_in)
+            else:
+                print(f"Job {job['id']} failed permanently: {error}")
+                self.db.finish_job(job['id'], 'failed', error)
+        finally:
+            heartbeat.cancel()
+            self.running_jobs.pop(job['id'], None)
+
+    async def _heartbeat(self, job_id: int):
+        """Update the heartbeat of a running job periodically"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.db.heartbeat_job(job_id)
+            except Exception as e:
+                print(f"Error updating job heartbeat: {str(e)}")
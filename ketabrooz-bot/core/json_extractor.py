@@ -0,0 +1,202 @@
+"""
+Tolerant JSON extraction for AI model output
+
+Models often wrap JSON in markdown fences, add prose before or after it,
+or leave trailing commas. The extractor finds the first balanced JSON
+value in the text and can be fed streamed chunks incrementally.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# content type -> {field: (expected type, required, min length)}
+CONTENT_SCHEMAS: Dict[str, Dict[str, Tuple[type, bool, int]]] = {
+    'quote': {
+        'quote': (str, True, 10),
+        'context': (str, False, 0),
+    },
+    'description': {
+        'description': (str, True, 10),
+        'key_points': (list, False, 0),
+    },
+    'summary': {
+        'summary': (str, True, 10),
+        'key_points': (list, False, 0),
+        'genre': (str, False, 0),
+        'target_audience': (str, False, 0),
+    },
+    'cover': {
+        'title': (str, False, 0),
+        'author': (str, False, 0),
+        'category': (str, False, 0),
+        'cover_description': (str, False, 0),
+        'tags': (list, False, 0),
+    },
+}
+
+
+class JSONStreamExtractor:
+    """
+    Incrementally finds the first balanced JSON value in streamed text
+
+    Usage:
+        extractor = JSONStreamExtractor()
+        for chunk in stream:
+            if extractor.feed(chunk):
+                break
+        value = extractor.value
+    """
+
+    def __init__(self):
+        self.value: Any = None
+        self.complete = False
+        self._text = ''
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Consume a chunk of text
+
+        Returns:
+            True once a complete JSON value has been parsed
+        """
+        if self.complete:
+            return True
+        self._text += chunk
+
+        while self._pos < len(self._text):
+            char = self._text[self._pos]
+            self._pos += 1
+
+            if self._start is None:
+                if char in '{[':
+                    self._start = self._pos - 1
+                    self._stack = [char]
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._stack.append(char)
+            elif char in '}]':
+                opener = self._stack.pop() if self._stack else ''
+                if (opener, char) not in (('{', '}'), ('[', ']')):
+                    # Mismatched bracket: this was not JSON, look further on
+                    self._restart()
+                    continue
+                if not self._stack:
+                    candidate = self._text[self._start:self._pos]
+                    try:
+                        self.value = loads_tolerant(candidate)
+                        self.complete = True
+                        return True
+                    except ValueError:
+                        self._restart()
+
+        return False
+
+    def _restart(self):
+        """Discard the current candidate and scan again after its start"""
+        self._pos = self._start + 1
+        self._start = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+
+def loads_tolerant(text: str) -> Any:
+    """Parse JSON, removing trailing commas if strict parsing fails"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(_strip_trailing_commas(text))
+
+
+def _strip_trailing_commas(text: str) -> str:
+    """Remove commas directly before a closing bracket (outside strings)"""
+    result = []
+    in_string = False
+    escape = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == ',':
+            rest = text[i + 1:].lstrip()
+            if rest[:1] in ('}', ']'):
+                continue
+        result.append(char)
+    return ''.join(result)
+
+
+def extract_json(text: str) -> Any:
+    """
+    Extract the first JSON value from model output
+
+    Args:
+        text: Raw model output (may contain fences or prose)
+
+    Returns:
+        Parsed JSON value
+
+    Raises:
+        ValueError: If no JSON value is found
+    """
+    extractor = JSONStreamExtractor()
+    if not extractor.feed(text or ''):
+        raise ValueError("No JSON value found in model output")
+    return extractor.value
+
+
+def validate_item(content_type: str, item: Any) -> List[str]:
+    """
+    Validate a generated item against its content type schema
+
+    Args:
+        content_type: quote, description, summary or cover
+        item: Parsed JSON item
+
+    Returns:
+        List of problems (empty if valid)
+    """
+    schema = CONTENT_SCHEMAS.get(content_type)
+    if schema is None:
+        return []
+    if not isinstance(item, dict):
+        return [f"expected object, got {type(item).__name__}"]
+
+    errors = []
+    for field, (expected, required, min_length) in schema.items():
+        value = item.get(field)
+        if value is None or value == '':
+            if required:
+                errors.append(f"missing field '{field}'")
+            continue
+        if expected is list and isinstance(value, str):
+            # Models sometimes return a comma separated string for lists
+            item[field] = [part.strip() for part in value.split(',') if part.strip()]
+            continue
+        if not isinstance(value, expected):
+            errors.append(f"field '{field}' should be {expected.__name__}")
+        elif min_length and len(value.strip() if isinstance(value, str) else value) < min_length:
+            errors.append(f"field '{field}' is too short")
+    return errors
@@ -0,0 +1,142 @@
+"""
+Cache of uploaded media references
+
+Telegram keeps every uploaded photo and document; sending it again only
+needs its (id, access_hash, file_reference). The media_refs table maps
+(source media, transform) to the reference of the uploaded result, e.g.
+('media:5123…', 'watermark-image:…') to the watermarked cover, so the
+same cover published again costs no download, watermarking or upload.
+
+File references expire after a while. Each entry remembers a message
+that contains the media (the channel post, or the source message), and
+refresh() re-fetches it for a fresh reference; if that fails the entry
+is dropped and the caller prepares the media from scratch.
+"""
+from typing import Any, Optional, Union
+from telethon import TelegramClient, utils
+from telethon.tl.types import (
+    Document, InputDocument, InputPhoto, MessageMediaDocument, MessageMediaPhoto, Photo
+)
+
+
+# Transform of media sent as it is (no watermark)
+ORIGINAL = 'original'
+
+MediaRef = Union[InputPhoto, InputDocument]
+
+
+def _unwrap(media: Any) -> Any:
+    """Photo/Document held by a message media (other objects unchanged)"""
+    if isinstance(media, MessageMediaPhoto):
+        return media.photo
+    if isinstance(media, MessageMediaDocument):
+        return media.document
+    return media
+
+
+def media_key(media: Any) -> Optional[str]:
+    """
+    Source key of a media object or stored media id
+
+    Args:
+        media: Photo/Document (or a message media holding one), a bot API
+            file id, or the numeric media id stored as cover_file_id
+
+    Returns:
+        'media:<id>', or None if the media has no id
+    """
+    if isinstance(media, str):
+        resolved = utils.resolve_bot_file_id(media)
+        if resolved is not None:
+            return f"media:{resolved.id}"
+        return f"media:{media}" if media.isdigit() else None
+    media = _unwrap(media)
+    if isinstance(media, (Photo, Document)):
+        return f"media:{media.id}"
+    return None
+
+
+def message_key(chat_id: int, message_id: int) -> str:
+    """Source key of the media of a message"""
+    return f"msg:{chat_id}:{message_id}"
+
+
+class MediaCache:
+    """Uploaded media references stored in the media_refs table"""
+
+    def __init__(self, db, client: TelegramClient):
+        """
+        Initialize cache
+
+        Args:
+            db: Database instance
+            client: Client the media was uploaded with (references are per account)
+        """
+        self.db = db
+        self.client = client
+
+    def get(self, source_key: str, transform: str) -> Optional[MediaRef]:
+        """Reference of an uploaded result (None if not cached)"""
+        row = self.db.get_media_ref(source_key, transform)
+        if not row:
+            return None
+        if row['media_type'] == 'photo':
+            return InputPhoto(id=row['media_id'], access_hash=row['access_hash'],
+                              file_reference=row['file_reference'] or b'')
+        return InputDocument(id=row['media_id'], access_hash=row['access_hash'],
+                             file_reference=row['file_reference'] or b'')
+
+    def remember(self, source_key: str, transform: str, media: Any,
+                 chat_id: Optional[int] = None, message_id: Optional[int] = None) -> bool:
+        """
+        Store the reference of uploaded media
+
+        Args:
+            source_key: Key of the source media (media_key/message_key)
+            transform: What was done to it (ORIGINAL, a watermark key, ...)
+            media: Uploaded Photo/Document or the message media holding it
+            chat_id: Chat of a message containing the media, for refreshes
+            message_id: That message's ID
+
+        Returns:
+            False if the media is not a photo or document
+        """
+        media = _unwrap(media)
+        if isinstance(media, Photo):
+            media_type = 'photo'
+        elif isinstance(media, Document):
+            media_type = 'document'
+        else:
+            return False
+
+        self.db.save_media_ref(
+            source_key, transform, media_type, media.id, media.access_hash,
+            media.file_reference, chat_id=chat_id, message_id=message_id
+        )
+        return True
+
+    async def refresh(self, source_key: str, transform: str) -> Optional[MediaRef]:
+        """
+        Get a fresh file reference after FileReferenceExpiredError
+
+        Returns:
+            The refreshed reference, or None (the entry is dropped) if no
+            message with the media can be fetched
+        """
+        row = self.db.get_media_ref(source_key, transform)
+        if row and row['chat_id'] and row['message_id']:
+            try:
+                msg = await self.client.get_messages(row['chat_id'], ids=row['message_id'])
+                media = _unwrap(msg.media) if msg else None
+                if isinstance(media, (Photo, Document)) and media.id == row['media_id']:
+                    self.remember(source_key, transform, media)
+                    return self.get(source_key, transform)
+            except Exception as e:
+                print(f"Error refreshing media reference: {str(e)}")
+
+        self.forget(source_key, transform)
+        return None
+
+    def forget(self, source_key: str, transform: str):
+        """Drop a cached reference"""
+        self.db.delete_media_ref(source_key, transform)
@@ -0,0 +1,270 @@
+"""
+Durable publish queue
+
+Channel posts are rows in the publish_queue table and a single worker
+sends them, so a burst of posts or a restart never loses one:
+
+- A token bucket per channel keeps sends under Telegram's limit for bots
+  (about 20 messages a minute to one channel); a burst is spread out
+  instead of failing.
+- FloodWaitError pauses the channel for the seconds Telegram asks for
+  and reschedules the post; it does not count as a failed attempt.
+- Every post has an idempotency key (one post per content and channel by
+  default) and a Telegram random_id derived from it. Telegram refuses a
+  repeated random_id, so retrying a send whose response was lost cannot
+  post twice.
+- Attempts and the latency from enqueueing to delivery are recorded.
+"""
+import asyncio
+import hashlib
+import time
+import traceback
+from typing import Any, Dict, List, Optional, Tuple
+from telethon.errors import FloodWaitError, RandomIdDuplicateError, SlowModeWaitError
+from core.publisher import Publisher, PreparedPost
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a fixed rate"""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        """
+        Initialize bucket
+
+        Args:
+            rate_per_minute: Sustained sends per minute
+            burst: Sends allowed back to back after an idle period
+        """
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 = now)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    async def acquire(self):
+        """Wait for a token and take it"""
+        while True:
+            wait = self.delay()
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """Hold all sends for a while (flood wait); the bucket restarts empty"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+def random_id_for(key: str) -> int:
+    """Stable signed 64-bit Telegram random_id of an idempotency key"""
+    return int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:8], 'big', signed=True)
+
+
+class PublishQueue:
+    """Rate-limited, retrying sender backed by the publish_queue table"""
+
+    def __init__(self, db, publisher: Publisher, rate_per_minute: float = 20, burst: int = 3,
+                 max_attempts: int = 5, poll_interval: float = 30.0):
+        """
+        Initialize queue
+
+        Args:
+            db: Database instance
+            publisher: Publisher used to prepare and send posts
+            rate_per_minute: Sustained sends per minute per channel
+            burst: Sends allowed back to back per channel
+            max_attempts: Failed sends before a post is given up
+            poll_interval: Seconds the idle worker waits before checking again
+        """
+        self.db = db
+        self.publisher = publisher
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._buckets: Dict[int, TokenBucket] = {}
+        # Posts prepared before they were queued (staging), by item ID
+        self._posts: Dict[int, PreparedPost] = {}
+        self._waiters: Dict[int, List[asyncio.Future]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def enqueue(self, content_id: int, post: Optional[PreparedPost] = None,
+                key: Optional[str] = None) -> Tuple[int, bool]:
+        """
+        Queue content for the target channel
+
+        Args:
+            content_id: Approved content ID
+            post: Post already prepared for it (prepared when sent otherwise)
+            key: Idempotency key (default: one post per content and channel)
+
+        Returns:
+            Tuple of (item_id, created); created is False if the key was
+            already queued or sent
+        """
+        channel_id = self.publisher.target_channel_id
+        key = key or f"content:{content_id}:{channel_id}"
+        item_id, created = self.db.add_publish_item(content_id, channel_id, key, self.max_attempts)
+        if post is not None:
+            if created:
+                self._posts[item_id] = post
+            else:
+                self.publisher.discard(post)
+        if created and self._wakeup:
+            self._wakeup.set()
+        return item_id, created
+
+    async def publish(self, content_id: int, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Queue content and wait until it is sent or given up
+
+        Args:
+            content_id: Approved content ID
+            timeout: Seconds to wait at most (the post stays queued after)
+
+        Returns:
+            The queue item (status 'sent', 'failed', or still 'pending')
+        """
+        item_id, _ = self.enqueue(content_id)
+        item = self.db.get_publish_item(item_id)
+        if item['status'] in ('sent', 'failed'):
+            return item
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(item_id, []).append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = self._waiters.get(item_id, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._waiters.pop(item_id, None)
+        return self.db.get_publish_item(item_id)
+
+    def queued_content_ids(self) -> List[int]:
+        """Content waiting to be sent (not to be picked again)"""
+        return self.db.get_queued_content_ids()
+
+    async def start(self):
+        """Resume interrupted posts and start the worker"""
+        if self._task:
+            return
+        resumed = self.db.requeue_interrupted_publishes()
+        if resumed:
+            print(f"🔄 Resumed {resumed} interrupted post(s)")
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        """Cancel the worker (its post is resumed on next start)"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for post in self._posts.values():
+            self.publisher.discard(post)
+        self._posts.clear()
+
+    def _bucket(self, channel_id: int) -> TokenBucket:
+        if channel_id not in self._buckets:
+            self._buckets[channel_id] = TokenBucket(self.rate_per_minute, self.burst)
+        return self._buckets[channel_id]
+
+    async def _worker(self):
+        """Claim and send due posts until cancelled"""
+        while True:
+            try:
+                item = self.db.claim_next_publish()
+            except Exception as e:
+                print(f"Error claiming post: {str(e)}")
+                item = None
+
+            if item is None:
+                delay = self.db.get_next_publish_delay()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(),
+                        timeout=self.poll_interval if delay is None else min(delay, self.poll_interval)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._deliver(item)
+
+    async def _deliver(self, item: Dict[str, Any]):
+        """Send one claimed post and record the outcome"""
+        item_id = item['id']
+        post = self._posts.pop(item_id, None)
+        bucket = self._bucket(item['channel_id'])
+        try:
+            content = self.db.get_content(item['content_id'])
+            if not content or content['status'] != 'approved':
+                status = content['status'] if content else 'deleted'
+                self._finish(item_id, 'failed', error=f"Content is {status}")
+                return
+
+            if post is None:
+                post = await self.publisher.prepare(item['content_id'])
+            await bucket.acquire()
+            message_id = await self.publisher.send(post, random_id=random_id_for(item['idempotency_key']))
+            post = None
+            self._finish(item_id, 'sent', message_id=message_id)
+
+        except (FloodWaitError, SlowModeWaitError) as e:
+            # Not a failure: wait as long as Telegram asks, for the whole channel
+            bucket.pause(e.seconds)
+            if post is not None:
+                self._posts[item_id] = post
+                post = None
+            print(f"⏳ Flood wait {e.seconds}s, post {item_id} rescheduled")
+            self.db.finish_publish(item_id, 'pending', f"Flood wait {e.seconds}s",
+                                   retry_in=e.seconds, count_attempt=False)
+
+        except RandomIdDuplicateError:
+            # An earlier attempt was delivered but its response was lost
+            message_id = await self.publisher.recover_sent(post)
+            self._finish(item_id, 'sent', message_id=message_id)
+
+        except asyncio.CancelledError:
+            # Shutdown: the item stays 'sending' and is resumed on next start
+            raise
+
+        except Exception as e:
+            traceback.print_exc()
+            error = str(e) or type(e).__name__
+            if item['attempts'] < item['max_attempts']:
+                retry_in = 30 * (2 ** (item['attempts'] - 1))
+                print(f"Post {item_id} failed (attempt {item['attempts']}), retrying in {retry_in}s: {error}")
+                self.db.finish_publish(item_id, 'pending', error, retry_in=retry_in)
+            else:
+                print(f"Post {item_id} failed permanently: {error}")
+                self._finish(item_id, 'failed', error=error)
+
+        finally:
+            if post is not None:
+                self.publisher.discard(post)
+
+    def _finish(self, item_id: int, status: str, error: Optional[str] = None,
+                message_id: Optional[int] = None):
+        """Record a final outcome and wake up anyone waiting for it"""
+        self.db.finish_publish(item_id, status, error, message_id=message_id)
+        for future in self._waiters.pop(item_id, []):
+            if not future.done():
+                future.set_result(status)
@@ -1,202 +1,529 @@
 """
 Publisher for sending content to target channel
+
+Publishing has two stages: prepare() formats the text and fetches and
+watermarks the media (optionally uploading it to Telegram ahead of
+time), and send() is then a single send call. Posts are not sent from
+here directly but through the publish queue (core/publish_queue.py),
+which rate-limits and retries send(); the schedule engine runs
+prepare() before the slot (core/staging.py).
+
+Content with album media (content_media table), or a quote with a
+rendered quote card, is sent as one album: every item is prepared and
+uploaded concurrently in prepare(), and send() is a single
+SendMultiMediaRequest for up to ALBUM_MAX_MEDIA items.
 """
-from telethon import TelegramClient
-from typing import Optional, List
+from telethon import TelegramClient, helpers, utils
+from telethon.errors import FileReferenceExpiredError
+from telethon.tl.functions.messages import (
+    SendMediaRequest, SendMessageRequest, SendMultiMediaRequest, UploadMediaRequest
+)
+from telethon.tl.types import InputMediaUploadedDocument, InputMediaUploadedPhoto, InputSingleMedia
+from typing import Any, List, Optional, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
 from database.db import Database
 from handlers.footer import format_footer
-from handlers.footer import format_footer
-from config import ADMIN_USER_ID
-from utils.watermark import add_watermark_image, add_watermark_video
-import os
+from config import ADMIN_USER_ID, DOWNLOAD_WORKERS, MEDIA_TEMP_DIR, IMAGE_SPOOL_MB
+from utils.watermark import FONT_PATH, add_watermark_image, add_watermark_video, watermark_key
+from utils.downloader import ParallelDownloader
+from utils import telethon_compat
+from core.media_cache import MediaCache, media_key, message_key
+from core.image_creator import ImageCreator
+import asyncio
 import io
+import os
+import tempfile
+import time
+
+
+# Telegram sends at most this many media as one album
+ALBUM_MAX_MEDIA = 10
+# Longest media caption Telegram accepts (UTF-16 code units; text messages allow 4096)
+CAPTION_MAX_LENGTH = 1024
+# Channel messages after the last recorded one searched for a post whose send response was lost
+RECOVER_WINDOW = 50
+
+
+@dataclass
+class AlbumItem:
+    """One uploaded media of an album post"""
+    media: Any
+    # (source key, transform) in the media cache, if the media is cached
+    media_ref_key: Optional[Tuple[str, str]] = None
+
+
+@dataclass
+class PreparedPost:
+    """Content ready to be sent with one call"""
+    content_id: int
+    text: str
+    # Anything send_file accepts (uploaded media, file id, bytes, path); None for text
+    media: Any = None
+    # Local files to remove once the post is sent or discarded
+    temp_files: List[str] = field(default_factory=list)
+    # (source key, transform) of watermarked media in the media cache
+    media_ref_key: Optional[Tuple[str, str]] = None
+    # Two or more media sent as one album, the text as the first caption (media is None then)
+    album: List[AlbumItem] = field(default_factory=list)
+    prepared_at: float = field(default_factory=time.monotonic)
 
 
 class Publisher:
     """Publisher for content to target channel"""
-    
+
     def __init__(self, bot: TelegramClient, target_channel_id: int, db: Database):
         self.bot = bot
         self.target_channel_id = target_channel_id
         self.db = db
-    
-    async def publish_content(self, content_id: int) -> Optional[int]:
+        os.makedirs(MEDIA_TEMP_DIR, exist_ok=True)
+        self.downloader = ParallelDownloader(bot, workers=DOWNLOAD_WORKERS, temp_dir=MEDIA_TEMP_DIR)
+        self.media_cache = MediaCache(db, bot)
+
+    async def prepare(self, content_id: int, upload: bool = False) -> PreparedPost:
+        """
+        Format the text and get the media ready to send
+
+        Args:
+            content_id: Approved content ID
+            upload: Upload watermarked media to Telegram now, so sending
+                only references it (used for staging ahead of a slot)
+
+        Raises:
+            Exception: If the content is missing or not approved
+        """
+        content = self.db.get_content(content_id)
+        if not content:
+            raise Exception("Content not found")
+
+        if content['status'] != 'approved':
+            raise Exception(f"Content status is {content['status']}, must be 'approved'")
+
+        post = PreparedPost(content_id=content_id, text=self._format_text(content))
+        try:
+            album_media = self.db.get_content_media(content_id)
+            card = await self._quote_card(content, post.text)
+            if album_media or card is not None:
+                await self._prepare_album(content, post, album_media, card)
+            else:
+                await self._prepare_media(content, post, upload)
+        except Exception:
+            self.discard(post)
+            raise
+        return post
+
+    async def send(self, post: PreparedPost, random_id: Optional[int] = None) -> int:
+        """
+        Send a prepared post and mark the content as published
+
+        The post is discarded once sent; after a failure it is kept, so
+        it can be sent again. The IDs of all sent messages (one per album
+        item) are recorded in published_messages.
+
+        Args:
+            post: Prepared post
+            random_id: Telegram random_id of the message (of the first
+                album item; the others follow it). Sending twice with the
+                same one fails with RandomIdDuplicateError instead of
+                posting twice (None for a random one)
+
+        Returns:
+            Message ID in the target channel (of the first album item)
+
+        Raises:
+            Exception: If the content is no longer approved or sending failed
+        """
+        content = self.db.get_content(post.content_id)
+        if not content or content['status'] != 'approved':
+            raise Exception(f"Content {post.content_id} is no longer approved")
+        if post.media is None and not post.album and not post.text:
+            raise Exception("Nothing to send")
+
+        try:
+            messages = await self._send_request(post, random_id)
+        except FileReferenceExpiredError:
+            # Cached upload with a stale reference: refresh it once
+            if not await self._refresh_media(post):
+                raise
+            messages = await self._send_request(post, random_id)
+        if not messages or not messages[0]:
+            raise Exception("Failed to send message")
+
+        items = post.album or [AlbumItem(post.media, post.media_ref_key)]
+        for item, msg in zip(items, messages):
+            if item.media_ref_key and msg and msg.media:
+                # The channel post is where a fresh reference can be fetched later
+                self.media_cache.remember(*item.media_ref_key, msg.media,
+                                          chat_id=self.target_channel_id, message_id=msg.id)
+        message_ids = [msg.id for msg in messages if msg]
+        self.mark_published(post.content_id, message_ids[0])
+        self.db.add_published_messages(post.content_id, self.target_channel_id, message_ids)
+        self.discard(post)
+        return message_ids[0]
+
+    async def _refresh_media(self, post: PreparedPost) -> bool:
+        """Refresh the cached references of a post (False if any cannot be)"""
+        items = post.album or [AlbumItem(post.media, post.media_ref_key)]
+        cached = [item for item in items if item.media_ref_key]
+        if not cached:
+            return False
+        for item in cached:
+            media = await self.media_cache.refresh(*item.media_ref_key)
+            if media is None:
+                return False
+            item.media = media
+        if not post.album:
+            post.media = cached[0].media
+        return True
+
+    async def _send_request(self, post: PreparedPost, random_id: Optional[int]) -> list:
+        """Send a post to the target channel and return its messages"""
+        # send_file/send_message take no random_id, so the request is built
+        # with the same helpers they use (utils/telethon_compat.py)
+        entity = await self.bot.get_input_entity(self.target_channel_id)
+        text, entities = await telethon_compat.parse_text(self.bot, post.text)
+        if post.album:
+            return await self._send_album_request(entity, post.album, text, entities, random_id)
+        if isinstance(post.media, io.IOBase):
+            # A retried send reads the buffer again from its start
+            post.media.seek(0)
+        if post.media is not None:
+            media = await telethon_compat.input_media(self.bot, post.media)
+            request = SendMediaRequest(entity, media, message=text, entities=entities, random_id=random_id)
+        else:
+            request = SendMessageRequest(entity, text, entities=entities, random_id=random_id)
+        return telethon_compat.response_messages(self.bot, request, await self.bot(request), entity)
+
+    async def _send_album_request(self, entity, album: List[AlbumItem], text: str,
+                                  entities: list, random_id: Optional[int]) -> list:
+        """Send uploaded media as one album; the caption goes on the first item"""
+        if random_id is None:
+            random_id = helpers.generate_random_long()
+        multi_media = []
+        for index, item in enumerate(album):
+            media = await telethon_compat.input_media(self.bot, item.media)
+            multi_media.append(InputSingleMedia(
+                media,
+                # Consecutive ids, so a retried album is refused as a whole
+                random_id=(random_id + index + 2 ** 63) % 2 ** 64 - 2 ** 63,
+                message=text if index == 0 else '',
+                entities=entities if index == 0 else None
+            ))
+        request = SendMultiMediaRequest(entity, multi_media=multi_media)
+        result = await self.bot(request)
+        return telethon_compat.response_messages(self.bot, request, result, entity,
+                                                 random_ids=[m.random_id for m in multi_media])
+
+    async def recover_sent(self, post: PreparedPost) -> Optional[int]:
         """
-        Publish content to target channel
+        Mark a post published whose send was refused as a duplicate
+
+        The earlier attempt was delivered but its response was lost. Bots
+        cannot read channel history, so the messages after the last
+        recorded one are fetched by ID and matched on the post's text.
+
+        Returns:
+            Message ID in the target channel (of the first album item), or
+            None if the delivered message could not be found
         """
+        message_ids = []
         try:
-            content = self.db.get_content(content_id)
-            if not content:
-                raise Exception("Content not found")
-            
-            if content['status'] != 'approved':
-                raise Exception(f"Content status is {content['status']}, must be 'approved'")
-            
-            # Get data
-            file_id = content.get('file_id')
-            source_msg_id = content.get('message_id')
-            content_type = content.get('type', 'text')
-            
-            # Format message text (hashtags and footer)
-            # Priorities: text field -> caption field -> empty
-            original_text = content.get('text') or content.get('caption') or ''
-            
-            # Get hashtags
-            hashtags = self._get_hashtags_for_content(content_type)
-            message_text = original_text
-            
-            if hashtags:
-                hashtag_text = ' '.join([f'#{tag}' for tag in hashtags])
-                if message_text:
-                    message_text += f'\n\n{hashtag_text}'
-                else:
-                    message_text = hashtag_text
-            
-            # Add footer
-            footer_text = format_footer(content_id, content_type, self.db)
-            if footer_text:
-                if message_text:
-                    message_text += f'\n\n{footer_text}'
-                else:
-                    message_text = footer_text
-            
-            msg = None
-            
-            # Check if we should use book cover
-            use_cover = content.get('use_cover', False)
-            book_id = content.get('book_id')
-            
-            # If use_cover is True, get cover from book
-            if use_cover and book_id:
-                try:
+            text, _ = await telethon_compat.parse_text(self.bot, post.text)
+            last_id = self.db.get_last_published_message_id(self.target_channel_id)
+            if text.strip() and last_id is not None:
+                ids = list(range(last_id + 1, last_id + 1 + RECOVER_WINDOW))
+                messages = [msg for msg in await self.bot.get_messages(self.target_channel_id, ids=ids) if msg]
+                for msg in messages:
+                    if (msg.message or '').strip() == text.strip():
+                        if msg.grouped_id:
+                            message_ids = [m.id for m in messages if m.grouped_id == msg.grouped_id]
+                        else:
+                            message_ids = [msg.id]
+                        break
+        except Exception as e:
+            print(f"Error recovering sent message of content {post.content_id}: {str(e)}")
+
+        if not message_ids:
+            print(f"⚠️ Content {post.content_id} was delivered but its channel message was not found; "
+                  f"it is recorded without a message ID")
+            self.mark_published(post.content_id, None)
+            return None
+        self.mark_published(post.content_id, message_ids[0])
+        self.db.add_published_messages(post.content_id, self.target_channel_id, message_ids)
+        return message_ids[0]
+
+    def mark_published(self, content_id: int, message_id: Optional[int]):
+        """Record content as published in the target channel"""
+        self.db.update_content(
+            content_id,
+            status='published',
+            published_date=datetime.now(),
+            published_message_id=message_id
+        )
+
+    def discard(self, post: PreparedPost):
+        """Remove a post's temporary files"""
+        for path in post.temp_files:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                pass
+        post.temp_files = []
+
+    def _format_text(self, content: dict) -> str:
+        """Message text with hashtags and footer"""
+        content_type = content.get('type', 'text')
+
+        # Priorities: text field -> caption field -> empty
+        message_text = content.get('text') or content.get('caption') or ''
+
+        # Get hashtags
+        hashtags = self._get_hashtags_for_content(content_type)
+        if hashtags:
+            hashtag_text = ' '.join([f'#{tag}' for tag in hashtags])
+            if message_text:
+                message_text += f'\n\n{hashtag_text}'
+            else:
+                message_text = hashtag_text
+
+        # Add footer
+        footer_text = format_footer(content['id'], content_type, self.db)
+        if footer_text:
+            if message_text:
+                message_text += f'\n\n{footer_text}'
+            else:
+                message_text = footer_text
+
+        return message_text
+
+    async def _prepare_media(self, content: dict, post: PreparedPost, upload: bool):
+        """Set the post's media: watermarked file, or the original as fallback"""
+        file_id = content.get('file_id')
+        source_msg_id = content.get('message_id')
+        content_type = content.get('type', 'text')
+
+        # Check if we should use book cover
+        use_cover = content.get('use_cover', False)
+        book_id = content.get('book_id')
+
+        # If use_cover is True, get cover from book
+        if use_cover and book_id:
+            try:
+                book = self.db.get_book(book_id)
+                if book and book.get('cover_file_id'):
+                    file_id = book.get('cover_file_id')
+                    # Change content_type to 'image' so it's sent as photo
+                    content_type = 'image'
+            except Exception as e:
+                print(f"Error getting book cover: {str(e)}")
+
+        # Pure text
+        if not (file_id or (content_type != 'text' and source_msg_id) or use_cover):
+            return
+
+        file_to_send = None
+        # Only a real watermarked output goes into the media cache
+        watermarked = False
+        watermark = content_type in ['image', 'video', 'cover'] or use_cover
+
+        # Watermarked before: send the upload again, nothing to download
+        source_key = self._source_key(file_id, source_msg_id, book_id if use_cover else None)
+        transform = watermark_key('video' if content_type == 'video' else 'image')
+        if watermark and source_key:
+            cached = self.media_cache.get(source_key, transform)
+            if cached is not None:
+                post.media = cached
+                post.media_ref_key = (source_key, transform)
+                return
+
+        # Download media if needed for watermarking
+        if watermark:
+            try:
+                # Determine source - priority: book cover -> file_id -> source_msg
+                media_source = None
+                if use_cover and book_id:
+                    # Get cover from admin's chat
                     book = self.db.get_book(book_id)
-                    if book and book.get('cover_file_id'):
-                        file_id = book.get('cover_file_id')
-                        # Change content_type to 'image' so it's sent as photo
-                        content_type = 'image'
-                except Exception as e:
-                    print(f"Error getting book cover: {str(e)}")
-            
-            # 1. Handle media files (images, videos) or book covers
-            if file_id or (content_type != 'text' and source_msg_id) or use_cover:
-                file_to_send = None
-                
-                # Download media if needed for watermarking
-                if content_type in ['image', 'video', 'cover'] or use_cover:
-                    try:
-                        # Determine source - priority: book cover -> file_id -> source_msg
-                        media_source = None
-                        if use_cover and book_id:
-                            # Get cover from admin's chat
-                            book = self.db.get_book(book_id)
-                            if book and book.get('cover_message_id'):
-                                try:
-                                    cover_msg = await self.bot.get_messages(
-                                        ADMIN_USER_ID,
-                                        ids=book.get('cover_message_id')
-                                    )
-                                    if cover_msg and cover_msg.media:
-                                        media_source = cover_msg.media
-                                except Exception as e:
-                                    print(f"Error getting cover from storage: {str(e)}")
-                        
-                        if not media_source and file_id:
-                            media_source = file_id
-                        
-                        if not media_source and source_msg_id:
-                            source_msg = await self.bot.get_messages(ADMIN_USER_ID, ids=source_msg_id)
-                            if source_msg and source_msg.media:
-                                media_source = source_msg.media
-                        
-                        if media_source:
-                            # Download
-                            path = await self.bot.download_media(media_source)
-                            
-                            if content_type == 'image' or content_type == 'cover':
-                                with open(path, 'rb') as f:
-                                    img_data = f.read()
-                                
-                                # Watermark
-                                watermarked_data = add_watermark_image(img_data)
-                                file_to_send = watermarked_data
-                                
-                                # Cleanup
-                                os.remove(path)
-                                
-                            elif content_type == 'video':
-                                # Watermark video (if ffmpeg exists)
-                                watermarked_path = add_watermark_video(path)
-                                file_to_send = watermarked_path
-                                # Cleanup if different
-                                if watermarked_path != path:
-                                    # We will remove original, send watermarked
-                                    # Note: send_file with path usually works
-                                    pass
-                                
-                    except Exception as e:
-                        print(f"Watermark failed, sending original: {e}")
-                        # Fallback to original logic happens if file_to_send is None
-                
-                # Send
-                if file_to_send:
-                   msg = await self.bot.send_file(
-                        self.target_channel_id,
-                        file_to_send,
-                        caption=message_text
-                   )
-                   # Clean up video file if it was a path
-                   if isinstance(file_to_send, str) and os.path.exists(file_to_send):
-                       try:
-                           os.remove(file_to_send)
-                           if content_type == 'video':
-                               original_path = file_to_send.replace('_watermarked.mp4', '.mp4')
-                               if os.path.exists(original_path): os.remove(original_path)
-                       except: pass
-                
-                # Fallback to original method (no watermark or failed)
-                elif file_id:
-                    msg = await self.bot.send_file(
-                        self.target_channel_id,
-                        file_id,
-                        caption=message_text
-                    )
-                elif source_msg_id:
+                    if book and book.get('cover_message_id'):
+                        try:
+                            cover_msg = await self.bot.get_messages(
+                                ADMIN_USER_ID,
+                                ids=book.get('cover_message_id')
+                            )
+                            if cover_msg and cover_msg.media:
+                                media_source = cover_msg.media
+                        except Exception as e:
+                            print(f"Error getting cover from storage: {str(e)}")
+
+                if not media_source and file_id:
+                    media_source = file_id
+
+                if not media_source and source_msg_id:
                     source_msg = await self.bot.get_messages(ADMIN_USER_ID, ids=source_msg_id)
                     if source_msg and source_msg.media:
-                        msg = await self.bot.send_file(
-                            self.target_channel_id,
-                            source_msg.media,
-                            caption=message_text
-                        )
-                    else:
-                        msg = await self.bot.send_message(self.target_channel_id, message_text)
-            
-            # 3. Handle pure text
+                        media_source = source_msg.media
+
+                if media_source and content_type in ('image', 'cover'):
+                    # In memory; only an unusually large image spills to a temp file
+                    with tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_MB * 1024 * 1024,
+                                                       dir=MEDIA_TEMP_DIR) as buffer:
+                        await self.downloader.download_to(media_source, buffer)
+                        image = await asyncio.to_thread(add_watermark_image, buffer)
+                        watermarked = image is not None
+                        if not watermarked:
+                            buffer.seek(0)
+                            image = buffer.read()
+                    # Named, so Telegram gets it as a JPEG photo
+                    file_to_send = io.BytesIO(image)
+                    file_to_send.name = 'image.jpg'
+
+                elif media_source and content_type == 'video':
+                    path = (await self.downloader.download(media_source)).path
+                    post.temp_files.append(path)
+
+                    # Watermark video (if ffmpeg exists); the original if it failed
+                    output = await add_watermark_video(path)
+                    watermarked = output is not None
+                    file_to_send = output or path
+                    if watermarked:
+                        post.temp_files.append(output)
+
+            except Exception as e:
+                print(f"Watermark failed, sending original: {e}")
+                # Fallback to original logic happens if file_to_send is None
+
+        if file_to_send:
+            if source_key and watermarked:
+                post.media_ref_key = (source_key, transform)
+            if upload:
+                post.media = await self._upload(file_to_send, content_type)
+                if post.media_ref_key:
+                    self.media_cache.remember(*post.media_ref_key, post.media)
+                # Uploaded: the local copies are not needed any more
+                self.discard(post)
             else:
-                if message_text:
-                    msg = await self.bot.send_message(
-                        self.target_channel_id,
-                        message_text
-                    )
-            
-            if not msg:
-                raise Exception("Failed to send message")
-
-            # Update database
-            self.db.update_content(
-                content_id,
-                status='published',
-                published_date=datetime.now(),
-                published_message_id=msg.id
+                post.media = file_to_send
+
+        # Fallback to original method (no watermark or failed)
+        elif file_id:
+            post.media = file_id
+        elif source_msg_id:
+            source_msg = await self.bot.get_messages(ADMIN_USER_ID, ids=source_msg_id)
+            if source_msg and source_msg.media:
+                post.media = source_msg.media
+
+    async def _prepare_album(self, content: dict, post: PreparedPost,
+                             album_media: List[dict], card: Optional[io.BytesIO]):
+        """
+        Prepare and upload all media of an album post concurrently
+
+        Order: quote card, the content's own media (e.g. the book cover),
+        then the album media. A single media is sent as a normal post.
+        """
+        own = PreparedPost(content_id=post.content_id, text='')
+        extra = album_media[:ALBUM_MAX_MEDIA - 1 - (card is not None)]
+        if len(album_media) > len(extra):
+            print(f"Content {post.content_id}: album limited to {ALBUM_MAX_MEDIA} media")
+
+        async def upload_card() -> Optional[AlbumItem]:
+            return AlbumItem(await self._upload(card, 'image')) if card is not None else None
+
+        try:
+            card_item, _, *extra_items = await asyncio.gather(
+                upload_card(),
+                self._prepare_media(content, own, upload=True),
+                *(self._prepare_album_item(content, item) for item in extra)
+            )
+        finally:
+            self.discard(own)
+
+        own_item = AlbumItem(own.media, own.media_ref_key) if own.media is not None else None
+        items = [item for item in (card_item, own_item, *extra_items) if item is not None]
+        if len(items) == 1:
+            post.media, post.media_ref_key = items[0].media, items[0].media_ref_key
+        else:
+            post.album = items
+
+    async def _prepare_album_item(self, content: dict, item: dict) -> Optional[AlbumItem]:
+        """Watermark (or take from the media cache) and upload one album media"""
+        media_content = {
+            'id': content['id'], 'type': item['media_type'],
+            'file_id': item['file_id'], 'message_id': item['message_id']
+        }
+        prepared = PreparedPost(content_id=content['id'], text='')
+        try:
+            await self._prepare_media(media_content, prepared, upload=True)
+        finally:
+            self.discard(prepared)
+        if prepared.media is None:
+            return None
+        return AlbumItem(prepared.media, prepared.media_ref_key)
+
+    async def _quote_card(self, content: dict, text: str) -> Optional[io.BytesIO]:
+        """
+        Quote card image of a quote
+
+        Returns:
+            None if cards are off, the content is not a quote, or its post
+            text is too long to be the card's caption (sent as text then)
+        """
+        if content.get('type') != 'quote' or not content.get('text'):
+            return None
+        if self.db.get_setting('quote_card_enabled', '0') != '1':
+            return None
+        if len(text.encode('utf-16-le')) // 2 > CAPTION_MAX_LENGTH:
+            return None
+
+        book = self.db.get_book(content['book_id']) if content.get('book_id') else None
+        settings = {key: item['value'] for key, item in self.db.get_all_settings().items()}
+
+        def render() -> bytes:
+            image = ImageCreator(FONT_PATH, settings).create_quote_image(
+                content['text'], book.get('title', '') if book else '', book.get('author') if book else None
             )
-            
-            return msg.id
-        
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=90)
+            return buffer.getvalue()
+
+        try:
+            card = io.BytesIO(await asyncio.to_thread(render))
         except Exception as e:
-            print(f"Error publishing content: {str(e)}")
+            print(f"Error creating quote card: {str(e)}")
             return None
-    
+        card.name = 'quote.jpg'
+        return card
+
+    def _source_key(self, file_id: Optional[str], source_msg_id: Optional[int],
+                    cover_book_id: Optional[int]) -> Optional[str]:
+        """Media cache key of the media the content is made from"""
+        if cover_book_id:
+            book = self.db.get_book(cover_book_id)
+            if book and book.get('cover_file_id'):
+                return media_key(book['cover_file_id'])
+            if book and book.get('cover_message_id'):
+                return message_key(ADMIN_USER_ID, book['cover_message_id'])
+        if file_id:
+            return media_key(file_id)
+        if source_msg_id:
+            return message_key(ADMIN_USER_ID, source_msg_id)
+        return None
+
+    async def _upload(self, file: Any, content_type: str) -> Any:
+        """
+        Upload media to Telegram without sending it
+
+        Returns:
+            MessageMedia that send_file can reference directly
+        """
+        uploaded = await self.bot.upload_file(file)
+        if content_type == 'video':
+            attributes, mime_type = utils.get_attributes(file, supports_streaming=True)
+            media = InputMediaUploadedDocument(file=uploaded, mime_type=mime_type, attributes=attributes)
+        else:
+            media = InputMediaUploadedPhoto(file=uploaded)
+        return await self.bot(UploadMediaRequest(peer=self.target_channel_id, media=media))
+
     def _get_hashtags_for_content(self, content_type: str) -> List[str]:
         """
         Get hashtags for content based on type
@@ -210,14 +537,14 @@ class Publisher:
                 'video': 'general',
                 'audio': 'general'
             }
-            
+
             tag_type = type_mapping.get(content_type, 'general')
             hashtags = self.db.get_approved_hashtags_by_type(tag_type, count=5)
-            
+
             if tag_type != 'general':
                 general_tags = self.db.get_approved_hashtags_by_type('general', count=3)
                 hashtags.extend(general_tags)
-            
+
             return list(dict.fromkeys(hashtags))[:8]
         except Exception as e:
             print(f"Error getting hashtags: {str(e)}")
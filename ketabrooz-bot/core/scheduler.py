@@ -0,0 +1,302 @@
+"""
+Schedule execution engine
+
+Fires the active schedule_pattern rows: each row names a weekday (0 =
+Saturday, as shown in the schedule menu; NULL = every day), a local time
+in TIMEZONE, content types and a post count. The next fire time of every
+pattern sits in a min-heap, and the engine sleeps until the earliest one
+instead of polling. A lead time before each slot the oldest approved
+items of the requested types are staged (prepared and uploaded, see
+core/staging.py), so at the slot the posts only have to be sent; they
+go through the publish queue (core/publish_queue.py).
+
+Each pattern remembers the last slot it fired for, so slots missed while
+the bot was down are handled by the catch-up policy:
+    skip - drop missed slots
+    once - fire the latest missed slot once, then continue normally
+    all  - fire every missed slot (up to MAX_CATCHUP_SLOTS per pattern)
+"""
+import asyncio
+import heapq
+import itertools
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import pytz
+from core.publish_queue import PublishQueue
+from core.staging import PostStager
+
+
+CATCHUP_POLICIES = ('skip', 'once', 'all')
+MAX_CATCHUP_SLOTS = 20
+
+# Re-read the patterns at least this often, to notice rows edited elsewhere
+RESYNC_INTERVAL = 3600
+
+# Heap entry kinds
+SLOT, CATCHUP, STAGE = 'slot', 'catchup', 'stage'
+
+
+def persian_weekday(moment: datetime) -> int:
+    """Weekday with Saturday as 0 (Python's Monday=0 shifted by two)"""
+    return (moment.weekday() + 2) % 7
+
+
+def parse_content_types(value: Optional[str]) -> Optional[List[str]]:
+    """Content types of a pattern ('quote,summary'); None means all types"""
+    if not value:
+        return None
+    types = [t.strip() for t in value.split(',') if t.strip()]
+    if not types or any(t in ('all', 'همه') for t in types):
+        return None
+    return types
+
+
+def parse_time(value: Optional[str]) -> Optional[time]:
+    """Parse a pattern's HH:MM time (None if invalid)"""
+    try:
+        hour, minute = (int(part) for part in (value or '').strip().split(':')[:2])
+        return time(hour, minute)
+    except ValueError:
+        return None
+
+
+def next_fire_time(pattern: Dict[str, Any], after: datetime, tz) -> Optional[datetime]:
+    """
+    First slot of a pattern strictly after a moment
+
+    Args:
+        pattern: schedule_pattern row
+        after: Timezone-aware moment
+        tz: pytz timezone the pattern's time is in
+
+    Returns:
+        Aware datetime in tz, or None if the pattern is invalid
+    """
+    fire_time = parse_time(pattern.get('time'))
+    day = pattern.get('day_of_week')
+    if fire_time is None or (day is not None and not 0 <= day <= 6):
+        return None
+
+    local_after = after.astimezone(tz)
+    for offset in range(8):
+        date = local_after.date() + timedelta(days=offset)
+        candidate = tz.normalize(tz.localize(datetime.combine(date, fire_time)))
+        if day is not None and persian_weekday(candidate) != day:
+            continue
+        if candidate > after:
+            return candidate
+    return None
+
+
+class ScheduleEngine:
+    """Publishes approved content at the times of the schedule patterns"""
+
+    def __init__(self, db, queue: PublishQueue, timezone: str = 'Asia/Tehran',
+                 catchup: str = 'skip', stage_lead: float = 600):
+        """
+        Initialize engine
+
+        Args:
+            db: Database instance
+            queue: Publish queue the slots' posts are sent through
+            timezone: Timezone of the patterns' times
+            catchup: Policy for slots missed while the bot was down
+            stage_lead: Seconds before a slot its posts are prepared (0 = off)
+        """
+        self.db = db
+        self.queue = queue
+        self.publisher = queue.publisher
+        self.stager = PostStager(queue.publisher)
+        self.stage_lead = stage_lead
+        self._staging: Dict[Tuple[int, datetime], asyncio.Task] = {}
+        self.tz = pytz.timezone(timezone)
+        self.catchup = catchup if catchup in CATCHUP_POLICIES else 'skip'
+        self._heap: List[Tuple[float, int, int, datetime, str]] = []
+        self._counter = itertools.count()
+        self._built_at: Optional[datetime] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the engine in the running event loop"""
+        if self._task is None:
+            self._changed = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the engine"""
+        tasks = list(self._staging.values()) + ([self._task] if self._task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._staging.clear()
+        self.stager.clear()
+
+    def reload(self):
+        """Rebuild the schedule after patterns were added or changed"""
+        if self._changed:
+            self._changed.set()
+
+    def upcoming(self, limit: int = 10) -> List[Tuple[datetime, int]]:
+        """Next slots as (local time, pattern_id), earliest first"""
+        slots = [entry for entry in self._heap if entry[4] != STAGE]
+        return [(entry[3], entry[2]) for entry in heapq.nsmallest(limit, slots)]
+
+    def _push(self, slot: datetime, pattern_id: int, kind: str):
+        at = slot.timestamp()
+        if kind == STAGE:
+            at -= self.stage_lead
+        heapq.heappush(self._heap, (at, next(self._counter), pattern_id, slot, kind))
+
+    def _build(self, now: datetime):
+        """Compute the heap from all active patterns"""
+        startup = self._built_at is None
+        # Slots due since the previous build must not be lost by a rebuild
+        since = now if startup else min(self._built_at, now)
+        self._built_at = now
+
+        # Catch-up slots still waiting are kept; new ones only come at startup
+        catchup = [entry for entry in self._heap if entry[4] == CATCHUP]
+        self._heap = []
+        for entry in catchup:
+            self._push(entry[3], entry[2], CATCHUP)
+
+        for pattern in self.db.get_schedule_patterns(is_active=True):
+            last = self._last_fired(pattern)
+            if startup and last:
+                for slot in self._missed_slots(pattern, last, now):
+                    self._push(slot, pattern['id'], CATCHUP)
+
+            slot = next_fire_time(pattern, since, self.tz)
+            while slot and last and slot <= last:
+                slot = next_fire_time(pattern, slot, self.tz)
+            if slot:
+                self._push_slot(slot, pattern['id'])
+
+        # Posts staged for slots that no longer exist (pattern edited or disabled)
+        pending = {(entry[2], entry[3]) for entry in self._heap}
+        for key in [key for key in self._staging if key not in pending]:
+            self._staging.pop(key).cancel()
+            for post in self.stager.take(key):
+                self.publisher.discard(post)
+
+    def _push_slot(self, slot: datetime, pattern_id: int):
+        """Schedule a recurring slot and its staging"""
+        self._push(slot, pattern_id, SLOT)
+        if self.stage_lead > 0 and (pattern_id, slot) not in self._staging:
+            self._push(slot, pattern_id, STAGE)
+
+    def _last_fired(self, pattern: Dict[str, Any]) -> Optional[datetime]:
+        """Slot the pattern last fired for (None if never)"""
+        try:
+            last = datetime.fromisoformat(pattern['last_fired_at'])
+        except (KeyError, TypeError, ValueError):
+            return None
+        return self.tz.localize(last) if last.tzinfo is None else last
+
+    def _missed_slots(self, pattern: Dict[str, Any], last: datetime, now: datetime) -> List[datetime]:
+        """Slots between the pattern's last fire and now, per catch-up policy"""
+        if self.catchup == 'skip':
+            return []
+
+        missed = []
+        slot = next_fire_time(pattern, last, self.tz)
+        while slot and slot <= now:
+            missed.append(slot)
+            slot = next_fire_time(pattern, slot, self.tz)
+        if self.catchup == 'once':
+            return missed[-1:]
+        return missed[-MAX_CATCHUP_SLOTS:]
+
+    async def _run(self):
+        """Sleep until the earliest slot, fire it and schedule the next one"""
+        self._build(datetime.now(self.tz))
+        while True:
+            delay = RESYNC_INTERVAL
+            if self._heap:
+                delay = min(delay, max(0.0, self._heap[0][0] - datetime.now(self.tz).timestamp()))
+
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            changed = self._changed.is_set()
+            self._changed.clear()
+
+            now = datetime.now(self.tz)
+            if changed or not self._heap or self._heap[0][0] > now.timestamp():
+                # Patterns changed, or the hourly re-read
+                self._build(now)
+                continue
+
+            _, _, pattern_id, slot, kind = heapq.heappop(self._heap)
+            pattern = self.db.get_schedule_pattern(pattern_id)
+            if not pattern or not pattern.get('is_active'):
+                continue
+
+            if kind == STAGE:
+                # In the background, so slow media never delays another slot
+                self._staging[(pattern_id, slot)] = asyncio.create_task(self._stage(pattern, slot))
+                continue
+            if kind == SLOT:
+                following = next_fire_time(pattern, slot, self.tz)
+                if following:
+                    self._push_slot(following, pattern_id)
+            try:
+                await self._fire(pattern, slot)
+            except Exception as e:
+                print(f"Error running schedule {pattern_id}: {str(e)}")
+
+    def _pick_content(self, pattern: Dict[str, Any], limit: int) -> List[int]:
+        """Oldest approved content of the pattern's types not reserved by another slot"""
+        items = self.db.get_approved_content_for_schedule(
+            parse_content_types(pattern.get('content_types')),
+            limit=limit,
+            exclude_ids=self.stager.staged_content_ids() | set(self.queue.queued_content_ids())
+        )
+        return [item['id'] for item in items]
+
+    async def _stage(self, pattern: Dict[str, Any], slot: datetime):
+        """Prepare a slot's posts ahead of time"""
+        key = (pattern['id'], slot)
+        try:
+            content_ids = self._pick_content(pattern, pattern.get('posts_count') or 1)
+            posts = await self.stager.stage(key, content_ids)
+            print(f"📦 Schedule {pattern['id']} ({slot.strftime('%Y-%m-%d %H:%M')}): "
+                  f"staged {len(posts)}/{len(content_ids)}")
+        except Exception as e:
+            print(f"Error staging schedule {pattern['id']}: {str(e)}")
+
+    async def _fire(self, pattern: Dict[str, Any], slot: datetime) -> int:
+        """
+        Queue a slot's content and record the slot
+
+        Returns:
+            Number of queued items
+        """
+        key = (pattern['id'], slot)
+        staging = self._staging.pop(key, None)
+        if staging:
+            # Staging ran late (e.g. a long video): finishing it is still faster
+            await asyncio.gather(staging, return_exceptions=True)
+        posts = self.stager.take(key)
+
+        # Recorded first, so a crash while publishing does not repeat the slot
+        self.db.mark_schedule_fired(pattern['id'], slot.isoformat())
+
+        count = pattern.get('posts_count') or 1
+        queued = 0
+        for post in posts:
+            _, created = self.queue.enqueue(post.content_id, post=post)
+            queued += created
+
+        # Content that could not be staged is prepared when it is sent
+        fresh = self._pick_content(pattern, count - queued) if queued < count else []
+        for content_id in fresh:
+            _, created = self.queue.enqueue(content_id)
+            queued += created
+
+        print(f"⏰ Schedule {pattern['id']} ({slot.strftime('%Y-%m-%d %H:%M')}): "
+              f"queued {queued}/{count} ({len(posts)} staged)")
+        return queued
@@ -0,0 +1,81 @@
+"""
+Staging of scheduled posts
+
+A slot's content is prepared a lead time before the slot: text
+formatted, media downloaded, watermarked (ffmpeg for videos) and
+uploaded to Telegram. At the slot the posts are handed to the publish
+queue and each is a single send call, so a 14:30 post goes out at 14:30
+no matter how long the preparation took.
+"""
+from typing import Dict, Hashable, List, Set
+from core.publisher import Publisher, PreparedPost
+
+
+class PostStager:
+    """Holds prepared posts until their slot"""
+
+    def __init__(self, publisher: Publisher):
+        """
+        Initialize stager
+
+        Args:
+            publisher: Publisher used to prepare and send posts
+        """
+        self.publisher = publisher
+        self._staged: Dict[Hashable, List[PreparedPost]] = {}
+        # Content of slots still being prepared
+        self._reserved: Dict[Hashable, List[int]] = {}
+
+    def is_staged(self, key: Hashable) -> bool:
+        """Whether posts were prepared for a slot"""
+        return key in self._staged
+
+    def staged_content_ids(self) -> Set[int]:
+        """Content reserved by prepared or preparing slots (not to be picked twice)"""
+        ids = {post.content_id for posts in self._staged.values() for post in posts}
+        for content_ids in self._reserved.values():
+            ids.update(content_ids)
+        return ids
+
+    async def stage(self, key: Hashable, content_ids: List[int]) -> List[PreparedPost]:
+        """
+        Prepare and upload posts for a slot
+
+        Content that fails to prepare is left out (the slot picks other
+        content at publish time).
+
+        Args:
+            key: Slot identifier
+            content_ids: Content to publish in the slot
+        """
+        # Reserved before the first await, so a concurrent pick skips them
+        self._reserved[key] = list(content_ids)
+        posts = []
+        try:
+            for content_id in content_ids:
+                try:
+                    posts.append(await self.publisher.prepare(content_id, upload=True))
+                except Exception as e:
+                    print(f"Error staging content {content_id}: {str(e)}")
+        except BaseException:
+            # Cancelled (slot dropped or shutdown)
+            for post in posts:
+                self.publisher.discard(post)
+            raise
+        finally:
+            self._reserved.pop(key, None)
+        self._staged[key] = posts
+        return posts
+
+    def take(self, key: Hashable) -> List[PreparedPost]:
+        """Remove and return a slot's prepared posts (empty if not staged)"""
+        self._reserved.pop(key, None)
+        return self._staged.pop(key, [])
+
+    def clear(self):
+        """Drop all prepared posts"""
+        for posts in self._staged.values():
+            for post in posts:
+                self.publisher.discard(post)
+        self._staged.clear()
+        self._reserved.clear()
@@ -3,7 +3,7 @@ Database manager for KetabeRooz bot
 """
 import sqlite3
 import os
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set
 from datetime import datetime
 
 
@@ -36,11 +36,24 @@ class Database:
         
         conn = self._get_connection()
         try:
+            self._migrate(conn)
             conn.executescript(schema)
             conn.commit()
         finally:
             conn.close()
     
+    def _migrate(self, conn):
+        """Add columns introduced after a database was created"""
+        self._ensure_column(conn, 'books', 'source_chat_id', 'INTEGER')
+        self._ensure_column(conn, 'schedule_pattern', 'last_fired_at', 'TEXT')
+    
+    @staticmethod
+    def _ensure_column(conn, table: str, column: str, definition: str):
+        """Add a column to an existing table if it is missing"""
+        columns = [row['name'] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if columns and column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
     # Books operations
     def add_book(self, title: str, pdf_file_id: str, pdf_message_id: int, 
                  author: Optional[str] = None, category: Optional[str] = None,
@@ -63,6 +76,47 @@ class Database:
         finally:
             conn.close()
     
+    def add_books_bulk(self, books: List[Dict[str, Any]]) -> int:
+        """
+        Add many pending books in one transaction
+        
+        Args:
+            books: Dicts with title, pdf_file_id, pdf_message_id and source_chat_id
+        
+        Returns:
+            Number of inserted books
+        """
+        if not books:
+            return 0
+        conn = self._get_connection()
+        try:
+            conn.executemany("""
+                INSERT INTO books (title, pdf_file_id, pdf_message_id, source_chat_id, status)
+                VALUES (:title, :pdf_file_id, :pdf_message_id, :source_chat_id, 'pending')
+            """, books)
+            conn.commit()
+            return len(books)
+        finally:
+            conn.close()
+    
+    def get_existing_pdf_file_ids(self, pdf_file_ids: List[str]) -> set:
+        """Get which of the given PDF file IDs are already stored"""
+        existing = set()
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(pdf_file_ids), 900):
+                chunk = pdf_file_ids[start:start + 900]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(
+                    f"SELECT pdf_file_id FROM books WHERE pdf_file_id IN ({placeholders})", chunk
+                )
+                existing.update(row['pdf_file_id'] for row in cursor.fetchall())
+            return existing
+        finally:
+            conn.close()
+    
     def get_book(self, book_id: int) -> Optional[Dict[str, Any]]:
         """Get book by ID"""
         conn = self._get_connection()
@@ -133,6 +187,22 @@ class Database:
             conn.commit()
         finally:
             conn.close()
+
+    def reset_interrupted_books(self) -> int:
+        """
+        Put books left in 'processing' back to pending (at startup, no job is processing them)
+        
+        Returns:
+            Number of reset books
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE books SET status = 'pending' WHERE status = 'processing'")
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
     
     # Content operations
     def add_content(self, book_id: Optional[int] = None, content_type: str = 'text', 
@@ -211,7 +281,7 @@ class Database:
         
         allowed_fields = ['text', 'file_id', 'message_id', 'caption', 'status',
                          'approved_date', 'publish_date', 'published_date',
-                         'published_message_id', 'use_cover']
+                         'published_message_id', 'use_cover', 'views', 'reactions']
         
         updates = []
         values = []
@@ -229,6 +299,9 @@ class Database:
         conn = self._get_connection()
         try:
             conn.execute(query, values)
+            if 'text' in kwargs or 'caption' in kwargs:
+                # Stale now; the dedup index signs the row again on its next sync
+                conn.execute("DELETE FROM content_minhash WHERE content_id = ?", (content_id,))
             conn.commit()
         finally:
             conn.close()
@@ -303,6 +376,64 @@ class Database:
         finally:
             conn.close()
     
+    def get_schedule_pattern(self, pattern_id: int) -> Optional[Dict[str, Any]]:
+        """Get schedule pattern by ID"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM schedule_pattern WHERE id = ?", (pattern_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+    
+    def set_schedule_pattern_active(self, pattern_id: int, is_active: bool):
+        """Enable or disable a schedule pattern"""
+        conn = self._get_connection()
+        try:
+            conn.execute("UPDATE schedule_pattern SET is_active = ? WHERE id = ?", (is_active, pattern_id))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def mark_schedule_fired(self, pattern_id: int, fired_at: str):
+        """Record the slot a schedule pattern last fired for (ISO time with offset)"""
+        conn = self._get_connection()
+        try:
+            conn.execute("UPDATE schedule_pattern SET last_fired_at = ? WHERE id = ?", (fired_at, pattern_id))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_approved_content_for_schedule(self, content_types: Optional[List[str]] = None,
+                                          limit: int = 1,
+                                          exclude_ids: Optional[Set[int]] = None) -> List[Dict[str, Any]]:
+        """
+        Get the oldest approved content, optionally of some types only
+        
+        Args:
+            content_types: Content types to pick from (None for all)
+            limit: Maximum number of items
+            exclude_ids: Content IDs to skip (e.g. already staged for a slot)
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            query = "SELECT * FROM content WHERE status = 'approved'"
+            params: List[Any] = []
+            if content_types:
+                query += f" AND type IN ({','.join('?' * len(content_types))})"
+                params.extend(content_types)
+            if exclude_ids:
+                query += f" AND id NOT IN ({','.join('?' * len(exclude_ids))})"
+                params.extend(exclude_ids)
+            query += " ORDER BY created_date ASC, id ASC LIMIT ?"
+            params.append(limit)
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
     # Hashtag operations
     def add_hashtag(self, tag: str, tag_type: str = 'general', count: int = 1) -> int:
         """Add a new hashtag"""
@@ -460,6 +591,628 @@ class Database:
         finally:
             conn.close()
     
+    def get_published_content_since(self, since: str = '') -> List[Dict[str, Any]]:
+        """
+        Get published content whose publish date is at or after since
+        
+        Rows include ranked_date (published_date, falling back to created_date)
+        so callers can use the last value as the next watermark.
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, type, book_id, text, caption, views, reactions,
+                       COALESCE(published_date, created_date) as ranked_date
+                FROM content
+                WHERE status = 'published' AND COALESCE(published_date, created_date) >= ?
+                ORDER BY ranked_date
+            """, (since,))
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    def get_published_engagement(self) -> List[Dict[str, Any]]:
+        """Get id, views and reactions of all published content"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, views, reactions FROM content WHERE status = 'published'
+            """)
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    # Near-duplicate index operations
+    def get_content_texts_after(self, last_id: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Get id/text/caption of content rows with id greater than last_id"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, text, caption FROM content
+                WHERE id > ? ORDER BY id LIMIT ?
+            """, (last_id, limit))
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    def get_unindexed_content_texts(self, max_id: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Get id/text/caption of content rows up to max_id without a stored signature"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT c.id, c.text, c.caption FROM content c
+                LEFT JOIN content_minhash m ON m.content_id = c.id
+                WHERE c.id <= ? AND m.content_id IS NULL
+                ORDER BY c.id LIMIT ?
+            """, (max_id, limit))
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    def add_minhash_signatures(self, items: List[tuple]):
+        """
+        Store MinHash signatures in one transaction
+        
+        Args:
+            items: List of (content_id, signature_blob); an empty blob marks
+                a row without text
+        """
+        conn = self._get_connection()
+        try:
+            conn.executemany("""
+                INSERT OR REPLACE INTO content_minhash (content_id, signature) VALUES (?, ?)
+            """, items)
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_all_minhash_signatures(self) -> List[tuple]:
+        """Get all stored (content_id, signature_blob) pairs"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT content_id, signature FROM content_minhash ORDER BY content_id")
+            return [(row['content_id'], row['signature']) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    # Job queue operations
+    def add_job(self, job_type: str, book_id: Optional[int] = None,
+                payload: Optional[str] = None, max_attempts: int = 3) -> tuple:
+        """
+        Add a pending job unless the same job is already pending or running
+        
+        Returns:
+            Tuple of (job_id, created)
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id FROM jobs
+                WHERE job_type = ? AND book_id IS ? AND status IN ('pending', 'running')
+            """, (job_type, book_id))
+            row = cursor.fetchone()
+            if row:
+                return row['id'], False
+            cursor.execute("""
+                INSERT INTO jobs (job_type, book_id, payload, max_attempts)
+                VALUES (?, ?, ?, ?)
+            """, (job_type, book_id, payload, max_attempts))
+            conn.commit()
+            return cursor.lastrowid, True
+        finally:
+            conn.close()
+    
+    def claim_next_job(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest due pending job as running and return it"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1,
+                    started_at = datetime('now'), heartbeat_at = datetime('now')
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE status = 'pending' AND run_after <= datetime('now')
+                    ORDER BY run_after, id LIMIT 1
+                )
+                RETURNING *
+            """)
+            row = cursor.fetchone()
+            conn.commit()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+    
+    def heartbeat_job(self, job_id: int):
+        """Record that a running job is still alive"""
+        conn = self._get_connection()
+        try:
+            conn.execute("UPDATE jobs SET heartbeat_at = datetime('now') WHERE id = ?", (job_id,))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def finish_job(self, job_id: int, status: str, error: Optional[str] = None,
+                   retry_in: int = 0):
+        """
+        Finish a job run
+        
+        Args:
+            job_id: Job ID
+            status: 'done', 'failed', or 'pending' to retry
+            error: Error message of a failed run
+            retry_in: Seconds to wait before a retried job is run again
+        """
+        conn = self._get_connection()
+        try:
+            if status == 'pending':
+                conn.execute("""
+                    UPDATE jobs SET status = 'pending', last_error = ?,
+                        run_after = datetime('now', ?)
+                    WHERE id = ?
+                """, (error, f'+{retry_in} seconds', job_id))
+            else:
+                conn.execute("""
+                    UPDATE jobs SET status = ?, last_error = ?, finished_at = datetime('now')
+                    WHERE id = ?
+                """, (status, error, job_id))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def requeue_interrupted_jobs(self) -> int:
+        """
+        Put running jobs back to pending (at startup, all of them were interrupted)
+        
+        Returns:
+            Number of requeued jobs
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE jobs SET status = 'pending', run_after = datetime('now'),
+                    last_error = 'interrupted'
+                WHERE status = 'running'
+            """)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+    
+    def get_job_counts(self) -> Dict[str, int]:
+        """Get number of jobs per status"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT status, COUNT(*) as count FROM jobs GROUP BY status")
+            return {row['status']: row['count'] for row in cursor.fetchall()}
+        finally:
+            conn.close()
+    
+    def get_active_job_book_ids(self, job_type: str) -> List[int]:
+        """Get book IDs with a pending or running job of a type"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT book_id FROM jobs
+                WHERE job_type = ? AND status IN ('pending', 'running') AND book_id IS NOT NULL
+            """, (job_type,))
+            return [row['book_id'] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    # Publish queue operations
+    def add_publish_item(self, content_id: int, channel_id: int, idempotency_key: str,
+                         max_attempts: int = 5) -> tuple:
+        """
+        Queue a channel post unless its idempotency key is already queued or sent
+        
+        A failed item with the same key is queued again.
+        
+        Returns:
+            Tuple of (item_id, created)
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, status FROM publish_queue WHERE idempotency_key = ?",
+                           (idempotency_key,))
+            row = cursor.fetchone()
+            if row and row['status'] != 'failed':
+                return row['id'], False
+            if row:
+                cursor.execute("""
+                    UPDATE publish_queue
+                    SET status = 'pending', attempts = 0, max_attempts = ?, last_error = NULL,
+                        send_after = datetime('now'),
+                        enqueued_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+                    WHERE id = ?
+                """, (max_attempts, row['id']))
+                conn.commit()
+                return row['id'], True
+            cursor.execute("""
+                INSERT INTO publish_queue (content_id, channel_id, idempotency_key, max_attempts)
+                VALUES (?, ?, ?, ?)
+            """, (content_id, channel_id, idempotency_key, max_attempts))
+            conn.commit()
+            return cursor.lastrowid, True
+        finally:
+            conn.close()
+    
+    def get_publish_item(self, item_id: int) -> Optional[Dict[str, Any]]:
+        """Get publish queue item by ID"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM publish_queue WHERE id = ?", (item_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+    
+    def claim_next_publish(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest due pending post as sending and return it"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE publish_queue
+                SET status = 'sending', attempts = attempts + 1, started_at = datetime('now')
+                WHERE id = (
+                    SELECT id FROM publish_queue
+                    WHERE status = 'pending' AND send_after <= datetime('now')
+                    ORDER BY send_after, id LIMIT 1
+                )
+                RETURNING *
+            """)
+            row = cursor.fetchone()
+            conn.commit()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+    
+    def get_next_publish_delay(self) -> Optional[float]:
+        """Seconds until the next pending post is due (None if there is none)"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT MAX(0, (julianday(MIN(send_after)) - julianday('now')) * 86400) as delay
+                FROM publish_queue WHERE status = 'pending'
+            """)
+            row = cursor.fetchone()
+            return row['delay'] if row and row['delay'] is not None else None
+        finally:
+            conn.close()
+    
+    def finish_publish(self, item_id: int, status: str, error: Optional[str] = None,
+                       message_id: Optional[int] = None, retry_in: float = 0,
+                       count_attempt: bool = True):
+        """
+        Finish a send attempt
+        
+        Args:
+            item_id: Queue item ID
+            status: 'sent', 'failed', or 'pending' to retry
+            error: Error message of a failed attempt
+            message_id: Channel message ID of a sent post
+            retry_in: Seconds to wait before a retried post is sent again
+            count_attempt: False if the attempt does not count towards
+                max_attempts (e.g. a flood wait)
+        """
+        conn = self._get_connection()
+        try:
+            if status == 'pending':
+                conn.execute("""
+                    UPDATE publish_queue SET status = 'pending', last_error = ?,
+                        send_after = datetime('now', ?), attempts = attempts - ?
+                    WHERE id = ?
+                """, (error, f'+{retry_in} seconds', 0 if count_attempt else 1, item_id))
+            elif status == 'sent':
+                conn.execute("""
+                    UPDATE publish_queue SET status = 'sent', message_id = ?, last_error = NULL,
+                        sent_at = datetime('now'),
+                        latency_ms = CAST((julianday('now') - julianday(enqueued_at)) * 86400000 AS INTEGER)
+                    WHERE id = ?
+                """, (message_id, item_id))
+            else:
+                conn.execute("UPDATE publish_queue SET status = ?, last_error = ? WHERE id = ?",
+                             (status, error, item_id))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def requeue_interrupted_publishes(self) -> int:
+        """
+        Put posts left sending by a previous run back to pending
+        
+        Returns:
+            Number of requeued posts
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE publish_queue SET status = 'pending', send_after = datetime('now'),
+                    last_error = 'interrupted'
+                WHERE status = 'sending'
+            """)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+    
+    def get_queued_content_ids(self) -> List[int]:
+        """Get content IDs with a pending or sending post"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT content_id FROM publish_queue WHERE status IN ('pending', 'sending')")
+            return [row['content_id'] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    def get_publish_queue_stats(self) -> Dict[str, Any]:
+        """
+        Get publish queue counts per status and delivery figures of sent posts
+        
+        Returns:
+            Dict with 'counts', 'avg_latency_ms', 'max_latency_ms' and 'avg_attempts'
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT status, COUNT(*) as count FROM publish_queue GROUP BY status")
+            counts = {row['status']: row['count'] for row in cursor.fetchall()}
+            cursor.execute("""
+                SELECT AVG(latency_ms) as avg_latency_ms, MAX(latency_ms) as max_latency_ms,
+                       AVG(attempts) as avg_attempts
+                FROM publish_queue WHERE status = 'sent'
+            """)
+            stats = dict(cursor.fetchone())
+            stats['counts'] = counts
+            return stats
+        finally:
+            conn.close()
+    
+    # Media reference operations
+    def get_media_ref(self, source_key: str, transform: str) -> Optional[Dict[str, Any]]:
+        """Get a cached media reference and count the hit"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE media_refs SET hits = hits + 1
+                WHERE source_key = ? AND transform = ?
+                RETURNING *
+            """, (source_key, transform))
+            row = cursor.fetchone()
+            conn.commit()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+    
+    def save_media_ref(self, source_key: str, transform: str, media_type: str, media_id: int,
+                       access_hash: int, file_reference: bytes, chat_id: Optional[int] = None,
+                       message_id: Optional[int] = None):
+        """
+        Insert or update a media reference
+        
+        A missing chat_id/message_id keeps the message stored before.
+        """
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                INSERT INTO media_refs (source_key, transform, media_type, media_id, access_hash,
+                                        file_reference, chat_id, message_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (source_key, transform) DO UPDATE SET
+                    media_type = excluded.media_type, media_id = excluded.media_id,
+                    access_hash = excluded.access_hash, file_reference = excluded.file_reference,
+                    chat_id = COALESCE(excluded.chat_id, chat_id),
+                    message_id = COALESCE(excluded.message_id, message_id),
+                    updated_at = CURRENT_TIMESTAMP
+            """, (source_key, transform, media_type, media_id, access_hash,
+                  file_reference, chat_id, message_id))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def delete_media_ref(self, source_key: str, transform: str):
+        """Delete a cached media reference"""
+        conn = self._get_connection()
+        try:
+            conn.execute("DELETE FROM media_refs WHERE source_key = ? AND transform = ?",
+                         (source_key, transform))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    # Album operations
+    def add_content_media(self, content_id: int, media_type: str, file_id: Optional[str] = None,
+                          message_id: Optional[int] = None) -> int:
+        """Append a media item to a content's album"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO content_media (content_id, position, media_type, file_id, message_id)
+                VALUES (?, (SELECT COALESCE(MAX(position), 0) + 1 FROM content_media WHERE content_id = ?),
+                        ?, ?, ?)
+            """, (content_id, content_id, media_type, file_id, message_id))
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+    
+    def get_content_media(self, content_id: int) -> List[Dict[str, Any]]:
+        """Album media of a content, in order"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM content_media WHERE content_id = ? ORDER BY position",
+                           (content_id,))
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    def add_published_messages(self, content_id: int, channel_id: int, message_ids: List[int]):
+        """Record the channel messages of a published content (in album order)"""
+        conn = self._get_connection()
+        try:
+            conn.executemany("""
+                INSERT OR REPLACE INTO published_messages (content_id, channel_id, message_id, position)
+                VALUES (?, ?, ?, ?)
+            """, [(content_id, channel_id, message_id, position)
+                  for position, message_id in enumerate(message_ids)])
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_published_messages(self, content_id: int) -> List[Dict[str, Any]]:
+        """Channel messages of a published content, in album order"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT * FROM published_messages WHERE content_id = ?
+                ORDER BY published_at, position
+            """, (content_id,))
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def get_last_published_message_id(self, channel_id: int) -> Optional[int]:
+        """Highest recorded message ID in a channel (None if nothing was recorded)"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT MAX(message_id) as message_id FROM published_messages WHERE channel_id = ?",
+                (channel_id,)
+            )
+            return cursor.fetchone()['message_id']
+        finally:
+            conn.close()
+
+    def get_recent_published_messages(self, channel_id: int, max_age_days: int) -> List[Dict[str, Any]]:
+        """Channel messages published in the last max_age_days days (content_id, message_id)"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT content_id, message_id FROM published_messages
+                WHERE channel_id = ? AND published_at >= datetime('now', ?)
+                ORDER BY message_id
+            """, (channel_id, f'-{int(max_age_days)} days'))
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    # AI usage operations
+    def add_ai_usage(self, model: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+                     total_tokens: Optional[int] = None, cached_tokens: int = 0,
+                     cost: Optional[float] = None, latency_ms: Optional[int] = None,
+                     book_id: Optional[int] = None, content_type: Optional[str] = None,
+                     is_estimated: bool = False) -> int:
+        """Record token usage of one AI request"""
+        if total_tokens is None:
+            total_tokens = prompt_tokens + completion_tokens
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO ai_usage (book_id, content_type, model, prompt_tokens,
+                                    completion_tokens, total_tokens, cached_tokens,
+                                    cost, latency_ms, cache_hit, is_estimated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (book_id, content_type, model, prompt_tokens, completion_tokens,
+                  total_tokens, cached_tokens, cost, latency_ms, cached_tokens > 0,
+                  is_estimated))
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+    
+    def get_ai_tokens_used(self, book_id: Optional[int] = None,
+                           today_only: bool = False) -> int:
+        """Get total tokens used, optionally for one book and/or today (UTC)"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            query = "SELECT COALESCE(SUM(total_tokens), 0) as total FROM ai_usage WHERE 1=1"
+            params = []
+            
+            if book_id is not None:
+                query += " AND book_id = ?"
+                params.append(book_id)
+            
+            if today_only:
+                query += " AND created_at >= datetime('now', 'start of day')"
+            
+            cursor.execute(query, params)
+            return cursor.fetchone()['total']
+        finally:
+            conn.close()
+    
+    def get_ai_usage_breakdown(self, days: int = 7) -> Dict[str, Any]:
+        """Get AI usage grouped by model, content type and book for the last N days"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            since = f"-{int(days)} days"
+            breakdown = {}
+            
+            cursor.execute("""
+                SELECT COUNT(*) as requests,
+                       COALESCE(SUM(prompt_tokens), 0) as prompt_tokens,
+                       COALESCE(SUM(completion_tokens), 0) as completion_tokens,
+                       COALESCE(SUM(total_tokens), 0) as total_tokens,
+                       COALESCE(SUM(cost), 0) as cost,
+                       COALESCE(AVG(latency_ms), 0) as avg_latency_ms,
+                       COALESCE(SUM(cache_hit), 0) as cache_hits
+                FROM ai_usage WHERE created_at >= datetime('now', ?)
+            """, (since,))
+            breakdown['totals'] = dict(cursor.fetchone())
+            
+            cursor.execute("""
+                SELECT model, COUNT(*) as requests, SUM(total_tokens) as total_tokens
+                FROM ai_usage WHERE created_at >= datetime('now', ?)
+                GROUP BY model ORDER BY total_tokens DESC
+            """, (since,))
+            breakdown['by_model'] = [dict(row) for row in cursor.fetchall()]
+            
+            cursor.execute("""
+                SELECT COALESCE(content_type, 'other') as content_type,
+                       COUNT(*) as requests, SUM(total_tokens) as total_tokens
+                FROM ai_usage WHERE created_at >= datetime('now', ?)
+                GROUP BY content_type ORDER BY total_tokens DESC
+            """, (since,))
+            breakdown['by_type'] = [dict(row) for row in cursor.fetchall()]
+            
+            cursor.execute("""
+                SELECT u.book_id, b.title, COUNT(*) as requests,
+                       SUM(u.total_tokens) as total_tokens
+                FROM ai_usage u
+                LEFT JOIN books b ON u.book_id = b.id
+                WHERE u.created_at >= datetime('now', ?) AND u.book_id IS NOT NULL
+                GROUP BY u.book_id ORDER BY total_tokens DESC LIMIT 5
+            """, (since,))
+            breakdown['top_books'] = [dict(row) for row in cursor.fetchall()]
+            
+            return breakdown
+        finally:
+            conn.close()
+    
     # Statistics
     def get_stats(self) -> Dict[str, Any]:
         """Get bot statistics"""
@@ -14,9 +14,12 @@ CREATE TABLE IF NOT EXISTS books (
     upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     status TEXT DEFAULT 'pending',
     processed_date TIMESTAMP,
-    notes TEXT
+    notes TEXT,
+    source_chat_id INTEGER
 );
 
+CREATE INDEX IF NOT EXISTS idx_books_pdf_file_id ON books(pdf_file_id);
+
 CREATE TABLE IF NOT EXISTS content (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     book_id INTEGER,
@@ -51,7 +54,8 @@ CREATE TABLE IF NOT EXISTS schedule_pattern (
     time TEXT,
     content_types TEXT,
     posts_count INTEGER DEFAULT 1,
-    is_active BOOLEAN DEFAULT 1
+    is_active BOOLEAN DEFAULT 1,
+    last_fired_at TEXT
 );
 
 CREATE TABLE IF NOT EXISTS hashtags (
@@ -72,6 +76,117 @@ CREATE TABLE IF NOT EXISTS footer_settings (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE TABLE IF NOT EXISTS ai_usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_id INTEGER,
+    content_type TEXT,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    total_tokens INTEGER DEFAULT 0,
+    cached_tokens INTEGER DEFAULT 0,
+    cost REAL,
+    latency_ms INTEGER,
+    cache_hit BOOLEAN DEFAULT 0,
+    is_estimated BOOLEAN DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE SET NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_ai_usage_book ON ai_usage(book_id);
+CREATE INDEX IF NOT EXISTS idx_ai_usage_created ON ai_usage(created_at);
+
+-- MinHash signatures for near-duplicate detection (LSH buckets are derived on load)
+CREATE TABLE IF NOT EXISTS content_minhash (
+    content_id INTEGER PRIMARY KEY,
+    signature BLOB NOT NULL,
+    FOREIGN KEY (content_id) REFERENCES content(id) ON DELETE CASCADE
+);
+
+-- Background jobs (book processing etc.), resumed after a restart
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_type TEXT NOT NULL,
+    book_id INTEGER,
+    payload TEXT,
+    status TEXT DEFAULT 'pending',
+    attempts INTEGER DEFAULT 0,
+    max_attempts INTEGER DEFAULT 3,
+    last_error TEXT,
+    run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    heartbeat_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, run_after);
+
+-- Channel posts waiting to be sent (rate-limited and retried by core/publish_queue.py)
+CREATE TABLE IF NOT EXISTS publish_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    status TEXT DEFAULT 'pending',
+    attempts INTEGER DEFAULT 0,
+    max_attempts INTEGER DEFAULT 5,
+    last_error TEXT,
+    message_id INTEGER,
+    send_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    enqueued_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    started_at TIMESTAMP,
+    sent_at TIMESTAMP,
+    latency_ms INTEGER,
+    FOREIGN KEY (content_id) REFERENCES content(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_publish_queue_status ON publish_queue(status, send_after);
+
+-- Uploaded media reused instead of downloading and uploading again (core/media_cache.py)
+CREATE TABLE IF NOT EXISTS media_refs (
+    source_key TEXT NOT NULL,
+    transform TEXT NOT NULL,
+    media_type TEXT NOT NULL,
+    media_id INTEGER NOT NULL,
+    access_hash INTEGER NOT NULL,
+    file_reference BLOB,
+    chat_id INTEGER,
+    message_id INTEGER,
+    hits INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_key, transform)
+);
+
+-- Media sent together with a content's own media as one album (position 1, 2, ...)
+CREATE TABLE IF NOT EXISTS content_media (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    media_type TEXT NOT NULL,
+    file_id TEXT,
+    message_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (content_id) REFERENCES content(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_content_media_content ON content_media(content_id, position);
+
+-- Every channel message of a published content (one per album item)
+CREATE TABLE IF NOT EXISTS published_messages (
+    content_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    position INTEGER DEFAULT 0,
+    published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (channel_id, message_id),
+    FOREIGN KEY (content_id) REFERENCES content(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_published_messages_content ON published_messages(content_id);
+
 -- Default settings
 INSERT OR IGNORE INTO settings (key, value, type, updated_at) VALUES 
 ('ai_model', 'google/gemini-2.0-flash-exp:free', 'string', CURRENT_TIMESTAMP),
@@ -84,7 +199,10 @@ INSERT OR IGNORE INTO settings (key, value, type, updated_at) VALUES
 ('hashtag_enabled', '1', 'boolean', CURRENT_TIMESTAMP),
 ('footer_enabled', '1', 'boolean', CURRENT_TIMESTAMP),
 ('footer_show_id', '1', 'boolean', CURRENT_TIMESTAMP),
-('footer_template', 'ID: {content_id}', 'string', CURRENT_TIMESTAMP);
+('footer_template', 'ID: {content_id}', 'string', CURRENT_TIMESTAMP),
+('ai_book_token_budget', '0', 'integer', CURRENT_TIMESTAMP),
+('ai_daily_token_budget', '0', 'integer', CURRENT_TIMESTAMP),
+('quote_card_enabled', '0', 'boolean', CURRENT_TIMESTAMP);
 
 -- Default footer settings
 INSERT OR IGNORE INTO footer_settings (setting_key, setting_value, is_active) VALUES 
@@ -10,13 +10,24 @@ import io
 from utils.keyboards import books_menu_keyboard, book_list_keyboard
 from utils.helpers import format_book_info, is_admin
 from utils.storage import TelegramStorage
-from config import ADMIN_USER_ID, OPENROUTER_API_KEY, OPENROUTER_MODEL
+from utils.progress import ThrottledEditor
+from utils.downloader import ParallelDownloader
+from utils.dispatcher import run_cpu_bound
+from utils.router import router
+from config import (
+    ADMIN_USER_ID, OPENROUTER_API_KEY, OPENROUTER_MODEL, API_ID, API_HASH,
+    USERBOT_SESSION, SOURCE_GROUP_ID, DOWNLOAD_WORKERS, PIPELINE_DOWNLOAD_WORKERS, PIPELINE_EXTRACT_WORKERS, PIPELINE_AI_WORKERS
+)
 from database.db import Database
 from core.ai_generator import AIGenerator
-from core.pdf_processor import PDFProcessor
+from core.job_queue import JobQueue
+from core.book_processing import download_book_pdf, extract_pdf, analyze_and_save_book, generate_book_quote
+from core.book_pipeline import BookPipeline, default_extract_workers
+from core.archive_crawler import ArchiveCrawler
 
 
 # Placeholder functions - need to be restored from backup
+@router.route('menu_books')
 async def show_books_menu(event, db: Database):
     """Show books management menu"""
     user_id = event.sender_id
@@ -35,6 +46,7 @@ async def show_books_menu(event, db: Database):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('books_list_{page:int}')
 async def show_books_list(event, db: Database, page: int = 1):
     """Show list of books with pagination"""
     user_id = event.sender_id
@@ -56,10 +68,77 @@ async def show_books_list(event, db: Database, page: int = 1):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+def _format_scan_progress(stats: dict, final: bool = False) -> str:
+    """Progress text of the source group scan"""
+    text = "✅ **اسکن گروه تمام شد**\n\n" if final else "🔍 **در حال اسکن گروه...**\n\n"
+    text += f"📨 پیام‌های بررسی شده: {stats['scanned']}\n"
+    text += f"📄 فایل‌های PDF: {stats['pdfs']}\n"
+    text += f"➕ کتاب‌های جدید: {stats['added']}\n"
+    text += f"♻️ تکراری: {stats['duplicates']}\n"
+    if stats.get('last_id'):
+        text += f"\n📍 آخرین پیام: {stats['last_id']}"
+    return text
+
+
+@router.route('books_scan')
 async def scan_group_for_pdfs(event, db: Database, bot: TelegramClient):
-    """Scan source group for PDF files"""
-    # Placeholder - needs full implementation
-    await event.answer("در حال توسعه...", alert=True)
+    """
+    Scan source group for PDF files
+    
+    Only messages after the stored checkpoint are read, so repeated scans
+    are incremental. Reading history needs a user account (USERBOT_SESSION);
+    bot accounts can only scan if Telegram allows it for the chat.
+    """
+    user_id = event.sender_id
+    
+    if not is_admin(user_id, ADMIN_USER_ID):
+        if isinstance(event, events.CallbackQuery.Event):
+            await event.answer("❌ شما دسترسی به این بخش را ندارید.", alert=True)
+        return
+    
+    if not SOURCE_GROUP_ID:
+        await event.answer("❌ SOURCE_GROUP_ID تنظیم نشده است.", alert=True)
+        return
+    
+    await event.answer()
+    status_msg = await event.respond("🔍 در حال اتصال به گروه منبع...")
+    editor = ThrottledEditor(status_msg)
+    
+    userbot = None
+    client = bot
+    try:
+        if USERBOT_SESSION:
+            userbot = TelegramClient(StringSession(USERBOT_SESSION), API_ID, API_HASH)
+            await userbot.connect()
+            if not await userbot.is_user_authorized():
+                await status_msg.edit("❌ نشست USERBOT_SESSION معتبر نیست.")
+                return
+            client = userbot
+        
+        crawler = ArchiveCrawler(db, client, SOURCE_GROUP_ID)
+        stats = await crawler.crawl(
+            on_progress=lambda s: editor.update(_format_scan_progress(s))
+        )
+        
+        buttons = [
+            [Button.inline("🤖 پردازش کتاب‌ها", b"books_process")],
+            [Button.inline("🔙 بازگشت", b"menu_books")]
+        ]
+        await status_msg.edit(_format_scan_progress(stats, final=True), buttons=buttons)
+    except errors.BotMethodInvalidError:
+        await status_msg.edit(
+            "❌ ربات اجازه خواندن تاریخچه گروه را ندارد.\n\n"
+            "برای اسکن، متغیر USERBOT_SESSION را با نشست یک حساب کاربری عضو گروه تنظیم کنید."
+        )
+    except (errors.ChannelPrivateError, errors.ChatAdminRequiredError, ValueError) as e:
+        await status_msg.edit(f"❌ دسترسی به گروه منبع ممکن نیست: {str(e)}")
+    except Exception as e:
+        print(f"Error scanning source group: {str(e)}")
+        # Batches stored so far are kept; the next scan continues from the checkpoint
+        await status_msg.edit(f"❌ خطا در اسکن گروه: {str(e)}\n\nاسکن بعدی از آخرین نقطه ادامه می‌یابد.")
+    finally:
+        if userbot:
+            await userbot.disconnect()
 
 
 async def process_new_pdf(event, db: Database, bot: TelegramClient):
@@ -92,27 +171,21 @@ async def process_new_pdf(event, db: Database, bot: TelegramClient):
         
         # Download PDF
         await status_msg.edit("💾 در حال دانلود فایل...")
-        import io
-        file_bytes = await bot.download_media(event.message.media, file=io.BytesIO())
-        if isinstance(file_bytes, io.BytesIO):
-            pdf_data = file_bytes.getvalue()
-        elif isinstance(file_bytes, bytes):
-            pdf_data = file_bytes
-        else:
-            with open(file_bytes, 'rb') as f:
-                pdf_data = f.read()
+        editor = ThrottledEditor(status_msg)
+        
+        async def on_download(done, total):
+            await editor.update(f"💾 در حال دانلود فایل... {done * 100 // total}%")
+        
+        downloader = ParallelDownloader(bot, workers=DOWNLOAD_WORKERS)
+        pdf_data = await downloader.download_bytes(event.message.media, on_progress=on_download)
         
         # Extract basic info
         await status_msg.edit("📖 در حال استخراج اطلاعات...")
-        try:
-            extracted_text = PDFProcessor.extract_text(pdf_data, max_pages=50)
-            total_pages = PDFProcessor.get_page_count(pdf_data)
-            cover_image = PDFProcessor.extract_cover(pdf_data)
-        except Exception as e:
-            print(f"Error extracting PDF: {str(e)}")
-            extracted_text = ""
-            total_pages = 0
-            cover_image = None
+        # Parsing a large PDF takes seconds of CPU; keep other handlers running
+        extracted = await run_cpu_bound(extract_pdf, pdf_data)
+        extracted_text = extracted['text']
+        total_pages = extracted['total_pages'] or 0
+        cover_image = extracted['cover']
         
         # Get title from filename or default
         title = "کتاب بدون عنوان"
@@ -170,18 +243,22 @@ async def process_new_pdf(event, db: Database, bot: TelegramClient):
         await event.respond(f"❌ خطا در پردازش فایل: {str(e)}")
 
 
+@router.route('book_view_{book_id:int}')
 async def show_book_details(event, db: Database, book_id: int):
     """Show book details"""
     # Placeholder - needs full implementation
     await event.answer("در حال توسعه...", alert=True)
 
 
+@router.route('book_analyze_{book_id:int}')
 async def analyze_book_content(event, db: Database, bot: TelegramClient, book_id: int):
     """Analyze book text content using AI"""
     # Placeholder - needs full implementation
     await event.answer("در حال توسعه...", alert=True)
 
 
+@router.route('books_process')
+@router.route('books_process_list_{page:int}')
 async def show_process_book_list(event, db: Database, page: int = 1):
     """Show list of books that need processing (pending status)"""
     user_id = event.sender_id
@@ -207,14 +284,19 @@ async def show_process_book_list(event, db: Database, page: int = 1):
         return
     
     # Format list
+    job_counts = db.get_job_counts()
+    queued_ids = set(db.get_active_job_book_ids('process_book'))
+    
     text = f"📚 **پردازش کتاب**\n\n"
+    text += f"⏳ در صف: {job_counts.get('pending', 0)} | 🔄 در حال اجرا: {job_counts.get('running', 0)} | ❌ ناموفق: {job_counts.get('failed', 0)}\n\n"
     text += f"📋 کتاب‌های در انتظار پردازش (صفحه {page}):\n\n"
     
-    keyboard = []
+    keyboard = [[Button.inline('🚀 پردازش همه (گروهی)', b'books_process_all')]]
     for book in books_list:
         book_id = book['id']
         title = book.get('title', 'بدون عنوان')[:40]
-        keyboard.append([Button.inline(f"📖 {title}", f'book_process_{book_id}'.encode())])
+        icon = '⏳' if book_id in queued_ids else '📖'
+        keyboard.append([Button.inline(f"{icon} {title}", router.callback('book_process_{book_id:int}', book_id=book_id))])
     
     # Pagination
     total_books = len(db.get_all_books(status='pending', limit=1000, offset=0))
@@ -222,9 +304,9 @@ async def show_process_book_list(event, db: Database, page: int = 1):
     
     nav_buttons = []
     if page > 1:
-        nav_buttons.append(Button.inline('◀️ قبلی', f'books_process_list_{page - 1}'.encode()))
+        nav_buttons.append(Button.inline('◀️ قبلی', router.callback('books_process_list_{page:int}', page=page - 1)))
     if page < total_pages:
-        nav_buttons.append(Button.inline('▶️ بعدی', f'books_process_list_{page + 1}'.encode()))
+        nav_buttons.append(Button.inline('▶️ بعدی', router.callback('books_process_list_{page:int}', page=page + 1)))
     if nav_buttons:
         keyboard.append(nav_buttons)
     
@@ -236,8 +318,32 @@ async def show_process_book_list(event, db: Database, page: int = 1):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
-async def process_existing_book(event, db: Database, bot: TelegramClient, book_id: int):
-    """Process an existing book (re-analyze)"""
+@router.route('book_process_{book_id:int}')
+async def process_existing_book(event, db: Database, job_queue: JobQueue, book_id: int):
+    """Queue an existing book for processing (re-analyze)"""
+    user_id = event.sender_id
+    
+    if not is_admin(user_id, ADMIN_USER_ID):
+        if isinstance(event, events.CallbackQuery.Event):
+            await event.answer("❌ شما دسترسی به این بخش را ندارید.", alert=True)
+        return
+    
+    book = db.get_book(book_id)
+    if not book:
+        await event.answer("❌ کتاب یافت نشد.", alert=True)
+        return
+    
+    job_id, created = job_queue.enqueue('process_book', book_id=book_id)
+    if isinstance(event, events.CallbackQuery.Event):
+        if created:
+            await event.answer(f"📥 کتاب در صف پردازش قرار گرفت (کار #{job_id})", alert=True)
+        else:
+            await event.answer("⏳ این کتاب از قبل در صف پردازش است.", alert=True)
+
+
+@router.route('books_process_all')
+async def enqueue_all_pending_books(event, db: Database, job_queue: JobQueue):
+    """Start bulk processing of every pending book (as one background job)"""
     user_id = event.sender_id
     
     if not is_admin(user_id, ADMIN_USER_ID):
@@ -245,14 +351,90 @@ async def process_existing_book(event, db: Database, bot: TelegramClient, book_i
             await event.answer("❌ شما دسترسی به این بخش را ندارید.", alert=True)
         return
     
+    _, created = job_queue.enqueue('process_all_books', max_attempts=1)
+    
+    if isinstance(event, events.CallbackQuery.Event):
+        if created:
+            await event.answer("🚀 پردازش گروهی کتاب‌ها در صف قرار گرفت.", alert=True)
+        else:
+            await event.answer("⏳ پردازش گروهی از قبل در جریان است.", alert=True)
+    await show_process_book_list(event, db)
+
+
+def _format_pipeline_progress(stats: dict, final: bool = False) -> str:
+    """Aggregated progress text of the bulk pipeline"""
+    finished = stats['done'] + stats['failed'] + stats['skipped']
+    elapsed = int(stats.get('elapsed') or 0)
+    
+    text = "✅ **پردازش گروهی کتاب‌ها تمام شد**\n\n" if final else "🚀 **پردازش گروهی کتاب‌ها**\n\n"
+    text += f"📚 پیشرفت: {finished}/{stats['total']}\n"
+    text += f"✅ موفق: {stats['done']} | ❌ ناموفق: {stats['failed']} | ⏭ رد شده: {stats['skipped']}\n"
+    text += f"📝 محتوای تولید شده: {stats['content']}\n"
+    if not final:
+        text += f"\n💾 دانلود: {stats['downloading']} | 📖 استخراج: {stats['extracting']} | 🤖 AI: {stats['analyzing']}\n"
+    if elapsed:
+        text += f"\n⏱ زمان: {elapsed // 60}:{elapsed % 60:02d}"
+    return text
+
+
+async def process_all_books_job(db: Database, bot: TelegramClient):
+    """
+    Process every pending book with the bulk pipeline
+    
+    Runs as a background job and reports one aggregated progress message.
+    """
+    # Books with a queued single-book job are left to that job
+    active_ids = set(db.get_active_job_book_ids('process_book'))
+    books_list = [book for book in db.get_all_books(status='pending', limit=10000, offset=0)
+                  if book['id'] not in active_ids]
+    if not books_list:
+        await bot.send_message(ADMIN_USER_ID, "📚 هیچ کتابی در انتظار پردازش یافت نشد.")
+        return
+    
+    status_msg = await bot.send_message(ADMIN_USER_ID, f"🚀 پردازش گروهی {len(books_list)} کتاب...")
+    progress = ThrottledEditor(status_msg, min_interval=5.0)
+    started = asyncio.get_running_loop().time()
+    
+    async def report(stats: dict):
+        stats['elapsed'] = asyncio.get_running_loop().time() - started
+        await progress.update(_format_pipeline_progress(stats))
+    
+    pipeline = BookPipeline(
+        db, bot,
+        download_workers=PIPELINE_DOWNLOAD_WORKERS,
+        extract_workers=PIPELINE_EXTRACT_WORKERS or default_extract_workers(),
+        ai_workers=PIPELINE_AI_WORKERS
+    )
+    stats = await pipeline.run([book['id'] for book in books_list], on_progress=report)
+    
+    text = _format_pipeline_progress(stats, final=True)
+    if pipeline.errors:
+        text += "\n\n⚠️ **خطاها:**\n" + "\n".join(f"• {error[:100]}" for error in pipeline.errors[:5])
+    await status_msg.edit(
+        text,
+        buttons=[[Button.inline('📝 محتوای در انتظار تایید', b'content_pending_1')]],
+        parse_mode='md'
+    )
+
+
+async def process_book_job(db: Database, bot: TelegramClient, book_id: int):
+    """
+    Process a book: download, extract, analyze with AI and generate content
+    
+    Runs as a background job; progress is reported in the admin chat.
+    
+    Raises:
+        Exception: If processing fails (the job queue retries it)
+    """
     try:
         book = db.get_book(book_id)
         if not book:
-            await event.answer("❌ کتاب یافت نشد.", alert=True)
+            raise ValueError(f"Book {book_id} not found")
+        if book.get('status') in ('processing', 'processed'):
+            # Already taken by the bulk pipeline (or done)
             return
         
-        if isinstance(event, events.CallbackQuery.Event):
-            await event.answer("📥 در حال پردازش کتاب...", alert=True)
+        db.update_book(book_id, status='processing')
         
         # Show status message
         status_msg = await bot.send_message(
@@ -263,101 +445,26 @@ async def process_existing_book(event, db: Database, bot: TelegramClient, book_i
         # Download PDF from admin's chat (where it was originally sent)
         await status_msg.edit("💾 در حال دانلود فایل PDF...")
         try:
-            msg = await bot.get_messages(ADMIN_USER_ID, ids=book['pdf_message_id'])
-            if not msg or not msg.media:
-                await status_msg.edit("❌ فایل کتاب یافت نشد.")
-                return
-            
-            import io
-            file_bytes = await bot.download_media(msg.media, file=io.BytesIO())
-            if isinstance(file_bytes, io.BytesIO):
-                pdf_data = file_bytes.getvalue()
-            elif isinstance(file_bytes, bytes):
-                pdf_data = file_bytes
-            else:
-                with open(file_bytes, 'rb') as f:
-                    pdf_data = f.read()
+            pdf_data = await download_book_pdf(bot, book)
         except Exception as e:
             await status_msg.edit(f"❌ خطا در دانلود فایل: {str(e)}")
-            return
+            raise
         
-        # Extract data
+        # Extract data (CPU-bound, keep the event loop free)
         await status_msg.edit("📖 در حال استخراج متن...")
-        try:
-            from core.pdf_processor import PDFProcessor
-            extracted_text = PDFProcessor.extract_text(pdf_data, max_pages=50)
-            total_pages = PDFProcessor.get_page_count(pdf_data)
-            cover_image = PDFProcessor.extract_cover(pdf_data)
-        except Exception as e:
-            print(f"Error extracting PDF: {str(e)}")
-            extracted_text = ""
-            total_pages = book.get('total_pages', 0)
-            cover_image = None
+        extracted = await run_cpu_bound(extract_pdf, pdf_data)
         
         # Analyze with AI
         await status_msg.edit("🤖 در حال تحلیل با هوش مصنوعی...")
-        book_metadata = {}
+        progress = ThrottledEditor(status_msg)
         
-        try:
-            from core.ai_generator import AIGenerator
-            from config import OPENROUTER_API_KEY, OPENROUTER_MODEL
-            ai = AIGenerator(OPENROUTER_API_KEY, OPENROUTER_MODEL)
-            
-            # Analyze cover if available
-            if cover_image:
-                try:
-                    cover_analysis = await ai.analyze_image(cover_image)
-                    if cover_analysis.get('author'):
-                        book_metadata['author'] = cover_analysis['author']
-                    if cover_analysis.get('category'):
-                        book_metadata['category'] = cover_analysis['category']
-                    if cover_analysis.get('tags'):
-                        tags_list = cover_analysis['tags'] if isinstance(cover_analysis['tags'], list) else [cover_analysis['tags']]
-                        book_metadata['tags'] = ', '.join(tags_list)
-                except Exception as e:
-                    print(f"Cover analysis error: {str(e)}")
-            
-            # Analyze text if available
-            if extracted_text and len(extracted_text) > 200:
-                try:
-                    summary_result = await ai.generate_summary(extracted_text, min_words=150, max_words=300)
-                    if summary_result.get('genre') and not book_metadata.get('category'):
-                        book_metadata['category'] = summary_result['genre']
-                except Exception as e:
-                    print(f"Text analysis error: {str(e)}")
-        except Exception as e:
-            print(f"AI analysis error: {str(e)}")
-        
-        # Save cover if extracted
-        cover_file_id = book.get('cover_file_id')
-        cover_message_id = book.get('cover_message_id')
-        
-        if cover_image and not cover_file_id:
-            try:
-                # Send cover to admin's chat and get file_id
-                cover_msg = await bot.send_file(
-                    ADMIN_USER_ID,
-                    cover_image,
-                    caption=f"📖 جلد: {book.get('title', 'کتاب')}",
-                    force_document=False
-                )
-                if hasattr(cover_msg.media, 'photo'):
-                    cover_file_id = str(cover_msg.media.photo.id)
-                elif hasattr(cover_msg.media, 'document'):
-                    cover_file_id = str(cover_msg.media.document.id)
-                cover_message_id = cover_msg.id
-                book_metadata['cover_file_id'] = cover_file_id
-                book_metadata['cover_message_id'] = cover_message_id
-            except Exception as e:
-                print(f"Error saving cover: {str(e)}")
-        
-        # Update book in database
-        book_metadata['total_pages'] = total_pages
-        book_metadata['status'] = 'processed'
-        if extracted_text:
-            book_metadata['notes'] = extracted_text[:5000]
+        def ai_progress(prefix: str):
+            async def report(partial_text: str):
+                await progress.update(f"{prefix}\n\n✍️ {len(partial_text)} کاراکتر دریافت شد...")
+            return report
         
-        db.update_book(book_id, **book_metadata)
+        ai = AIGenerator(OPENROUTER_API_KEY, OPENROUTER_MODEL, db=db, book_id=book_id)
+        book_metadata = await analyze_and_save_book(db, bot, ai, book, extracted, ai_progress)
         
         # Build base result text
         base_result_text = f"✅ **کتاب با موفقیت پردازش شد**\n\n"
@@ -367,106 +474,37 @@ async def process_existing_book(event, db: Database, bot: TelegramClient, book_i
             base_result_text += f"✍️ **نویسنده:** {book_metadata['author']}\n"
         if book_metadata.get('category'):
             base_result_text += f"🏷️ **دسته:** {book_metadata['category']}\n"
-        if total_pages:
-            base_result_text += f"📄 **صفحات:** {total_pages}\n"
+        if book_metadata.get('total_pages'):
+            base_result_text += f"📄 **صفحات:** {book_metadata['total_pages']}\n"
         
         # Step: Generate content for the book
         await status_msg.edit(base_result_text + "\n\n🤖 در حال تولید محتوا با AI...")
-        
         try:
-            # Get published content history for style learning
-            published_content = db.get_content_by_status('published', limit=20, offset=0)
+            content_id, duplicate = await generate_book_quote(
+                db, ai, book, book_metadata, extracted.get('text') or '',
+                on_progress=ai_progress(base_result_text + "\n\n🤖 در حال تولید محتوا با AI...")
+            )
             
-            # Generate a quote from the book
-            content_type = 'quote'
-            # Use extracted text (full) or notes (limited) - prefer extracted_text as it's more complete
-            book_text_for_gen = extracted_text if extracted_text else (book.get('notes', '') or '')
+            # Update status message
+            final_text = base_result_text + "\n\n✅ محتوا تولید شد!"
+            if duplicate:
+                final_text += f"\n⚠️ مشابه محتوای #{duplicate[0]} ({duplicate[1]:.0%})"
+            await status_msg.edit(final_text)
             
-            # Use more text for better quality (up to 3000 chars for variety)
-            if book_text_for_gen and len(book_text_for_gen) > 3000:
-                # Use middle section for variety (not always from start)
-                start_pos = len(book_text_for_gen) // 4  # Start from 25% into the text
-                book_text_for_gen = book_text_for_gen[start_pos:start_pos+3000]
+            # Show preview to admin - import here to avoid circular import
+            from handlers.content import show_content_preview
+            # Create a simple event-like object for preview
+            class PreviewEvent:
+                def __init__(self, chat_id, sender_id):
+                    self.chat_id = chat_id
+                    self.sender_id = sender_id
             
-            if published_content or book_text_for_gen:
-                try:
-                    # Generate content using AI with enhanced context
-                    ai = AIGenerator(OPENROUTER_API_KEY, OPENROUTER_MODEL)
-                    
-                    result = await ai.generate_content_from_history(
-                        published_content_history=published_content if published_content else [],
-                        content_type=content_type,
-                        book_title=book_title_for_ai,
-                        book_author=book_author_for_ai,
-                        book_text=book_text_for_gen
-                    )
-                    
-                    if 'error' not in result:
-                        # Extract generated content
-                        text_content = result.get('quote', '')
-                        caption = result.get('context', f"از کتاب {book.get('title')}")
-                        
-                        if text_content:
-                            # Get book cover for content - use the updated book data
-                            updated_book = db.get_book(book_id)  # Get fresh data after update
-                            use_cover = bool(updated_book and updated_book.get('cover_file_id'))
-                            final_cover_file_id = updated_book.get('cover_file_id') if updated_book else cover_file_id
-                            
-                            # Build better caption with book info
-                            enhanced_caption = caption
-                            if book_metadata.get('author') or updated_book.get('author'):
-                                author_name = book_metadata.get('author') or updated_book.get('author')
-                                enhanced_caption = f"از کتاب {book.get('title')}\n✍️ نویسنده: {author_name}"
-                            elif book.get('title'):
-                                enhanced_caption = f"از کتاب {book.get('title')}"
-                            
-                            # Save content to database with all book info
-                            content_id = db.add_content(
-                                book_id=book_id,
-                                content_type=content_type,
-                                text=text_content,
-                                caption=enhanced_caption,
-                                file_id=final_cover_file_id if use_cover else None,
-                                is_manual=False,
-                                use_cover=use_cover,
-                                status='pending_approval'
-                            )
-                            
-                            # Update status message
-                            final_text = base_result_text + "\n\n✅ محتوا تولید شد!"
-                            await status_msg.edit(final_text)
-                            
-                            # Show preview to admin - import here to avoid circular import
-                            from handlers.content import show_content_preview
-                            # Create a simple event-like object for preview
-                            class PreviewEvent:
-                                def __init__(self, chat_id, sender_id):
-                                    self.chat_id = chat_id
-                                    self.sender_id = sender_id
-                            
-                            preview_event = PreviewEvent(ADMIN_USER_ID, ADMIN_USER_ID)
-                            await show_content_preview(preview_event, db, bot, content_id)
-                        else:
-                            await status_msg.edit(
-                                base_result_text + "\n\n⚠️ محتوا تولید شد اما خالی است."
-                            )
-                    else:
-                        await status_msg.edit(
-                            base_result_text + f"\n\n⚠️ خطا در تولید محتوا: {result.get('error', 'خطای نامشخص')}"
-                        )
-                except Exception as e:
-                    print(f"Error generating content: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-                    await status_msg.edit(
-                        base_result_text + f"\n\n⚠️ خطا در تولید محتوا: {str(e)}"
-                    )
-            else:
-                await status_msg.edit(
-                    base_result_text + "\n\n⚠️ نمی‌توان محتوا تولید کرد (نیاز به تاریخچه یا متن کتاب)"
-                )
+            preview_event = PreviewEvent(ADMIN_USER_ID, ADMIN_USER_ID)
+            await show_content_preview(preview_event, db, bot, content_id)
+        except ValueError as e:
+            await status_msg.edit(base_result_text + f"\n\n⚠️ {str(e)}")
         except Exception as e:
-            print(f"Error in content generation step: {str(e)}")
+            print(f"Error generating content: {str(e)}")
             import traceback
             traceback.print_exc()
             # Don't fail the whole process if content generation fails
@@ -476,8 +514,8 @@ async def process_existing_book(event, db: Database, bot: TelegramClient, book_i
         
     except Exception as e:
         print(f"Error processing book: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        # Back to the processing list; the job is retried or marked failed
+        db.update_book(book_id, status='pending')
         try:
             await bot.send_message(
                 ADMIN_USER_ID,
@@ -485,3 +523,4 @@ async def process_existing_book(event, db: Database, bot: TelegramClient, book_i
             )
         except:
             pass
+        raise
@@ -2,14 +2,28 @@
 Content management handler - Fix for AI content preview
 """
 from telethon import events, Button, TelegramClient
+from telethon.errors import FileReferenceExpiredError
 from utils.keyboards import content_menu_keyboard, content_approval_keyboard, pagination_keyboard
 from utils.helpers import format_content_info, is_admin
+from utils.progress import ThrottledEditor
+from utils.router import router
 from database.db import Database
-from config import ADMIN_USER_ID, TARGET_CHANNEL_ID
-from core.publisher import Publisher
+from config import ADMIN_USER_ID
+from core.publish_queue import PublishQueue
+from core.publisher import ALBUM_MAX_MEDIA
+from core.media_cache import MediaCache, ORIGINAL, message_key
+from core.dedup import get_dedup_index, generate_unique
+from core.history_selector import get_history_selector
 from datetime import datetime
 
+# Seconds the publish button waits for the queue (callback answers expire soon after)
+PUBLISH_WAIT_SECONDS = 10
 
+# Content created from the first message of a Telegram album, by grouped_id
+_album_contents = {}
+
+
+@router.route('menu_content')
 async def show_content_menu(event, db: Database):
     """Show content management menu"""
     user_id = event.sender_id
@@ -32,6 +46,7 @@ async def show_content_menu(event, db: Database):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('content_pending_{page:int}')
 async def show_pending_content(event, db: Database, page: int = 1):
     """Show pending content for approval"""
     user_id = event.sender_id
@@ -76,12 +91,12 @@ async def show_pending_content(event, db: Database, page: int = 1):
             # Add button for each item
             if content_id:
                 keyboard_rows.append([
-                    Button.inline(f"📋 مشاهده {content_id}", f'content_view_{content_id}'.encode())
+                    Button.inline(f"📋 مشاهده {content_id}", router.callback('content_view_{content_id:int}', content_id=content_id))
                 ])
         
         # Add pagination
         total_pages = (total_count + 9) // 10
-        pagination = pagination_keyboard(page, total_pages, 'content_pending', b'menu_content')
+        pagination = pagination_keyboard(page, total_pages, 'content_pending_{page:int}', b'menu_content')
         keyboard = keyboard_rows + pagination
     
     if isinstance(event, events.CallbackQuery.Event):
@@ -90,6 +105,7 @@ async def show_pending_content(event, db: Database, page: int = 1):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('content_approve_{content_id:int}')
 async def approve_content(event, db: Database, content_id: int):
     """Approve content"""
     user_id = event.sender_id
@@ -114,6 +130,7 @@ async def approve_content(event, db: Database, content_id: int):
     await show_content_menu(event, db)
 
 
+@router.route('content_reject_{content_id:int}')
 async def reject_content(event, db: Database, content_id: int):
     """Reject content"""
     user_id = event.sender_id
@@ -136,6 +153,7 @@ async def reject_content(event, db: Database, content_id: int):
     await show_content_menu(event, db)
 
 
+@router.route('content_approved_{page:int}')
 async def show_approved_content(event, db: Database, page: int = 1):
     """Show approved content list"""
     user_id = event.sender_id
@@ -156,7 +174,7 @@ async def show_approved_content(event, db: Database, page: int = 1):
             text += f"• {format_content_info(content)}\n\n"
         
         total_pages = (len(content_list) + 9) // 10
-        keyboard = pagination_keyboard(page, total_pages, 'content_approved', b'menu_content')
+        keyboard = pagination_keyboard(page, total_pages, 'content_approved_{page:int}', b'menu_content')
     
     if isinstance(event, events.CallbackQuery.Event):
         await event.edit(text, buttons=keyboard, parse_mode='md')
@@ -164,6 +182,7 @@ async def show_approved_content(event, db: Database, page: int = 1):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('content_published_{page:int}')
 async def show_published_content(event, db: Database, page: int = 1):
     """Show published content list"""
     user_id = event.sender_id
@@ -184,7 +203,7 @@ async def show_published_content(event, db: Database, page: int = 1):
             text += f"• {format_content_info(content)}\n\n"
         
         total_pages = (len(content_list) + 9) // 10
-        keyboard = pagination_keyboard(page, total_pages, 'content_published', b'menu_content')
+        keyboard = pagination_keyboard(page, total_pages, 'content_published_{page:int}', b'menu_content')
     
     if isinstance(event, events.CallbackQuery.Event):
         await event.edit(text, buttons=keyboard, parse_mode='md')
@@ -192,6 +211,7 @@ async def show_published_content(event, db: Database, page: int = 1):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('content_manual')
 async def show_manual_content_form(event, db: Database):
     """Show form for creating manual content"""
     user_id = event.sender_id
@@ -229,6 +249,7 @@ async def show_manual_content_form(event, db: Database):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('content_ai_generate')
 async def show_ai_content_generator(event, db: Database, bot: TelegramClient):
     """Show AI content generator menu"""
     user_id = event.sender_id
@@ -257,6 +278,7 @@ async def show_ai_content_generator(event, db: Database, bot: TelegramClient):
         [Button.inline('💬 نقل‌قول', b'ai_generate_quote')],
         [Button.inline('📝 توضیحات', b'ai_generate_description')],
         [Button.inline('📄 خلاصه', b'ai_generate_summary')],
+        [Button.inline('📦 هر سه (یک درخواست)', b'ai_generate_bundle')],
         [Button.inline('🔙 بازگشت', b'content_manual')]
     ]
     
@@ -266,6 +288,9 @@ async def show_ai_content_generator(event, db: Database, bot: TelegramClient):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('ai_generate_quote', content_type='quote')
+@router.route('ai_generate_description', content_type='description')
+@router.route('ai_generate_summary', content_type='summary')
 async def generate_ai_content(event, db: Database, bot: TelegramClient, content_type: str):
     """Generate content using AI based on history"""
     user_id = event.sender_id
@@ -279,8 +304,8 @@ async def generate_ai_content(event, db: Database, bot: TelegramClient, content_
         if isinstance(event, events.CallbackQuery.Event):
             await event.answer("🤖 در حال تولید محتوا با AI...")
         
-        # Get published content history
-        published_content = db.get_content_by_status('published', limit=20, offset=0)
+        # Get the best published examples of this content type
+        published_content = get_history_selector(db).select(content_type, limit=5)
         
         if not published_content:
             await event.respond(
@@ -314,36 +339,44 @@ async def generate_ai_content(event, db: Database, bot: TelegramClient, content_
         from config import OPENROUTER_API_KEY, OPENROUTER_MODEL
         from core.ai_generator import AIGenerator
         
-        ai = AIGenerator(OPENROUTER_API_KEY, OPENROUTER_MODEL)
+        ai = AIGenerator(OPENROUTER_API_KEY, OPENROUTER_MODEL, db=db, book_id=book_id)
         
-        # Generate content based on history and book text
-        result = await ai.generate_content_from_history(
-            published_content_history=published_content,
-            content_type=content_type,
-            book_title=book_title,
-            book_author=book_author,
-            book_text=book_text
+        status_msg = await event.respond("🤖 در حال تولید محتوا با AI...")
+        progress = ThrottledEditor(status_msg)
+        
+        async def report(partial_text: str):
+            await progress.update(f"🤖 در حال تولید محتوا با AI...\n\n✍️ {len(partial_text)} کاراکتر دریافت شد...")
+        
+        # Generate content based on history and book text, retrying near-duplicates
+        result, duplicate = await generate_unique(
+            lambda: ai.generate_content_from_history(
+                published_content_history=published_content,
+                content_type=content_type,
+                book_title=book_title,
+                book_author=book_author,
+                book_text=book_text,
+                on_progress=report
+            ),
+            lambda r: '' if 'error' in r else _extract_generated_fields(content_type, r, book_title)[0],
+            get_dedup_index(db)
         )
         
         if 'error' in result:
-            await event.respond(f"❌ خطا در تولید محتوا: {result['error']}")
+            await status_msg.edit(f"❌ خطا در تولید محتوا: {result['error']}")
             return
         
         # Extract generated content
-        if content_type == 'quote':
-            text_content = result.get('quote', '')
-            caption = result.get('context', '')
-        elif content_type == 'description':
-            text_content = result.get('description', '')
-            caption = f"کتاب {book_title}" if book_title else "کتاب"
-        else:  # summary
-            text_content = result.get('summary', '')
-            caption = f"خلاصه {book_title}" if book_title else "خلاصه کتاب"
+        text_content, caption = _extract_generated_fields(content_type, result, book_title)
         
         if not text_content:
-            await event.respond("❌ محتوای تولید شده خالی است.")
+            await status_msg.edit("❌ محتوای تولید شده خالی است.")
             return
         
+        done_text = "✅ محتوا تولید شد!"
+        if duplicate:
+            done_text += f"\n⚠️ مشابه محتوای #{duplicate[0]} ({duplicate[1]:.0%})"
+        await progress.update(done_text, force=True)
+        
         # Get book cover if available
         use_cover = False
         cover_file_id = None
@@ -373,6 +406,102 @@ async def generate_ai_content(event, db: Database, bot: TelegramClient, content_
         await event.respond(f"❌ خطا در تولید محتوا: {str(e)}")
 
 
+@router.route('ai_generate_bundle')
+async def generate_ai_bundle(event, db: Database, bot: TelegramClient):
+    """Generate a quote, a description and a summary in one AI request"""
+    user_id = event.sender_id
+    
+    if not is_admin(user_id, ADMIN_USER_ID):
+        if isinstance(event, events.CallbackQuery.Event):
+            await event.answer("❌ شما دسترسی به این بخش را ندارید.", alert=True)
+        return
+    
+    try:
+        if isinstance(event, events.CallbackQuery.Event):
+            await event.answer("🤖 در حال تولید محتوا با AI...")
+        
+        books = db.get_all_books(status='processed', limit=10, offset=0)
+        if not books:
+            books = db.get_all_books(limit=10, offset=0)
+        if not books:
+            await event.respond("⚠️ هیچ کتابی برای تولید محتوا یافت نشد.")
+            return
+        book = books[0]
+        
+        published_content = get_history_selector(db).select(limit=5)
+        
+        from config import OPENROUTER_API_KEY, OPENROUTER_MODEL
+        from core.ai_generator import AIGenerator
+        
+        ai = AIGenerator(OPENROUTER_API_KEY, OPENROUTER_MODEL, db=db, book_id=book['id'])
+        
+        status_msg = await event.respond("🤖 در حال تولید بسته محتوا با AI...")
+        progress = ThrottledEditor(status_msg)
+        
+        async def report(partial_text: str):
+            await progress.update(f"🤖 در حال تولید بسته محتوا با AI...\n\n✍️ {len(partial_text)} کاراکتر دریافت شد...")
+        
+        bundle = await ai.generate_bundle(
+            book,
+            types=['quote', 'description', 'summary'],
+            n_per_type=1,
+            published_content_history=published_content,
+            on_progress=report
+        )
+        
+        use_cover = bool(book.get('cover_file_id'))
+        content_ids = []
+        warnings = []
+        index = get_dedup_index(db)
+        for content_type, items in bundle.items():
+            for item in items:
+                text_content, caption = _extract_generated_fields(content_type, item, book.get('title'))
+                # Includes the items of this bundle added so far
+                await index.sync_async()
+                duplicate = index.find_similar(text_content)
+                if duplicate:
+                    warnings.append(f"⚠️ {content_type} مشابه محتوای #{duplicate[0]} ({duplicate[1]:.0%})")
+                content_ids.append(db.add_content(
+                    book_id=book['id'],
+                    content_type=content_type,
+                    text=text_content,
+                    caption=caption,
+                    file_id=book.get('cover_file_id') if use_cover else None,
+                    is_manual=False,
+                    use_cover=use_cover,
+                    status='pending_approval'
+                ))
+        
+        if not content_ids:
+            await status_msg.edit("❌ محتوای معتبری تولید نشد.")
+            return
+        
+        done_text = f"✅ {len(content_ids)} محتوا تولید شد!"
+        if warnings:
+            done_text += "\n" + "\n".join(warnings)
+        await progress.update(done_text, force=True)
+        for content_id in content_ids:
+            await show_content_preview(event, db, bot, content_id)
+    
+    except Exception as e:
+        print(f"Error generating AI bundle: {str(e)}")
+        await event.respond(f"❌ خطا در تولید محتوا: {str(e)}")
+
+
+def _extract_generated_fields(content_type: str, result: dict, book_title: str = None) -> tuple:
+    """Map an AI result to (text, caption) for the content table"""
+    if content_type == 'quote':
+        text_content = result.get('quote', '')
+        caption = result.get('context', '')
+    elif content_type == 'description':
+        text_content = result.get('description', '')
+        caption = f"کتاب {book_title}" if book_title else "کتاب"
+    else:  # summary
+        text_content = result.get('summary', '')
+        caption = f"خلاصه {book_title}" if book_title else "خلاصه کتاب"
+    return text_content, caption
+
+
 async def handle_content_submission(event, db: Database, bot: TelegramClient):
     """
     Handle content submission from user (text, photo, video, etc.)
@@ -409,6 +538,16 @@ async def handle_content_submission(event, db: Database, bot: TelegramClient):
         if not text_content and not event.message.media:
             return False
         
+        # The other messages of an album go into the first one's content
+        grouped_id = event.message.grouped_id
+        if grouped_id and grouped_id in _album_contents and content_type in ('image', 'video'):
+            content_id = _album_contents[grouped_id]
+            if len(db.get_content_media(content_id)) < ALBUM_MAX_MEDIA - 1:
+                db.add_content_media(content_id, content_type, message_id=event.message.id)
+                if caption and not (db.get_content(content_id) or {}).get('caption'):
+                    db.update_content(content_id, caption=caption)
+            return True
+        
         # Save to database with current message reference
         content_id = db.add_content(
             book_id=None,
@@ -420,6 +559,10 @@ async def handle_content_submission(event, db: Database, bot: TelegramClient):
             is_manual=True,
             status='pending_approval'
         )
+        if grouped_id and content_type in ('image', 'video'):
+            if len(_album_contents) > 100:
+                _album_contents.clear()
+            _album_contents[grouped_id] = content_id
         
         # Show preview for approval
         await show_content_preview(event, db, bot, content_id)
@@ -442,10 +585,13 @@ async def show_content_preview(event, db: Database, bot: TelegramClient, content
     
     preview_text = f"📋 **پیش‌نمایش محتوا** (ID: {content_id})\n"
     preview_text += f"📝 نوع: {content.get('type', 'text')}\n"
+    album_media = db.get_content_media(content_id)
+    if album_media:
+        preview_text += f"🖼️ آلبوم: {len(album_media) + 1} رسانه\n"
     
     keyboard = [
-        [Button.inline('✅ تایید و انتشار', f'content_publish_confirm_{content_id}'.encode()),
-         Button.inline('❌ رد', f'content_reject_{content_id}'.encode())],
+        [Button.inline('✅ تایید و انتشار', router.callback('content_publish_confirm_{content_id:int}', content_id=content_id)),
+         Button.inline('❌ رد', router.callback('content_reject_{content_id:int}', content_id=content_id))],
         [Button.inline('🔙 بازگشت', b'menu_content')]
     ]
     
@@ -471,9 +617,16 @@ async def show_content_preview(event, db: Database, bot: TelegramClient, content
                 # Try to get cover from admin's chat using cover_message_id
                 if book and book.get('cover_message_id'):
                     try:
-                        from config import ADMIN_USER_ID
-                        cover_msg = await bot.get_messages(ADMIN_USER_ID, ids=book.get('cover_message_id'))
-                        if cover_msg and cover_msg.media:
+                        # Reuse the cover's file reference instead of fetching the message each time
+                        media_cache = MediaCache(db, bot)
+                        cover_key = message_key(ADMIN_USER_ID, book['cover_message_id'])
+                        cover = media_cache.get(cover_key, ORIGINAL)
+                        if cover is None:
+                            cover_msg = await bot.get_messages(ADMIN_USER_ID, ids=book.get('cover_message_id'))
+                            if cover_msg and cover_msg.media:
+                                cover = cover_msg.media
+                                media_cache.remember(cover_key, ORIGINAL, cover, ADMIN_USER_ID, cover_msg.id)
+                        if cover is not None:
                             # Build preview text with book info
                             text_body = content.get('text', '') or content.get('caption', '')
                             
@@ -491,7 +644,13 @@ async def show_content_preview(event, db: Database, bot: TelegramClient, content
                                 full_text += f"\n{book_info}"
                             full_text += f"\n📄 متن:\n{text_body[:800]}"
                             
-                            await bot.send_file(event.chat_id, cover_msg.media, caption=full_text, buttons=keyboard, parse_mode='md')
+                            try:
+                                await bot.send_file(event.chat_id, cover, caption=full_text, buttons=keyboard, parse_mode='md')
+                            except FileReferenceExpiredError:
+                                cover = await media_cache.refresh(cover_key, ORIGINAL)
+                                if cover is None:
+                                    raise
+                                await bot.send_file(event.chat_id, cover, caption=full_text, buttons=keyboard, parse_mode='md')
                             cover_sent = True
                     except Exception as e:
                         print(f"Error getting cover from storage: {e}")
@@ -560,7 +719,8 @@ async def show_content_preview(event, db: Database, bot: TelegramClient, content
         await bot.send_message(event.chat_id, full_text, buttons=keyboard, parse_mode='md')
 
 
-async def publish_content_to_channel(event, db: Database, bot: TelegramClient, content_id: int):
+@router.route('content_publish_confirm_{content_id:int}')
+async def publish_content_to_channel(event, db: Database, publish_queue: PublishQueue, content_id: int):
     """Publish content to target channel after approval"""
     user_id = event.sender_id
     
@@ -575,16 +735,13 @@ async def publish_content_to_channel(event, db: Database, bot: TelegramClient, c
             await event.answer("❌ محتوا یافت نشد.", alert=True)
             return
         
-        # Initialize publisher
-        publisher = Publisher(bot, TARGET_CHANNEL_ID, db)
-        
         # Update content to approved first
         db.update_content(content_id, status='approved', approved_date=datetime.now())
         
-        # Publish to channel
-        published_msg_id = await publisher.publish_content(content_id)
+        # Publish to channel (through the rate-limited queue)
+        item = await publish_queue.publish(content_id, timeout=PUBLISH_WAIT_SECONDS)
         
-        if published_msg_id:
+        if item['status'] == 'sent':
             if isinstance(event, events.CallbackQuery.Event):
                 await event.answer("✅ محتوا با موفقیت در کانال منتشر شد!", alert=False)
             else:
@@ -594,17 +751,21 @@ async def publish_content_to_channel(event, db: Database, bot: TelegramClient, c
             await event.respond(
                 f"✅ **محتوا منتشر شد**\n\n"
                 f"🆔 ID محتوا: {content_id}\n"
-                f"📤 ID پیام در کانال: {published_msg_id}\n"
+                f"📤 ID پیام در کانال: {item.get('message_id') or '-'}\n"
                 f"📝 نوع: {content.get('type', 'text')}"
             )
+        elif item['status'] == 'failed':
+            await event.answer(f"❌ خطا در انتشار محتوا: {item.get('last_error') or ''}", alert=True)
         else:
-            await event.answer("❌ خطا در انتشار محتوا.", alert=True)
+            # Flood wait or retry: the queue sends it later
+            await event.answer("⏳ محتوا در صف انتشار است و به‌زودی منتشر می‌شود.", alert=True)
     
     except Exception as e:
         print(f"Error publishing content: {str(e)}")
         await event.answer(f"❌ خطا: {str(e)}", alert=True)
 
 
+@router.route('content_view_{content_id:int}')
 async def show_content_for_approval(event, db: Database, content_id: int):
     """Show content details for approval"""
     await show_content_preview(event, db, event.client, content_id)
@@ -5,6 +5,7 @@ from telethon import events, TelegramClient
 from utils.keyboards import env_settings_keyboard, env_category_keyboard
 from utils.helpers import is_admin
 from utils.env_manager import EnvManager
+from utils.router import router
 from config import ADMIN_USER_ID
 from typing import Dict
 
@@ -13,6 +14,7 @@ from typing import Dict
 pending_edits: Dict[int, Dict[str, str]] = {}
 
 
+@router.route('env_settings')
 async def show_env_settings_menu(event, env_manager: EnvManager):
     """Show environment settings main menu"""
     user_id = event.sender_id
@@ -37,6 +39,11 @@ async def show_env_settings_menu(event, env_manager: EnvManager):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('env_telegram', category='telegram')
+@router.route('env_groups', category='groups')
+@router.route('env_openrouter', category='openrouter')
+@router.route('env_database', category='database')
+@router.route('env_other', category='other')
 async def show_env_category(event, env_manager: EnvManager, category: str):
     """Show environment variables for a specific category"""
     user_id = event.sender_id
@@ -93,6 +100,7 @@ async def show_env_category(event, env_manager: EnvManager, category: str):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('env_view_all')
 async def show_all_env_vars(event, env_manager: EnvManager):
     """Show all environment variables"""
     user_id = event.sender_id
@@ -126,6 +134,7 @@ async def show_all_env_vars(event, env_manager: EnvManager):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('env_edit_{var_key}')
 async def start_edit_env_var(event, env_manager: EnvManager, var_key: str):
     """Start editing an environment variable"""
     user_id = event.sender_id
@@ -3,6 +3,7 @@ Footer settings handler
 """
 from telethon import events, Button
 from utils.helpers import is_admin
+from utils.router import router
 from database.db import Database
 from config import ADMIN_USER_ID
 from datetime import datetime
@@ -11,6 +12,7 @@ from typing import Dict
 # Store pending footer edits (user_id -> {'action': 'edit_format'|'edit_custom'})
 pending_footer_edits: Dict[int, Dict[str, str]] = {}
 
+@router.route('footer_settings')
 async def show_footer_settings(event, db: Database):
     """Show footer settings menu"""
     user_id = event.sender_id
@@ -59,6 +61,7 @@ async def show_footer_settings(event, db: Database):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('footer_toggle_id')
 async def toggle_footer_id(event, db: Database):
     """Toggle footer ID display"""
     user_id = event.sender_id
@@ -73,6 +76,7 @@ async def toggle_footer_id(event, db: Database):
     await show_footer_settings(event, db)
 
 
+@router.route('footer_edit_format')
 async def show_edit_footer_format(event, db: Database):
     """Show form for editing footer format"""
     user_id = event.sender_id
@@ -92,6 +96,7 @@ async def show_edit_footer_format(event, db: Database):
     await event.respond(text)
 
 
+@router.route('footer_edit_custom')
 async def show_edit_footer_custom(event, db: Database):
     """Show form for editing custom footer text"""
     user_id = event.sender_id
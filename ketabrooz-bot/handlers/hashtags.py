@@ -3,11 +3,13 @@ Hashtag management handler
 """
 from telethon import events, Button, TelegramClient
 from utils.helpers import is_admin
+from utils.router import router
 from database.db import Database
 from config import ADMIN_USER_ID
 from typing import List
 
 
+@router.route('hashtags_menu')
 async def show_hashtags_menu(event, db: Database):
     """Show hashtags management menu"""
     user_id = event.sender_id
@@ -45,6 +47,7 @@ async def show_hashtags_menu(event, db: Database):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('hashtag_add')
 async def show_add_hashtag_form(event, db: Database):
     """Show form for adding hashtag"""
     user_id = event.sender_id
@@ -88,6 +91,10 @@ async def show_add_hashtag_form(event, db: Database):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('hashtag_list', filter_type='all')
+@router.route('hashtag_approved', filter_type='approved')
+@router.route('hashtag_pending', filter_type='pending')
+@router.route('hashtag_list_{filter_type}_{page:int}')
 async def show_hashtags_list(event, db: Database, page: int = 1, filter_type: str = 'all'):
     """Show list of hashtags"""
     user_id = event.sender_id
@@ -129,17 +136,19 @@ async def show_hashtags_list(event, db: Database, page: int = 1, filter_type: st
             if tag_id:
                 if not tag.get('is_approved'):
                     keyboard_rows.append([
-                        Button.inline(f'✅ تایید #{tag_text}', f'hashtag_approve_{tag_id}'.encode()),
-                        Button.inline('❌ حذف', f'hashtag_delete_{tag_id}'.encode())
+                        Button.inline(f'✅ تایید #{tag_text}', router.callback('hashtag_approve_{tag_id:int}', tag_id=tag_id)),
+                        Button.inline('❌ حذف', router.callback('hashtag_delete_{tag_id:int}', tag_id=tag_id))
                     ])
                 else:
                     keyboard_rows.append([
-                        Button.inline('❌ حذف', f'hashtag_delete_{tag_id}'.encode())
+                        Button.inline('❌ حذف', router.callback('hashtag_delete_{tag_id:int}', tag_id=tag_id))
                     ])
         
         # Pagination keyboard
         from utils.keyboards import pagination_keyboard
-        pagination = pagination_keyboard(page, total_pages, f'hashtag_list_{filter_type}', b'hashtags_menu')
+        pagination = pagination_keyboard(
+            page, total_pages, 'hashtag_list_{filter_type}_{page:int}', b'hashtags_menu', filter_type=filter_type
+        )
         keyboard = keyboard_rows + pagination
     
     if isinstance(event, events.CallbackQuery.Event):
@@ -211,6 +220,7 @@ async def handle_hashtag_input(event, db: Database):
         return False
 
 
+@router.route('hashtag_approve_{tag_id:int}')
 async def approve_hashtag(event, db: Database, tag_id: int):
     """Approve a hashtag"""
     user_id = event.sender_id
@@ -237,6 +247,7 @@ async def approve_hashtag(event, db: Database, tag_id: int):
         await event.answer(f"❌ خطا: {str(e)}", alert=True)
 
 
+@router.route('hashtag_delete_{tag_id:int}')
 async def delete_hashtag(event, db: Database, tag_id: int):
     """Delete a hashtag"""
     user_id = event.sender_id
@@ -5,9 +5,11 @@ from telethon import events
 from telethon.tl.types import User
 from utils.keyboards import main_menu_keyboard
 from utils.helpers import is_admin
+from utils.router import router
 from config import ADMIN_USER_ID
 
 
+@router.route('main_menu')
 async def show_main_menu(event, db):
     """
     Show main menu to user
@@ -38,3 +40,8 @@ async def show_main_menu(event, db):
     else:
         await event.respond(welcome_text, buttons=keyboard, parse_mode='md')
 
+
+@router.route('noop')
+async def answer_noop(event):
+    """Acknowledge buttons that only display information"""
+    await event.answer()
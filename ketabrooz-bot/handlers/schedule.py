@@ -4,10 +4,17 @@ Schedule management handler
 from telethon import events, Button
 from utils.keyboards import schedule_menu_keyboard, pagination_keyboard
 from utils.helpers import is_admin
+from utils.router import router
+from utils.state_manager import StateManager
 from database.db import Database
+from core.scheduler import ScheduleEngine, parse_time
 from config import ADMIN_USER_ID
 
 
+DAY_NAMES = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنج‌شنبه', 'جمعه']
+
+
+@router.route('menu_schedule')
 async def show_schedule_menu(event, db: Database):
     """Show schedule management menu"""
     user_id = event.sender_id
@@ -30,6 +37,7 @@ async def show_schedule_menu(event, db: Database):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('schedule_add')
 async def show_add_schedule_form(event, db: Database):
     """Show form for adding schedule"""
     user_id = event.sender_id
@@ -63,6 +71,7 @@ quote,summary
     """
     
     keyboard = [[Button.inline('🔙 بازگشت', b'menu_schedule')]]
+    StateManager.set_state(user_id, 'ADD_SCHEDULE')
     
     if isinstance(event, events.CallbackQuery.Event):
         await event.edit(text, buttons=keyboard, parse_mode='md')
@@ -70,6 +79,69 @@ quote,summary
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+def _parse_schedule_input(text: str):
+    """
+    Parse the lines of the add schedule form
+    
+    Returns:
+        Tuple of (pattern fields dict, None) or (None, error message)
+    """
+    lines = [line.strip() for line in (text or '').splitlines() if line.strip()]
+    if len(lines) < 2:
+        return None, "حداقل روز هفته و ساعت را در دو خط جدا بفرستید."
+    
+    try:
+        day_of_week = int(lines[0])
+    except ValueError:
+        day_of_week = -1
+    if not 0 <= day_of_week <= 6:
+        return None, "روز هفته باید عددی بین 0 (شنبه) تا 6 (جمعه) باشد."
+    
+    fire_time = parse_time(lines[1])
+    if fire_time is None:
+        return None, "ساعت باید به فرمت HH:MM باشد (مثل 14:30)."
+    
+    try:
+        posts_count = int(lines[3]) if len(lines) > 3 else 1
+    except ValueError:
+        posts_count = 0
+    if posts_count < 1:
+        return None, "تعداد پست باید عددی بزرگ‌تر از صفر باشد."
+    
+    return {
+        'day_of_week': day_of_week,
+        'time': fire_time.strftime('%H:%M'),
+        'content_types': lines[2] if len(lines) > 2 else 'همه',
+        'posts_count': posts_count
+    }, None
+
+
+async def handle_schedule_input(event, db: Database, scheduler: ScheduleEngine):
+    """Add the schedule pattern sent for the add schedule form"""
+    user_id = event.sender_id
+    if StateManager.get_state(user_id) != 'ADD_SCHEDULE':
+        return False
+    
+    fields, error = _parse_schedule_input(event.message.text)
+    if error:
+        # Keep waiting for a valid pattern
+        await event.respond(f"❌ {error}\n\nدوباره ارسال کنید یا /cancel")
+        return True
+    
+    db.add_schedule_pattern(**fields)
+    StateManager.clear_state(user_id)
+    # Take effect now instead of at the next hourly resync
+    scheduler.reload()
+    
+    await event.respond(
+        f"✅ زمان‌بندی **{DAY_NAMES[fields['day_of_week']]} - {fields['time']}** افزوده شد.",
+        parse_mode='md'
+    )
+    await show_schedule_list(event, db)
+    return True
+
+
+@router.route('schedule_list')
 async def show_schedule_list(event, db: Database):
     """Show list of schedule patterns"""
     user_id = event.sender_id
@@ -85,19 +157,36 @@ async def show_schedule_list(event, db: Database):
         keyboard = [[Button.inline('🔙 بازگشت', b'menu_schedule')]]
     else:
         text = "⏰ **لیست زمان‌بندی‌ها**\n\n"
-        days = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنج‌شنبه', 'جمعه']
+        keyboard = []
         
         for schedule in schedules:
-            day_name = days[schedule.get('day_of_week', 0)] if schedule.get('day_of_week', 0) < 7 else 'نامشخص'
+            day_name = DAY_NAMES[schedule.get('day_of_week', 0)] if schedule.get('day_of_week', 0) < 7 else 'نامشخص'
             text += f"📅 **{day_name}** - {schedule.get('time', 'N/A')}\n"
             text += f"   نوع: {schedule.get('content_types', 'همه')}\n"
             text += f"   تعداد: {schedule.get('posts_count', 1)}\n"
             text += f"   وضعیت: {'✅ فعال' if schedule.get('is_active') else '❌ غیرفعال'}\n\n"
+            keyboard.append([Button.inline(
+                f"🗑 حذف {day_name} - {schedule.get('time', 'N/A')}",
+                router.callback('schedule_delete_{pattern_id:int}', pattern_id=schedule['id'])
+            )])
         
-        keyboard = [[Button.inline('🔙 بازگشت', b'menu_schedule')]]
+        keyboard.append([Button.inline('🔙 بازگشت', b'menu_schedule')])
     
     if isinstance(event, events.CallbackQuery.Event):
         await event.edit(text, buttons=keyboard, parse_mode='md')
     else:
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
+
+@router.route('schedule_delete_{pattern_id:int}')
+async def delete_schedule(event, db: Database, scheduler: ScheduleEngine, pattern_id: int):
+    """Deactivate a schedule pattern"""
+    if not is_admin(event.sender_id, ADMIN_USER_ID):
+        await event.answer("❌ شما دسترسی به این بخش را ندارید.", alert=True)
+        return
+    
+    db.set_schedule_pattern_active(pattern_id, False)
+    # Drop its pending slots now instead of at the next hourly resync
+    scheduler.reload()
+    await event.answer("🗑 زمان‌بندی حذف شد.")
+    await show_schedule_list(event, db)
@@ -5,10 +5,25 @@ from telethon import events, Button
 from utils.keyboards import settings_menu_keyboard
 from utils.helpers import is_admin
 from utils.state_manager import StateManager
+from utils.router import router
 from database.db import Database
 from config import ADMIN_USER_ID
 
 
+# Display names of the editable settings
+SETTING_LABELS = {
+    'ai_model': 'مدل AI', 'quote_count': 'تعداد نقل‌قول',
+    'summary_length_min': 'حداقل خلاصه', 'summary_length_max': 'حداکثر خلاصه',
+    'design_template': 'قالب طراحی', 'font_size': 'اندازه فونت', 'bg_color': 'رنگ پس‌زمینه',
+    'quote_card_enabled': 'کارت نقل‌قول',
+    'ai_daily_token_budget': 'بودجه روزانه توکن', 'ai_book_token_budget': 'بودجه توکن هر کتاب'
+}
+
+# Settings that must be non-negative integers (0 = unlimited)
+TOKEN_BUDGET_KEYS = ('ai_daily_token_budget', 'ai_book_token_budget')
+
+
+@router.route('menu_settings')
 async def show_settings_menu(event, db: Database):
     """Show settings menu"""
     user_id = event.sender_id
@@ -25,9 +40,11 @@ async def show_settings_menu(event, db: Database):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
-async def start_edit_setting(event, db: Database, setting_key: str, label: str):
+@router.route('set_edit_{setting_key}')
+async def start_edit_setting(event, db: Database, setting_key: str, label: str = None):
     """Start editing a setting"""
     user_id = event.sender_id
+    label = label or SETTING_LABELS.get(setting_key, setting_key)
     current_value = db.get_setting(setting_key, "تعریف نشده")
     
     text = f"✏️ **ویرایش {label}**\n\nمقدار فعلی: `{current_value}`\n\nلطفا مقدار جدید را بفرستید:"
@@ -44,18 +61,25 @@ async def handle_setting_input(event, db: Database):
         
     metadata = StateManager.get_metadata(user_id)
     new_value = event.message.text.strip()
+    if metadata['key'] in TOKEN_BUDGET_KEYS and not new_value.isdecimal():
+        # Keep waiting for a valid value
+        await event.respond("❌ بودجه باید یک عدد صحیح نامنفی باشد (0 یعنی بدون محدودیت). دوباره وارد کنید یا /cancel")
+        return True
     
     db.set_setting(metadata['key'], new_value)
     StateManager.clear_state(user_id)
     
     await event.respond(f"✅ تنظیم **{metadata['label']}** بروزرسانی شد.")
     # Show the relevant menu again based on the key
-    if metadata['key'] in ['ai_model', 'quote_count']: await show_ai_settings(event, db)
-    elif metadata['key'] in ['design_template', 'font_size', 'bg_color']: await show_design_settings(event, db)
+    if metadata['key'] in ['ai_model', 'quote_count', 'summary_length_min', 'summary_length_max',
+                           'ai_book_token_budget', 'ai_daily_token_budget']: await show_ai_settings(event, db)
+    elif metadata['key'] in ['design_template', 'font_size', 'bg_color', 'quote_card_enabled']:
+        await show_design_settings(event, db)
     else: await show_settings_menu(event, db)
     return True
 
 
+@router.route('settings_ai')
 async def show_ai_settings(event, db: Database):
     """Show AI settings"""
     settings = db.get_all_settings()
@@ -65,16 +89,20 @@ async def show_ai_settings(event, db: Database):
         ('ai_model', 'مدل AI'),
         ('quote_count', 'تعداد نقل‌قول'),
         ('summary_length_min', 'حداقل طول خلاصه'),
-        ('summary_length_max', 'حداکثر طول خلاصه')
+        ('summary_length_max', 'حداکثر طول خلاصه'),
+        ('ai_daily_token_budget', 'بودجه روزانه توکن'),
+        ('ai_book_token_budget', 'بودجه توکن هر کتاب')
     ]
     
     for key, label in items:
         val = settings.get(key, {}).get('value', 'تعریف نشده')
         text += f"• **{label}:** `{val}`\n"
+    text += "\n💡 بودجه 0 یعنی بدون محدودیت."
         
     keyboard = [
         [Button.inline('✏️ مدل AI', b'set_edit_ai_model'), Button.inline('✏️ تعداد نقل‌قول', b'set_edit_quote_count')],
         [Button.inline('✏️ حداقل خلاصه', b'set_edit_summary_length_min'), Button.inline('✏️ حداکثر خلاصه', b'set_edit_summary_length_max')],
+        [Button.inline('✏️ بودجه روزانه', b'set_edit_ai_daily_token_budget'), Button.inline('✏️ بودجه هر کتاب', b'set_edit_ai_book_token_budget')],
         [Button.inline('🔙 بازگشت', b'menu_settings')]
     ]
     
@@ -84,6 +112,7 @@ async def show_ai_settings(event, db: Database):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('settings_design')
 async def show_design_settings(event, db: Database):
     """Show design settings"""
     settings = db.get_all_settings()
@@ -92,16 +121,18 @@ async def show_design_settings(event, db: Database):
     items = [
         ('design_template', 'قالب طراحی'),
         ('font_size', 'اندازه فونت'),
-        ('bg_color', 'رنگ پس‌زمینه')
+        ('bg_color', 'رنگ پس‌زمینه'),
+        ('quote_card_enabled', 'کارت نقل‌قول')
     ]
     
     for key, label in items:
         val = settings.get(key, {}).get('value', 'تعریف نشده')
         text += f"• **{label}:** `{val}`\n"
+    text += "\n💡 کارت نقل‌قول (1 = فعال): تصویر نقل‌قول همراه کاور به صورت آلبوم منتشر می‌شود."
         
     keyboard = [
         [Button.inline('✏️ قالب', b'set_edit_design_template'), Button.inline('✏️ فونت', b'set_edit_font_size')],
-        [Button.inline('✏️ رنگ پس‌زمینه', b'set_edit_bg_color')],
+        [Button.inline('✏️ رنگ پس‌زمینه', b'set_edit_bg_color'), Button.inline('✏️ کارت نقل‌قول', b'set_edit_quote_card_enabled')],
         [Button.inline('🔙 بازگشت', b'menu_settings')]
     ]
     
@@ -111,6 +142,7 @@ async def show_design_settings(event, db: Database):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('settings_content')
 async def show_content_settings(event, db: Database):
     """Show content settings"""
     settings = db.get_all_settings()
@@ -4,10 +4,13 @@ Statistics handler
 from telethon import events, Button
 from utils.keyboards import stats_menu_keyboard
 from utils.helpers import is_admin
+from utils.router import router
 from database.db import Database
 from config import ADMIN_USER_ID
 
 
+@router.route('menu_stats')
+@router.route('stats_refresh')
 async def show_stats(event, db: Database):
     """Show bot statistics"""
     user_id = event.sender_id
@@ -17,6 +20,8 @@ async def show_stats(event, db: Database):
         return
     
     stats = db.get_stats()
+    queue = db.get_publish_queue_stats()
+    queue_counts = queue['counts']
     
     text = f"""
 📊 **آمار و گزارش**
@@ -29,6 +34,11 @@ async def show_stats(event, db: Database):
 • کل محتوا: {stats.get('total_content', 0)}
 • تایید شده: {stats.get('approved_content', 0)}
 • منتشر شده: {stats.get('published_content', 0)}
+
+📤 **صف انتشار:**
+• در صف: {queue_counts.get('pending', 0) + queue_counts.get('sending', 0)} | ناموفق: {queue_counts.get('failed', 0)}
+• میانگین تاخیر انتشار: {(queue['avg_latency_ms'] or 0) / 1000:.1f} ثانیه
+• میانگین تلاش: {queue['avg_attempts'] or 0:.1f}
     """
     
     keyboard = stats_menu_keyboard()
@@ -39,6 +49,7 @@ async def show_stats(event, db: Database):
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
 
+@router.route('stats_full')
 async def show_full_stats(event, db: Database):
     """Show full detailed statistics"""
     user_id = event.sender_id
@@ -102,3 +113,60 @@ async def show_full_stats(event, db: Database):
     else:
         await event.respond(text, buttons=keyboard, parse_mode='md')
 
+
+
+@router.route('stats_ai')
+async def show_ai_usage_stats(event, db: Database):
+    """Show AI token usage and budgets"""
+    user_id = event.sender_id
+    
+    if not is_admin(user_id, ADMIN_USER_ID):
+        if isinstance(event, events.CallbackQuery.Event):
+            await event.answer("❌ شما دسترسی به این بخش را ندارید.", alert=True)
+        else:
+            await event.respond("❌ شما دسترسی به این بخش را ندارید.")
+        return
+    
+    breakdown = db.get_ai_usage_breakdown(days=7)
+    totals = breakdown['totals']
+    used_today = db.get_ai_tokens_used(today_only=True)
+    daily_budget = int(db.get_setting('ai_daily_token_budget', '0') or 0)
+    book_budget = int(db.get_setting('ai_book_token_budget', '0') or 0)
+    
+    text = f"""
+🤖 **مصرف AI**
+
+📅 **امروز:**
+• توکن مصرفی: {used_today:,}
+• بودجه روزانه: {f'{daily_budget:,}' if daily_budget else 'نامحدود'}
+• بودجه هر کتاب: {f'{book_budget:,}' if book_budget else 'نامحدود'}
+
+📊 **7 روز اخیر:**
+• درخواست‌ها: {totals['requests']}
+• توکن ورودی: {totals['prompt_tokens']:,}
+• توکن خروجی: {totals['completion_tokens']:,}
+• هزینه: ${totals['cost']:.4f}
+• میانگین تاخیر: {int(totals['avg_latency_ms'])} ms
+• استفاده از کش: {totals['cache_hits']}
+
+🧠 **بر اساس مدل:**
+"""
+    for row in breakdown['by_model']:
+        text += f"• {row['model']}: {row['total_tokens']:,} ({row['requests']} درخواست)\n"
+    
+    text += "\n📋 **بر اساس نوع محتوا:**\n"
+    for row in breakdown['by_type']:
+        text += f"• {row['content_type']}: {row['total_tokens']:,}\n"
+    
+    if breakdown['top_books']:
+        text += "\n📚 **پرمصرف‌ترین کتاب‌ها:**\n"
+        for row in breakdown['top_books']:
+            title = (row.get('title') or f"#{row['book_id']}")[:30]
+            text += f"• {title}: {row['total_tokens']:,}\n"
+    
+    keyboard = [[Button.inline('🔙 بازگشت', b'menu_stats')]]
+    
+    if isinstance(event, events.CallbackQuery.Event):
+        await event.edit(text, buttons=keyboard, parse_mode='md')
+    else:
+        await event.respond(text, buttons=keyboard, parse_mode='md')
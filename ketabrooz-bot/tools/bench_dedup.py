@@ -0,0 +1,112 @@
+"""
+Benchmark for near-duplicate detection (core/dedup.py)
+
+Fills a temporary database with synthetic Persian quotes, builds the
+MinHash/LSH index and measures lookup latency for unique texts and
+lightly edited copies of stored texts.
+
+Usage:
+    python tools/bench_dedup.py [--items 100000] [--queries 1000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Fix encoding for Windows console
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.db import Database
+from core.dedup import NearDuplicateIndex, minhash_signature
+
+
+LETTERS = 'ابپتثجچحخدذرزژسشصضطظعغفقکگلمنوهی'
+
+
+def make_vocabulary(rng: random.Random, size: int = 5000) -> list:
+    """Pseudo-words, so texts overlap about as much as real quotes do"""
+    return [''.join(rng.choice(LETTERS) for _ in range(rng.randint(2, 7))) for _ in range(size)]
+
+
+def make_text(rng: random.Random, words: list) -> str:
+    return ' '.join(rng.choice(words) for _ in range(rng.randint(15, 40)))
+
+
+def mutate(text: str, rng: random.Random, vocabulary: list) -> str:
+    """Change one or two words so the text stays a near-duplicate"""
+    words = text.split()
+    for _ in range(rng.randint(1, 2)):
+        words[rng.randrange(len(words))] = rng.choice(vocabulary)
+    return ' '.join(words)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    tmp_dir = tempfile.mkdtemp()
+    db = Database(os.path.join(tmp_dir, 'bench.db'))
+
+    print(f"Generating {args.items} items...")
+    vocabulary = make_vocabulary(rng)
+    texts = [make_text(rng, vocabulary) for _ in range(args.items)]
+    conn = db._get_connection()
+    conn.executemany(
+        "INSERT INTO content (type, text, status) VALUES ('quote', ?, 'published')",
+        [(text,) for text in texts]
+    )
+    conn.commit()
+    conn.close()
+
+    index = NearDuplicateIndex(db)
+    start = time.perf_counter()
+    index.sync()
+    build = time.perf_counter() - start
+    print(f"Index build: {build:.1f}s ({build / args.items * 1000:.2f} ms/item)")
+
+    start = time.perf_counter()
+    reloaded = NearDuplicateIndex(db)
+    reloaded.sync()
+    print(f"Index reload from SQLite: {time.perf_counter() - start:.2f}s")
+
+    for label, queries in (
+        ('unique', [make_text(rng, vocabulary) for _ in range(args.queries)]),
+        ('near-duplicate', [mutate(rng.choice(texts), rng, vocabulary) for _ in range(args.queries)]),
+    ):
+        sign_times, lookup_times, hits = [], [], 0
+        for text in queries:
+            t0 = time.perf_counter()
+            signature = minhash_signature(text)
+            t1 = time.perf_counter()
+            if index.find_similar(text, signature=signature):
+                hits += 1
+            t2 = time.perf_counter()
+            sign_times.append((t1 - t0) * 1000)
+            lookup_times.append((t2 - t1) * 1000)
+        print(
+            f"{label:>15}: signature p50 {statistics.median(sign_times):.3f} ms, "
+            f"lookup p50 {statistics.median(lookup_times):.3f} ms / "
+            f"p99 {percentile(lookup_times, 99):.3f} ms, "
+            f"flagged {hits}/{len(queries)}"
+        )
+
+
+if __name__ == '__main__':
+    main()
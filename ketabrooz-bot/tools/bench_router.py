@@ -0,0 +1,104 @@
+"""
+Benchmark for callback routing (utils/router.py)
+
+Loads the routes the handler modules register and compares resolving
+callback data with the router against the if/elif chain it replaced
+(== / startswith tests in registration order plus int(data.split('_')[-1])),
+and decoding the binary callback data buttons carry now. Also runs the
+shadowed-route check.
+
+Usage:
+    python tools/bench_router.py [--rounds 20000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Fix encoding for Windows console
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.chdir(Path(__file__).resolve().parent.parent)
+
+from handlers import menu, books, content, schedule, stats, settings, env_settings, hashtags, footer  # noqa: F401
+from utils.router import PARAM_PATTERN, router
+
+
+def sample_data(route) -> str:
+    """Callback data that hits a route"""
+    return PARAM_PATTERN.sub(lambda m: '12345' if m.group(2) == 'int' else 'sample_key', route.pattern)
+
+
+def sample_binary(route) -> bytes:
+    """Binary callback data that hits a route"""
+    return router.callback(route.pattern, **{
+        name: 12345 if param_type == 'int' else 'sample_key' for name, param_type in route.params
+    })
+
+
+def linear_resolve(chain, data: str):
+    """The old if/elif chain: first matching test wins"""
+    for literal, is_prefix, param_type in chain:
+        if is_prefix:
+            if data.startswith(literal):
+                value = data.split('_')[-1] if param_type == 'int' else data.replace(literal, '')
+                return literal, int(value) if param_type == 'int' else value
+        elif data == literal:
+            return literal, None
+    return None
+
+
+def measure(resolve, samples, rounds: int) -> list:
+    """Nanoseconds per resolution, one value per sample"""
+    results = []
+    for data in samples:
+        start = time.perf_counter_ns()
+        for _ in range(rounds):
+            resolve(data)
+        results.append((time.perf_counter_ns() - start) / rounds)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Callback routing benchmark")
+    parser.add_argument('--rounds', type=int, default=20000, help='Resolutions per callback')
+    args = parser.parse_args()
+
+    chain = []
+    for route in router.routes:
+        match = PARAM_PATTERN.search(route.pattern)
+        chain.append((route.prefix, not route.is_exact, match.group(2) if match else None))
+    samples = [sample_data(route) for route in router.routes] + ['unknown_callback_data']
+
+    for data in samples[:-1]:
+        route, _ = router.resolve(data)
+        assert route.pattern == next(r.pattern for r in router.routes if sample_data(r) == data), data
+
+    print(f"Routes: {len(router.routes)} ({sum(r.is_exact for r in router.routes)} exact)")
+    binary = [sample_binary(route) for route in router.routes]
+    text_size = sum(len(data.encode('utf-8')) for data in samples[:-1]) / len(binary)
+    print(f"Callback data size: text {text_size:.1f} bytes, binary {sum(map(len, binary)) / len(binary):.1f} bytes")
+
+    for label, resolve, data in (
+        ('if/elif chain', lambda d: linear_resolve(chain, d), samples),
+        ('router (text)', router.resolve, samples),
+        ('router (binary)', router.resolve_data, binary),
+    ):
+        times = measure(resolve, data, args.rounds)
+        print(f"{label:15} mean {statistics.mean(times):7.0f} ns | median {statistics.median(times):7.0f} ns | "
+              f"worst {max(times):7.0f} ns")
+
+    conflicts = router.find_shadowed()
+    print(f"Shadowed routes: {len(conflicts)}")
+    for conflict in conflicts:
+        print(f"  {conflict}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark for video watermark encode profiles (utils/watermark.py)
+
+Generates a test clip with ffmpeg's lavfi sources and watermarks it with
+every profile in VIDEO_PROFILES, in both watermark modes, reporting
+encode fps, speed relative to real time and output size. Needs ffmpeg
+(and ffprobe) on PATH.
+
+Usage:
+    python tools/bench_video_profiles.py [--resolution 1920x1080] [--seconds 10] [--threads 0]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Fix encoding for Windows console
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.watermark import VIDEO_PROFILES, VIDEO_WATERMARK_MODES, add_watermark_video, ffmpeg_capabilities
+
+
+FRAME_RATE = 30
+
+
+def make_clip(path: str, resolution: str, seconds: int):
+    """Test pattern with motion and a tone, encoded like a typical upload"""
+    subprocess.run([
+        'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={resolution}:rate={FRAME_RATE}:duration={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '18', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-shortest', path
+    ], check=True)
+
+
+async def run(args):
+    capabilities = await ffmpeg_capabilities()
+    if not capabilities['ffmpeg']:
+        print("ffmpeg not found on PATH")
+        sys.exit(1)
+    modes = [m for m in VIDEO_WATERMARK_MODES if m != 'drawtext' or capabilities['drawtext']]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, 'source.mp4')
+        make_clip(source, args.resolution, args.seconds)
+        frames = args.seconds * FRAME_RATE
+        print(f"Clip: {args.resolution}, {args.seconds}s at {FRAME_RATE} fps "
+              f"({os.path.getsize(source) / (1024 * 1024):.1f} MB), threads={args.threads or 'auto'}")
+        print(f"{'profile':10} {'mode':9} {'fps':>7} {'x realtime':>10} {'size MB':>8}")
+
+        for name in VIDEO_PROFILES:
+            for mode in modes:
+                # A copy per run, so outputs never collide
+                clip = os.path.join(temp_dir, f'{name}_{mode}.mp4')
+                shutil.copyfile(source, clip)
+                started = time.perf_counter()
+                output = await add_watermark_video(clip, '@ketabrooz_channel', profile=name, mode=mode,
+                                                   threads=args.threads)
+                elapsed = time.perf_counter() - started
+                if output is None:
+                    print(f"{name:10} {mode:9} failed")
+                    continue
+                print(f"{name:10} {mode:9} {frames / elapsed:7.1f} {args.seconds / elapsed:10.2f} "
+                      f"{os.path.getsize(output) / (1024 * 1024):8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Video watermark profile benchmark")
+    parser.add_argument('--resolution', default='1920x1080', help='Test clip size (WxH)')
+    parser.add_argument('--seconds', type=int, default=10, help='Test clip length')
+    parser.add_argument('--threads', type=int, default=0, help='Encoder threads (0 = auto)')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
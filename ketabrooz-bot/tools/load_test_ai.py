@@ -0,0 +1,160 @@
+"""
+Load test for the AI pipeline of book processing
+
+Starts tools/mock_openrouter.py in-process (or uses --base-url), then
+runs the AI stages of book processing (cover analysis, summary, quote
+generation with streaming) for many books concurrently and reports
+throughput, retries and latency percentiles.
+
+Usage:
+    python tools/load_test_ai.py --books 200 --concurrency 20 --rate-429 0.05 --rate-5xx 0.02
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Fix encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from PIL import Image
+from database.db import Database
+from core import ai_generator
+from core.ai_generator import AIGenerator
+from core.history_selector import get_history_selector
+import mock_openrouter
+
+
+BOOK_TEXT = (
+    "در روزگاری نه چندان دور، مردی در شهری کوچک زندگی می‌کرد که هر روز صبح "
+    "پیش از طلوع آفتاب کتابی را باز می‌کرد و چند صفحه می‌خواند. "
+) * 60
+
+
+def make_cover() -> bytes:
+    """Cover-sized PNG similar to PDFProcessor.extract_cover output"""
+    img = Image.new('RGB', (1240, 1754), (40, 70, 120))
+    output = io.BytesIO()
+    img.save(output, format='PNG')
+    return output.getvalue()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0
+
+
+async def process_book(db: Database, book: dict, cover: bytes, base_url: str) -> dict:
+    """Run the AI stages of handlers.books.process_existing_book for one book"""
+    ai = AIGenerator('mock-key', 'google/gemini-2.5-flash:free', db=db, book_id=book['id'], base_url=base_url)
+    started = time.monotonic()
+    first_chunk = None
+
+    async def on_progress(text: str):
+        nonlocal first_chunk
+        if first_chunk is None:
+            first_chunk = time.monotonic()
+
+    metadata = await ai.analyze_image(cover)
+    summary = await ai.generate_summary(BOOK_TEXT)
+    quote_started = time.monotonic()
+    quote = await ai.generate_content_from_history(
+        published_content_history=get_history_selector(db).select('quote', limit=5),
+        content_type='quote',
+        book_title=book['title'],
+        book_text=BOOK_TEXT[:3000],
+        on_progress=on_progress
+    )
+
+    ok = 'error' not in metadata and bool(summary) and bool(quote.get('quote'))
+    return {
+        'ok': ok,
+        'seconds': time.monotonic() - started,
+        'ttfb': (first_chunk - quote_started) if first_chunk else None,
+    }
+
+
+async def run(args):
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server = await mock_openrouter.start_server(mock_openrouter.mock_from_args(args), port=args.port)
+        base_url = f"http://127.0.0.1:{args.port}/api/v1"
+
+    db = Database(os.path.join(tempfile.mkdtemp(), 'load.db'))
+    books = []
+    for i in range(args.books):
+        book_id = db.add_book(title=f"کتاب آزمایشی {i + 1}", pdf_file_id=f"load-{i}", pdf_message_id=i)
+        books.append(db.get_book(book_id))
+    # Published history so quote generation takes the style-example path
+    for i in range(10):
+        db.add_content(book_id=books[i % len(books)]['id'], content_type='quote',
+                       text=mock_openrouter.make_item('quote')['quote'], status='published')
+    cover = make_cover()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(book):
+        async with semaphore:
+            try:
+                return await process_book(db, book, cover, base_url)
+            except Exception as e:
+                print(f"Book {book['id']} failed: {str(e)}")
+                return {'ok': False, 'seconds': 0, 'ttfb': None}
+
+    print(f"Processing {args.books} books with concurrency {args.concurrency} against {base_url}")
+    started = time.monotonic()
+    results = await asyncio.gather(*(limited(book) for book in books))
+    elapsed = time.monotonic() - started
+
+    if server:
+        await server.cleanup()
+
+    book_times = [r['seconds'] for r in results if r['ok']]
+    ttfb = [r['ttfb'] for r in results if r['ttfb'] is not None]
+    conn = db._get_connection()
+    request_ms = [row[0] for row in conn.execute("SELECT latency_ms FROM ai_usage WHERE latency_ms IS NOT NULL")]
+    conn.close()
+    stats = ai_generator.request_stats
+
+    print(f"\nElapsed:       {elapsed:.1f}s")
+    print(f"Books:         {len(book_times)}/{len(results)} ok, {len(book_times) / elapsed:.2f} books/s")
+    print(f"Requests:      {len(request_ms)} completed, {len(request_ms) / elapsed:.2f} req/s")
+    print(f"Attempts:      {stats['attempts']} (retries {stats['retries']}, failed {stats['failures']})")
+    print(f"HTTP statuses: {dict(sorted(stats['statuses'].items()))}")
+    for label, values, unit in (
+        ('Request latency', request_ms, 'ms'),
+        ('Book latency', [t * 1000 for t in book_times], 'ms'),
+        ('Stream first chunk', [t * 1000 for t in ttfb], 'ms'),
+    ):
+        if values:
+            print(
+                f"{label + ':':<20} p50 {statistics.median(values):.0f}{unit}  "
+                f"p95 {percentile(values, 95):.0f}{unit}  p99 {percentile(values, 99):.0f}{unit}  "
+                f"max {max(values):.0f}{unit}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--books', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--base-url', default=None, help='Use a running server instead of the in-process mock')
+    parser.add_argument('--port', type=int, default=8799)
+    mock_openrouter.add_arguments(parser)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+Local OpenRouter-compatible chat completions server for offline testing
+
+Answers POST /api/v1/chat/completions with canned Persian JSON shaped
+after the prompt (quote, quote list, description, summary, cover
+analysis or bundle), with configurable latency, 429/5xx injection and
+SSE streaming. GET /stats returns request counters.
+
+Usage:
+    python tools/mock_openrouter.py --port 8799 --latency lognormal:0.8,0.4 --rate-429 0.05
+    OPENROUTER_BASE_URL=http://127.0.0.1:8799/api/v1 python bot.py
+
+Latency specs:
+    fixed:SECONDS | uniform:LOW,HIGH | lognormal:MEDIAN,SIGMA | exp:MEAN
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import sys
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+# Fix encoding for Windows console
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+
+QUOTE_OPENINGS = [
+    "هر کتابی که می‌خوانی،",
+    "آدمی در سکوت",
+    "زندگی همیشه",
+    "گاهی یک جمله ساده",
+    "کسی که امید را از دست نمی‌دهد،",
+]
+QUOTE_ENDINGS = [
+    "دری تازه به روی جهانی ناشناخته باز می‌کند.",
+    "صدای درون خود را بهتر می‌شنود.",
+    "فرصتی دوباره برای آغاز به ما می‌دهد.",
+    "مسیر یک عمر را دگرگون می‌کند.",
+    "هرگز در تاریکی گم نمی‌شود.",
+]
+DESCRIPTIONS = [
+    "این کتاب روایتی گیرا از تلاش انسان برای یافتن معنا در دل روزمرگی است و خواننده را تا صفحه آخر همراه خود نگه می‌دارد.",
+    "نویسنده با زبانی ساده و صمیمی، تجربه‌هایی عمیق را بازگو می‌کند که برای هر خواننده‌ای آشنا و الهام‌بخش است.",
+]
+SUMMARIES = [
+    "داستان درباره شخصیتی است که پس از یک شکست بزرگ، با کمک دوستان و کتاب‌ها راه تازه‌ای برای زندگی پیدا می‌کند و یاد می‌گیرد که امید، مهم‌ترین سرمایه انسان است.",
+    "کتاب در چند فصل کوتاه، مفاهیم اصلی رشد فردی را با مثال‌های واقعی توضیح می‌دهد و نشان می‌دهد چگونه عادت‌های کوچک به تغییرهای بزرگ می‌انجامند.",
+]
+KEY_POINTS = ["اهمیت امید", "قدرت عادت‌های کوچک", "ارزش دوستی", "یادگیری از شکست"]
+GENRES = ["رمان", "روانشناسی", "ادبیات داستانی", "توسعه فردی"]
+
+BUNDLE_PATTERN = re.compile(r'"(quote|description|summary)": آرایه‌ای از (\d+)')
+QUOTE_LIST_PATTERN = re.compile(r'(\d+) نقل‌قول')
+TEMPLATE_PATTERN = re.compile(r'\{"(quote|description|summary|title)":')
+
+
+def parse_latency(spec: str):
+    """Build a latency sampler (seconds) from a spec string"""
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',') if v]
+    if kind == 'fixed':
+        return lambda: values[0]
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        median, sigma = values
+        return lambda: random.lognormvariate(math.log(median), sigma)
+    if kind == 'exp':
+        return lambda: random.expovariate(1.0 / values[0])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+def make_item(content_type: str) -> Dict[str, Any]:
+    """Canned item of a content type"""
+    if content_type == 'quote':
+        return {
+            "quote": f"{random.choice(QUOTE_OPENINGS)} {random.choice(QUOTE_ENDINGS)} ({random.randint(1, 10**6)})",
+            "context": "برگرفته از فصل اول کتاب"
+        }
+    if content_type == 'description':
+        return {"description": random.choice(DESCRIPTIONS), "key_points": random.sample(KEY_POINTS, 3)}
+    if content_type == 'summary':
+        return {
+            "summary": random.choice(SUMMARIES),
+            "key_points": random.sample(KEY_POINTS, 3),
+            "genre": random.choice(GENRES),
+            "target_audience": "بزرگسالان"
+        }
+    return {
+        "title": "کتاب نمونه",
+        "author": "نویسنده نمونه",
+        "category": random.choice(GENRES),
+        "cover_description": "جلدی ساده با زمینه آبی و عنوان درشت",
+        "tags": ["کتاب", "ادبیات"]
+    }
+
+
+def prompt_text(messages: List[Dict[str, Any]]) -> str:
+    """Concatenated text parts of the request messages"""
+    parts = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(p.get('text', '') for p in content or [] if p.get('type') == 'text')
+    return '\n'.join(parts)
+
+
+def make_response(messages: List[Dict[str, Any]]) -> str:
+    """Build completion text matching the output format the prompt asks for"""
+    prompt = prompt_text(messages)
+
+    bundle = BUNDLE_PATTERN.findall(prompt)
+    if bundle:
+        result = {t: [make_item(t) for _ in range(int(n))] for t, n in bundle}
+    elif '[{"quote"' in prompt:
+        match = QUOTE_LIST_PATTERN.search(prompt)
+        result = [make_item('quote') for _ in range(int(match.group(1)) if match else 5)]
+    else:
+        templates = TEMPLATE_PATTERN.findall(prompt)
+        result = make_item(templates[-1] if templates else 'description')
+
+    return f"```json\n{json.dumps(result, ensure_ascii=False, indent=2)}\n```"
+
+
+class MockOpenRouter:
+    """Request handler state and counters"""
+
+    def __init__(self, latency: str = 'fixed:0.2', rate_429: float = 0.0, rate_5xx: float = 0.0,
+                 retry_after: Optional[float] = 1.0, chunk_size: int = 40,
+                 chunk_delay: float = 0.02, seed: Optional[int] = None):
+        if seed is not None:
+            random.seed(seed)
+        self.sample_latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.stats = {'requests': 0, 'streamed': 0, '429': 0, '5xx': 0, 'in_flight': 0, 'max_in_flight': 0}
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        self.stats['requests'] += 1
+        self.stats['in_flight'] += 1
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+        try:
+            roll = random.random()
+            if roll < self.rate_429:
+                self.stats['429'] += 1
+                headers = {'Retry-After': str(self.retry_after)} if self.retry_after is not None else {}
+                return web.json_response(
+                    {"error": {"code": 429, "message": "Rate limit exceeded"}}, status=429, headers=headers
+                )
+            if roll < self.rate_429 + self.rate_5xx:
+                self.stats['5xx'] += 1
+                await asyncio.sleep(self.sample_latency() / 4)
+                return web.json_response(
+                    {"error": {"code": 502, "message": "Upstream error"}}, status=random.choice([500, 502, 503])
+                )
+
+            text = make_response(payload.get('messages') or [])
+            prompt_tokens = len(prompt_text(payload.get('messages') or [])) // 3 + 1
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(text) // 3 + 1,
+                "total_tokens": prompt_tokens + len(text) // 3 + 1,
+                "cost": 0
+            }
+            model = payload.get('model', 'mock/model')
+
+            if not payload.get('stream'):
+                await asyncio.sleep(self.sample_latency())
+                return web.json_response({
+                    "id": f"gen-mock-{self.stats['requests']}",
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                 "finish_reason": "stop"}],
+                    "usage": usage
+                })
+
+            self.stats['streamed'] += 1
+            response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+            await response.prepare(request)
+            # Time to first token, then evenly paced chunks
+            await asyncio.sleep(self.sample_latency())
+            await response.write(b": OPENROUTER PROCESSING\n\n")
+            for start in range(0, len(text), self.chunk_size):
+                chunk = {"model": model, "choices": [{"index": 0, "delta": {"content": text[start:start + self.chunk_size]}}]}
+                await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                await asyncio.sleep(self.chunk_delay)
+            final = {"model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+            await response.write_eof()
+            return response
+        finally:
+            self.stats['in_flight'] -= 1
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+
+def create_app(mock: MockOpenRouter) -> web.Application:
+    """Create the aiohttp application for a mock"""
+    app = web.Application(client_max_size=32 * 1024 * 1024)
+    app.router.add_post('/api/v1/chat/completions', mock.chat_completions)
+    app.router.add_get('/stats', mock.get_stats)
+    return app
+
+
+async def start_server(mock: MockOpenRouter, host: str = '127.0.0.1', port: int = 8799) -> web.AppRunner:
+    """Start the mock in the running event loop (call runner.cleanup() to stop)"""
+    runner = web.AppRunner(create_app(mock))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Mock server options (shared with tools/load_test_ai.py)"""
+    parser.add_argument('--latency', default='lognormal:0.8,0.4', help='Latency spec (see module docstring)')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help='Fraction of requests answered with 5xx')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with 429')
+    parser.add_argument('--chunk-delay', type=float, default=0.02, help='Seconds between streamed chunks')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def mock_from_args(args) -> MockOpenRouter:
+    return MockOpenRouter(
+        latency=args.latency,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        retry_after=args.retry_after,
+        chunk_delay=args.chunk_delay,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8799)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    print(f"Mock OpenRouter on http://{args.host}:{args.port}/api/v1")
+    web.run_app(create_app(mock_from_args(args)), host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
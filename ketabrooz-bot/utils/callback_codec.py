@@ -0,0 +1,117 @@
+"""
+Compact binary encoding of callback data
+
+Telegram limits callback data to 64 bytes. Instead of text like
+'content_publish_confirm_12345' (30 bytes), buttons carry:
+
+    version (1 byte) | action id (2 bytes, big endian) | arguments
+
+Integers are zigzag varints (1-3 bytes for typical IDs and pages) and
+strings are a varint length followed by UTF-8. The action id is derived
+from the route pattern, so it stays the same across restarts and
+deployments as long as the pattern does.
+
+Text callback data (version 0) starts with a printable character and is
+still accepted, so buttons already sent in chat history keep working.
+"""
+import struct
+import zlib
+from typing import Any, List, Optional, Sequence, Tuple
+
+
+VERSION = 1
+MAX_CALLBACK_BYTES = 64
+
+_HEADER = struct.Struct('>BH')
+
+
+def action_id(pattern: str) -> int:
+    """Stable 16-bit id of a route pattern"""
+    return zlib.crc32(pattern.encode('utf-8')) & 0xFFFF
+
+
+def is_binary(data: bytes) -> bool:
+    """Whether data uses the binary format (text callbacks start printable)"""
+    return bool(data) and data[0] < 0x20
+
+
+def _write_varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    value, shift = 0, 0
+    while True:
+        if position >= len(data) or shift > 63:
+            raise ValueError("Truncated varint in callback data")
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def encode(action: int, types: Sequence[str], values: Sequence[Any]) -> bytes:
+    """
+    Encode an action and its arguments
+
+    Args:
+        action: Action id (see action_id)
+        types: Argument types ('int' or 'str'), in pattern order
+        values: Argument values
+
+    Raises:
+        ValueError: If the result exceeds Telegram's 64 byte limit
+    """
+    out = bytearray(_HEADER.pack(VERSION, action))
+    for param_type, value in zip(types, values):
+        if param_type == 'int':
+            value = int(value)
+            _write_varint(out, (value << 1) ^ (value >> 63))
+        else:
+            raw = str(value).encode('utf-8')
+            _write_varint(out, len(raw))
+            out += raw
+
+    if len(out) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"Callback data is {len(out)} bytes (limit {MAX_CALLBACK_BYTES})")
+    return bytes(out)
+
+
+def decode_header(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Read the action id of binary callback data
+
+    Returns:
+        Tuple of (action id, offset of the arguments), or None for an
+        unknown version or malformed data
+    """
+    if len(data) < 3 or data[0] != VERSION:
+        return None
+    return (data[1] << 8) | data[2], 3
+
+
+def decode_args(data: bytes, position: int, types: Sequence[str]) -> List[Any]:
+    """
+    Decode the arguments following the header
+
+    Raises:
+        ValueError: If the data does not match the types
+    """
+    values = []
+    for param_type in types:
+        raw, position = _read_varint(data, position)
+        if param_type == 'int':
+            values.append((raw >> 1) ^ -(raw & 1))
+        else:
+            if position + raw > len(data):
+                raise ValueError("Truncated string in callback data")
+            values.append(data[position:position + raw].decode('utf-8'))
+            position += raw
+    if position != len(data):
+        raise ValueError("Trailing bytes in callback data")
+    return values
@@ -0,0 +1,112 @@
+"""
+Per-user ordered task dispatcher
+
+Telethon runs every update handler as its own task, so two messages from
+the same admin (e.g. two PDFs sent back to back) would race on the same
+state. The dispatcher gives each user a queue drained by one worker
+task: a user's messages run in order, different users run concurrently,
+and the update handler only enqueues and returns.
+"""
+import asyncio
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+# Creates the coroutine to run (called when the task's turn comes)
+Task = Callable[[], Awaitable[Any]]
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+class UserDispatcher:
+    """Runs tasks one at a time per key and concurrently across keys"""
+
+    def __init__(self, max_pending: int = 20):
+        """
+        Initialize dispatcher
+
+        Args:
+            max_pending: Tasks queued per user before new ones are rejected
+        """
+        self.max_pending = max_pending
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+
+    def submit(self, key: int, task: Task) -> bool:
+        """
+        Queue a task behind the key's earlier tasks
+
+        Args:
+            key: Serialization key (the user ID)
+            task: Function returning the coroutine to run
+
+        Returns:
+            False if the key's queue is full and the task was dropped
+        """
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Queue(maxsize=self.max_pending)
+        try:
+            queue.put_nowait(task)
+        except asyncio.QueueFull:
+            return False
+
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._drain(key, queue))
+        return True
+
+    def pending(self, key: int) -> int:
+        """Tasks of a key waiting or running"""
+        queue = self._queues.get(key)
+        return queue.qsize() + (1 if key in self._workers else 0) if queue else 0
+
+    async def stop(self):
+        """Cancel all workers (queued tasks are dropped)"""
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+
+    async def _drain(self, key: int, queue: asyncio.Queue):
+        """Run the key's tasks in order; exit once its queue is empty"""
+        try:
+            while not queue.empty():
+                task = queue.get_nowait()
+                try:
+                    await task()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Error in task for {key}: {str(e)}")
+                    traceback.print_exc()
+        finally:
+            # No await between the empty check and removal, so submit()
+            # never queues behind a worker that is about to exit
+            self._workers.pop(key, None)
+            if queue.empty():
+                self._queues.pop(key, None)
+
+
+async def run_cpu_bound(func: Callable[..., Any], *args) -> Any:
+    """
+    Run a CPU-heavy, picklable function in the shared process pool
+
+    Keeps the event loop (and every other user's handlers) responsive
+    while e.g. a large PDF is parsed.
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=max(1, min(4, (os.cpu_count() or 2) - 1)))
+    return await asyncio.get_running_loop().run_in_executor(_process_pool, func, *args)
+
+
+def shutdown_process_pool():
+    """Stop the shared process pool (on bot shutdown)"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
@@ -3,6 +3,7 @@ Inline keyboard builders for KetabeRooz bot
 """
 from telethon import Button
 from typing import List, Optional
+from utils.router import router
 
 
 def main_menu_keyboard() -> List[List[Button]]:
@@ -41,8 +42,8 @@ def content_menu_keyboard() -> List[List[Button]]:
 def content_approval_keyboard(content_id: int) -> List[List[Button]]:
     """Content approval keyboard for a specific content"""
     return [
-        [Button.inline('✅ تایید', f'content_approve_{content_id}'.encode()),
-         Button.inline('❌ رد', f'content_reject_{content_id}'.encode())],
+        [Button.inline('✅ تایید', router.callback('content_approve_{content_id:int}', content_id=content_id)),
+         Button.inline('❌ رد', router.callback('content_reject_{content_id:int}', content_id=content_id))],
         [Button.inline('✏️ ویرایش', f'content_edit_{content_id}'.encode()),
          Button.inline('⏰ زمان‌بندی', f'content_schedule_{content_id}'.encode())],
         [Button.inline('📤 انتشار فوری', f'content_publish_{content_id}'.encode())],
@@ -64,6 +65,7 @@ def stats_menu_keyboard() -> List[List[Button]]:
     return [
         [Button.inline('🔄 بروزرسانی', b'stats_refresh')],
         [Button.inline('📊 گزارش کامل', b'stats_full')],
+        [Button.inline('🤖 مصرف AI', b'stats_ai')],
         [Button.inline('🔙 بازگشت', b'main_menu')]
     ]
 
@@ -129,15 +131,16 @@ def env_category_keyboard(category: str) -> List[List[Button]]:
 
 
 def pagination_keyboard(current_page: int, total_pages: int, 
-                       prefix: str, back_button: bytes = b'main_menu') -> List[List[Button]]:
+                       pattern: str, back_button: bytes = b'main_menu', **params) -> List[List[Button]]:
     """
     Create pagination keyboard
     
     Args:
         current_page: Current page number (1-based)
         total_pages: Total number of pages
-        prefix: Button data prefix (e.g., 'books_list')
+        pattern: Route pattern with a page parameter (e.g., 'books_list_{page:int}')
         back_button: Back button data
+        **params: Values of the pattern's other parameters
     
     Returns:
         List of button rows
@@ -146,13 +149,13 @@ def pagination_keyboard(current_page: int, total_pages: int,
     nav = []
     
     if current_page > 1:
-        nav.append(Button.inline('◀️ قبلی', f'{prefix}_{current_page-1}'.encode()))
+        nav.append(Button.inline('◀️ قبلی', router.callback(pattern, page=current_page - 1, **params)))
     
     # Page indicator
     nav.append(Button.inline(f'{current_page}/{total_pages}', b'noop'))
     
     if current_page < total_pages:
-        nav.append(Button.inline('بعدی ▶️', f'{prefix}_{current_page+1}'.encode()))
+        nav.append(Button.inline('بعدی ▶️', router.callback(pattern, page=current_page + 1, **params)))
     
     if nav:
         buttons.append(nav)
@@ -204,7 +207,7 @@ def book_list_keyboard(books: list, page: int = 1, per_page: int = 10) -> List[L
     for book in books[start_idx:end_idx]:
         title = book.get('title', 'بدون عنوان')[:30]
         buttons.append([
-            Button.inline(f"📖 {title}", f"book_view_{book['id']}".encode())
+            Button.inline(f"📖 {title}", router.callback('book_view_{book_id:int}', book_id=book['id']))
         ])
     
     # Pagination
@@ -212,10 +215,10 @@ def book_list_keyboard(books: list, page: int = 1, per_page: int = 10) -> List[L
     if total_pages > 1:
         nav = []
         if page > 1:
-            nav.append(Button.inline('◀️', f'books_list_{page-1}'.encode()))
+            nav.append(Button.inline('◀️', router.callback('books_list_{page:int}', page=page - 1)))
         nav.append(Button.inline(f'{page}/{total_pages}', b'noop'))
         if page < total_pages:
-            nav.append(Button.inline('▶️', f'books_list_{page+1}'.encode()))
+            nav.append(Button.inline('▶️', router.callback('books_list_{page:int}', page=page + 1)))
         buttons.append(nav)
     
     buttons.append([Button.inline('🔙 بازگشت', b'menu_books')])
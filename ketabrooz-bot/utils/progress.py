@@ -0,0 +1,61 @@
+"""
+Throttled progress updates for status messages
+"""
+import time
+from typing import Optional
+from telethon import errors
+
+
+class ThrottledEditor:
+    """
+    Edits a Telegram status message at most once per interval
+
+    Telegram answers rapid edits of the same message with FloodWaitError,
+    so intermediate updates are dropped and only fresh text is sent.
+    """
+
+    def __init__(self, message, min_interval: float = 3.0):
+        """
+        Initialize editor
+
+        Args:
+            message: Telethon message object to edit
+            min_interval: Minimum seconds between two edits
+        """
+        self.message = message
+        self.min_interval = min_interval
+        self._last_edit = 0.0
+        self._last_text: Optional[str] = None
+        self._blocked_until = 0.0
+
+    async def update(self, text: str, force: bool = False) -> bool:
+        """
+        Edit the message if the throttle allows it
+
+        Args:
+            text: New message text
+            force: Ignore the interval (still respects FloodWait)
+
+        Returns:
+            True if the message was edited
+        """
+        now = time.monotonic()
+        if text == self._last_text or now < self._blocked_until:
+            return False
+        if not force and now - self._last_edit < self.min_interval:
+            return False
+
+        try:
+            await self.message.edit(text)
+        except errors.FloodWaitError as e:
+            self._blocked_until = now + e.seconds
+            return False
+        except errors.MessageNotModifiedError:
+            pass
+        except Exception as e:
+            print(f"Progress edit error: {str(e)}")
+            return False
+
+        self._last_edit = now
+        self._last_text = text
+        return True
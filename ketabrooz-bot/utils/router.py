@@ -0,0 +1,299 @@
+"""
+Declarative callback query router
+
+Handlers register callback patterns with the @router.route decorator:
+
+    @router.route('books_list_{page:int}')
+    async def show_books_list(event, db, page=1): ...
+
+Patterns without parameters go into a dict (one lookup). Patterns with
+parameters are keyed by their literal prefix in a radix trie, so a
+callback is resolved by walking its data once and trying the longest
+matching prefix first, regardless of how many routes exist. Parameters
+are converted to their type and passed as keyword arguments, together
+with the dependencies (db, bot, ...) the handler's signature asks for.
+
+Buttons get their data from router.callback(), which packs the route's
+action id and arguments with utils/callback_codec.py; text callback data
+from older buttons is still resolved by pattern.
+"""
+import inspect
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from utils import callback_codec
+
+
+Handler = Callable[..., Awaitable[Any]]
+
+# Parameter types: regex for the value and converter
+PARAM_TYPES = {
+    'int': (r'-?\d+', int),
+    'str': (r'.+', str),
+}
+
+PARAM_PATTERN = re.compile(r'\{(\w+)(?::(\w+))?\}')
+
+
+class Route:
+    """A registered callback pattern"""
+
+    __slots__ = ('pattern', 'handler', 'prefix', 'regex', 'converters', 'defaults', 'wants', 'tail',
+                 'params', 'param_names', 'param_types', 'action_id')
+
+    def __init__(self, pattern: str, handler: Handler, defaults: Dict[str, Any]):
+        self.pattern = pattern
+        self.handler = handler
+        self.defaults = defaults
+        self.converters: Dict[str, Callable[[str], Any]] = {}
+        self.action_id = callback_codec.action_id(pattern)
+
+        first = PARAM_PATTERN.search(pattern)
+        self.prefix = pattern[:first.start()] if first else pattern
+        self.regex = None
+        if first:
+            regex, position = '', first.start()
+            for match in PARAM_PATTERN.finditer(pattern):
+                param_type = match.group(2) or 'str'
+                if param_type not in PARAM_TYPES:
+                    raise ValueError(f"Unknown parameter type '{param_type}' in route {pattern}")
+                type_regex, self.converters[match.group(1)] = PARAM_TYPES[param_type]
+                regex += re.escape(pattern[position:match.start()]) + f'(?P<{match.group(1)}>{type_regex})'
+                position = match.end()
+            self.regex = re.compile(regex + re.escape(pattern[position:]))
+
+        # (name, type) in pattern order, the order of binary arguments
+        self.params = [(m.group(1), m.group(2) or 'str') for m in PARAM_PATTERN.finditer(pattern)]
+        self.param_names = [name for name, _ in self.params]
+        self.param_types = [param_type for _, param_type in self.params]
+
+        # Common case of one trailing parameter: match without the regex engine
+        self.tail = None
+        if first and first.end() == len(pattern):
+            self.tail = (first.group(1), first.group(2) or 'str')
+
+        # Dependencies are injected only if the handler takes them
+        self.wants = tuple(list(inspect.signature(handler).parameters)[1:])
+
+    @property
+    def is_exact(self) -> bool:
+        return self.regex is None
+
+    def match(self, rest: str) -> Optional[Dict[str, Any]]:
+        """Typed parameters if the text after the prefix matches"""
+        if self.tail:
+            name, param_type = self.tail
+            if param_type == 'int':
+                digits = rest[1:] if rest[:1] == '-' else rest
+                return {name: int(rest)} if digits.isdecimal() else None
+            return {name: rest} if rest else None
+        found = self.regex.fullmatch(rest)
+        if not found:
+            return None
+        return {name: self.converters[name](value) for name, value in found.groupdict().items()}
+
+
+class _TrieNode:
+    """Radix trie node; children are keyed by the first character of their edge label"""
+
+    __slots__ = ('children', 'routes')
+
+    def __init__(self):
+        self.children: Dict[str, Tuple[str, '_TrieNode']] = {}
+        self.routes: List[Route] = []
+
+
+class CallbackRouter:
+    """Maps callback data to handlers"""
+
+    def __init__(self):
+        self.routes: List[Route] = []
+        self._exact: Dict[str, Route] = {}
+        self._trie = _TrieNode()
+        self._by_pattern: Dict[str, Route] = {}
+        self._by_action: Dict[int, Route] = {}
+
+    def route(self, pattern: str, **defaults) -> Callable[[Handler], Handler]:
+        """
+        Decorator registering a handler for a callback pattern
+
+        Args:
+            pattern: Literal text with optional {name} / {name:int} parameters
+            **defaults: Extra keyword arguments passed to the handler
+        """
+        def decorator(handler: Handler) -> Handler:
+            self.add(pattern, handler, **defaults)
+            return handler
+        return decorator
+
+    def add(self, pattern: str, handler: Handler, **defaults):
+        """Register a handler for a callback pattern"""
+        route = Route(pattern, handler, defaults)
+        if pattern in self._by_pattern:
+            raise ValueError(f"Duplicate callback route: {pattern}")
+        if route.action_id in self._by_action:
+            raise ValueError(f"Callback action id of {pattern} collides with "
+                             f"{self._by_action[route.action_id].pattern}; rename one of them")
+        self._by_pattern[pattern] = route
+        self._by_action[route.action_id] = route
+        if route.is_exact:
+            self._exact[pattern] = route
+        else:
+            self._insert(route)
+        self.routes.append(route)
+
+    def _insert(self, route: Route):
+        """Add a parameterized route under its prefix, splitting edges as needed"""
+        prefix, node, position = route.prefix, self._trie, 0
+        while position < len(prefix):
+            edge = node.children.get(prefix[position])
+            if edge is None:
+                child = _TrieNode()
+                node.children[prefix[position]] = (prefix[position:], child)
+                node = child
+                break
+
+            label, child = edge
+            common = 0
+            while common < len(label) and position + common < len(prefix) \
+                    and label[common] == prefix[position + common]:
+                common += 1
+            if common < len(label):
+                middle = _TrieNode()
+                middle.children[label[common]] = (label[common:], child)
+                node.children[prefix[position]] = (label[:common], middle)
+                child = middle
+            node = child
+            position += common
+        node.routes.append(route)
+
+    def resolve(self, data: str) -> Optional[Tuple[Route, Dict[str, Any]]]:
+        """
+        Find the route for callback data
+
+        Returns:
+            Tuple of (route, parameters) or None if nothing matches
+        """
+        route = self._exact.get(data)
+        if route is not None:
+            return route, {}
+
+        # Collect the prefixes along the data, then try the longest first
+        node = self._trie
+        position = 0
+        matched = [(0, node.routes)] if node.routes else []
+        while position < len(data):
+            edge = node.children.get(data[position])
+            if edge is None:
+                break
+            label, node = edge
+            if not data.startswith(label, position):
+                break
+            position += len(label)
+            if node.routes:
+                matched.append((position, node.routes))
+
+        for end, routes in reversed(matched):
+            rest = data[end:]
+            for route in routes:
+                params = route.match(rest)
+                if params is not None:
+                    return route, params
+        return None
+
+    def callback(self, pattern: str, **values) -> bytes:
+        """
+        Binary callback data for a button
+
+        Args:
+            pattern: Registered route pattern (e.g. 'book_process_{book_id:int}')
+            **values: Values of the pattern's parameters
+
+        Raises:
+            KeyError: If the pattern is not registered
+        """
+        route = self._by_pattern[pattern]
+        return callback_codec.encode(route.action_id, route.param_types,
+                                     [values[name] for name in route.param_names])
+
+    def resolve_data(self, data: Union[bytes, str]) -> Optional[Tuple[Route, Dict[str, Any]]]:
+        """Find the route for raw callback data in either format"""
+        if isinstance(data, str):
+            return self.resolve(data)
+
+        header = callback_codec.decode_header(data)
+        if header is None:
+            if callback_codec.is_binary(data):
+                # Unknown version or malformed
+                return None
+            # Text buttons (older messages and static keyboards)
+            return self.resolve(data.decode('utf-8', errors='replace'))
+
+        action, position = header
+        route = self._by_action.get(action)
+        if route is None:
+            return None
+        if not route.params:
+            return (route, {}) if position == len(data) else None
+        try:
+            values = callback_codec.decode_args(data, position, route.param_types)
+        except (ValueError, UnicodeDecodeError):
+            return None
+        return route, dict(zip(route.param_names, values))
+
+    async def dispatch(self, event, data: Union[bytes, str], **dependencies) -> bool:
+        """
+        Run the handler for callback data
+
+        Args:
+            event: Callback query event
+            data: Raw (binary or text) or decoded callback data
+            **dependencies: Objects handlers may ask for by parameter name
+
+        Returns:
+            False if no route matches
+        """
+        resolved = self.resolve_data(data)
+        if resolved is None:
+            return False
+        route, params = resolved
+        kwargs = {name: dependencies[name] for name in route.wants if name in dependencies}
+        kwargs.update(route.defaults)
+        kwargs.update(params)
+        await route.handler(event, **kwargs)
+        return True
+
+    def find_shadowed(self) -> List[str]:
+        """
+        Find routes hidden behind a shorter parameterized prefix
+
+        With 'content_p{x}' registered, 'content_publish_confirm_{id:int}'
+        only wins because it is longer, and a malformed id silently falls
+        through to the shorter route. Such pairs are reported.
+
+        Returns:
+            Descriptions of the conflicting pairs
+        """
+        conflicts = []
+        for outer in self.routes:
+            if outer.is_exact:
+                continue
+            for inner in self.routes:
+                if inner is not outer and inner.prefix.startswith(outer.prefix) \
+                        and (inner.prefix != outer.prefix or inner.is_exact):
+                    conflicts.append(f"'{inner.pattern}' is shadowed by '{outer.pattern}'")
+        return conflicts
+
+    def check(self):
+        """
+        Validate the routing table
+
+        Raises:
+            ValueError: If a route is shadowed by another
+        """
+        conflicts = self.find_shadowed()
+        if conflicts:
+            raise ValueError("Conflicting callback routes:\n" + '\n'.join(conflicts))
+
+
+# Shared router the handler modules register with
+router = CallbackRouter()
@@ -0,0 +1,57 @@
+"""
+The private Telethon helpers the publisher builds raw requests with
+
+send_file/send_message take no random_id, so core/publisher.py builds
+SendMediaRequest/SendMultiMediaRequest itself with the same helpers
+they use internally. These are private TelegramClient methods and only
+known to work with the Telethon version pinned in requirements.txt
+(telethon==1.34.0). Every use goes through this module, and a Telethon
+without them fails here at import instead of on every publish.
+"""
+from typing import Any, List, Optional, Tuple
+import telethon
+from telethon import TelegramClient
+
+
+# Version the helpers below were written against (requirements.txt)
+PINNED_TELETHON = '1.34.0'
+
+_PRIVATE_METHODS = ('_parse_message_text', '_file_to_media', '_get_response_message')
+
+_missing = [name for name in _PRIVATE_METHODS if not hasattr(TelegramClient, name)]
+if _missing:
+    raise ImportError(
+        f"Telethon {telethon.__version__} has no TelegramClient.{', '.join(_missing)}; "
+        f"the publisher needs telethon=={PINNED_TELETHON} (see utils/telethon_compat.py)"
+    )
+if telethon.__version__ != PINNED_TELETHON:
+    print(f"⚠️ Telethon {telethon.__version__} is not the pinned {PINNED_TELETHON}; "
+          f"check utils/telethon_compat.py before publishing")
+
+
+async def parse_text(client: TelegramClient, text: str) -> Tuple[str, list]:
+    """Message text and entities, parsed with the client's parse mode"""
+    return await client._parse_message_text(text, ())
+
+
+async def input_media(client: TelegramClient, file: Any, supports_streaming: bool = True) -> Any:
+    """InputMedia of anything send_file accepts (uploads local files)"""
+    _, media, _ = await client._file_to_media(file, supports_streaming=supports_streaming)
+    return media
+
+
+def response_messages(client: TelegramClient, request: Any, result: Any, entity: Any,
+                      random_ids: Optional[List[int]] = None) -> list:
+    """
+    Sent messages of a request's result
+
+    Args:
+        request: The request sent (single message)
+        random_ids: random_ids of an album's items instead of a request
+
+    Returns:
+        List of messages (None for any that cannot be matched)
+    """
+    if random_ids is not None:
+        return client._get_response_message(random_ids, result, entity)
+    return [client._get_response_message(request, result, entity)]
@@ -1,114 +1,441 @@
 """
 Watermarking utility for images and videos
 """
+import asyncio
+import io
 import os
-import tempfile
-import subprocess
-from PIL import Image, ImageDraw, ImageFont, ImageEnhance
-from config import TARGET_CHANNEL_ID
+import time
+from functools import lru_cache
+import hashlib
+from dataclasses import dataclass
+from typing import Awaitable, BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+from PIL import Image, ImageDraw, ImageFont
+from config import (
+    TARGET_CHANNEL_ID, MEDIA_TEMP_DIR, VIDEO_ENCODE_WORKERS, VIDEO_ENCODE_TIMEOUT,
+    VIDEO_ENCODE_THREADS, VIDEO_PROFILE, VIDEO_WATERMARK_MODE
+)
+from utils.watermark_cache import cache_key, content_hash, watermark_cache
 
-def add_watermark_image(image_bytes: bytes, text: str = None) -> bytes:
+# Bump when the watermark output changes, so cached uploads are not reused
+WATERMARK_VERSION = 2
+
+
+def default_watermark_text() -> str:
+    """Watermark text derived from TARGET_CHANNEL_ID"""
+    text = str(TARGET_CHANNEL_ID).replace('-100', '').replace('-', '')
+    return f"@{text}" if not text.startswith('@') else text
+
+
+def watermark_key(kind: str, text: str = None) -> str:
+    """
+    Transform key of watermarked media (see core/media_cache.py)
+    
+    Args:
+        kind: 'image' or 'video'
+        text: Watermark text (defaults to TARGET_CHANNEL_ID)
+    """
+    key = f"watermark-{kind}:v{WATERMARK_VERSION}:{text or default_watermark_text()}"
+    if kind == 'video':
+        # Another profile or mode is another output
+        key += f":{VIDEO_PROFILE}:{VIDEO_WATERMARK_MODE}"
+    return key
+
+
+# Font of the watermark text (Pillow's default font if missing)
+FONT_PATH = "fonts/Vazir.ttf"
+# Text opacity (0-255) and distance from the bottom-right corner
+WATERMARK_ALPHA = 128
+WATERMARK_MARGIN = 20
+
+
+@lru_cache(maxsize=32)
+def get_font(size: int) -> ImageFont.ImageFont:
+    """Load the watermark font once per size"""
+    try:
+        return ImageFont.truetype(FONT_PATH, size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+@lru_cache(maxsize=64)
+def get_stamp(text: str, font_size: int) -> Image.Image:
+    """
+    Pre-rendered watermark text, cropped to its bounding box
+    
+    Cached per (text, font size); callers must not modify the result.
+    
+    Returns:
+        RGBA image of the text in white at WATERMARK_ALPHA
+    """
+    font = get_font(font_size)
+    left, top, right, bottom = font.getbbox(text)
+    stamp = Image.new("RGBA", (max(1, right - left), max(1, bottom - top)), (255, 255, 255, 0))
+    ImageDraw.Draw(stamp).text((-left, -top), text, font=font, fill=(255, 255, 255, WATERMARK_ALPHA))
+    return stamp
+
+
+def watermark_image(image: Image.Image, text: str = None) -> Image.Image:
+    """
+    Stamp the watermark on the bottom-right corner of an image, in place
+    
+    Only the stamp's box is converted and composited; the rest of the
+    image is untouched and keeps its mode (palette images become RGB).
+    
+    Args:
+        image: Image to stamp
+        text: Watermark text (defaults to TARGET_CHANNEL_ID)
+    
+    Returns:
+        The stamped image (a converted copy for modes other than RGB(A)/L(A))
+    """
+    if image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    
+    # Responsive font size
+    stamp = get_stamp(text or default_watermark_text(), max(1, image.height // 20))
+    x = max(0, image.width - stamp.width - WATERMARK_MARGIN)
+    y = max(0, image.height - stamp.height - WATERMARK_MARGIN)
+    box = (x, y, min(image.width, x + stamp.width), min(image.height, y + stamp.height))
+    if box[2] <= box[0] or box[3] <= box[1]:
+        return image
+    
+    region = image.crop(box).convert("RGBA")
+    region.alpha_composite(stamp.crop((0, 0, box[2] - x, box[3] - y)))
+    image.paste(region.convert(image.mode), box)
+    return image
+
+
+def add_watermark_image(image: Union[bytes, BinaryIO], text: str = None) -> Optional[bytes]:
     """
     Add transparent watermark to image
     
+    The same source and text again (a retry, a re-post) is served from
+    the watermark cache.
+    
     Args:
-        image_bytes: Input image bytes
+        image: Input image bytes, or a readable file object positioned at its start
         text: Watermark text (defaults to TARGET_CHANNEL_ID)
     
     Returns:
-        Watermarked image bytes
+        Watermarked JPEG bytes, or None if watermarking failed
     """
-    if not text:
-        text = str(TARGET_CHANNEL_ID).replace('-100', '').replace('-', '')
-        text = f"@{text}" if not text.startswith('@') else text
-        
+    key = None
+    if watermark_cache.enabled:
+        key = cache_key(content_hash(image), 'image', WATERMARK_VERSION, text or default_watermark_text())
+        cached = watermark_cache.get_bytes(key, '.jpg')
+        if cached is not None:
+            return cached
+    
     try:
-        # Open image
-        import io
-        base_image = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
-        
-        # Make a blank image for the text, initialized to transparent text color
-        txt = Image.new("RGBA", base_image.size, (255, 255, 255, 0))
-        
-        # Get a font
-        font_size = int(base_image.size[1] / 20) # Responsive font size
-        try:
-            # Try to load a font, otherwise default
-            font = ImageFont.truetype("fonts/Vazir.ttf", font_size)
-        except:
-            font = ImageFont.load_default()
+        with Image.open(io.BytesIO(image) if isinstance(image, bytes) else image) as source:
+            out = watermark_image(source, text)
+            if out.mode not in ("RGB", "L"):
+                # JPEG has no alpha channel
+                out = out.convert("RGB")
             
-        # Initialize ImageDraw
-        d = ImageDraw.Draw(txt)
-        
-        # Calculate text position (Center or Bottom Right)
-        # We'll go with bottom right with some padding
-        # bbox = d.textbbox((0, 0), text, font=font) # Python 3.10+
-        # width = bbox[2] - bbox[0]
-        # height = bbox[3] - bbox[1]
-        
-        # Compatibility with older Pillow
-        width, height = d.textsize(text, font=font)
-        
-        x = base_image.size[0] - width - 20
-        y = base_image.size[1] - height - 20
-        
-        # Draw text with transparency (White with alpha=128)
-        d.text((x, y), text, font=font, fill=(255, 255, 255, 128))
-        
-        # Overlay
-        out = Image.alpha_composite(base_image, txt)
-        
-        # Convert back to RGB
-        out = out.convert("RGB")
-        
-        # Save to bytes
-        output_buffer = io.BytesIO()
-        out.save(output_buffer, format="JPEG", quality=90)
-        return output_buffer.getvalue()
+            output_buffer = io.BytesIO()
+            out.save(output_buffer, format="JPEG", quality=90)
+            if key:
+                watermark_cache.put_bytes(key, '.jpg', output_buffer.getvalue())
+            return output_buffer.getvalue()
         
     except Exception as e:
         print(f"Watermark Error: {e}")
-        return image_bytes
+        return None
+
+
+# Receives (encoded_seconds, total_seconds); total is 0 if unknown
+VideoProgress = Callable[[float, float], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class VideoProfile:
+    """libx264 settings of a video watermark encode"""
+    preset: str
+    crf: int
+    # Videos taller than this are scaled down (None keeps the resolution)
+    max_height: Optional[int] = None
+    # Peak video bitrate, e.g. '2M' (None for pure CRF)
+    maxrate: Optional[str] = None
+
+
+# Trade quality for encode time; selected with VIDEO_PROFILE
+VIDEO_PROFILES = {
+    'fast': VideoProfile(preset='veryfast', crf=26, max_height=720, maxrate='2M'),
+    'balanced': VideoProfile(preset='faster', crf=23, max_height=1080, maxrate='4M'),
+    'quality': VideoProfile(preset='medium', crf=20),
+}
+
+# Watermark drawing: 'overlay' composites a pre-rendered PNG stamp (no
+# per-frame text shaping, no libfreetype needed), 'drawtext' renders text
+VIDEO_WATERMARK_MODES = ('overlay', 'drawtext')
+
+# Concurrent ffmpeg encodes; every video waits for a slot
+_encode_slots = asyncio.Semaphore(max(1, VIDEO_ENCODE_WORKERS))
+_probe: Optional[asyncio.Task] = None
+
+
+async def _run_quiet(*cmd: str) -> Optional[str]:
+    """Run a short command and return its stdout (None if it cannot run)"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+    except (FileNotFoundError, PermissionError):
+        return None
+    stdout, _ = await process.communicate()
+    return stdout.decode('utf-8', 'replace') if process.returncode == 0 else None
+
+
+async def _probe_ffmpeg() -> Dict[str, bool]:
+    filters = await _run_quiet('ffmpeg', '-hide_banner', '-filters')
+    return {
+        'ffmpeg': filters is not None,
+        'drawtext': filters is not None and ' drawtext ' in filters,
+        'ffprobe': await _run_quiet('ffprobe', '-version') is not None,
+    }
+
+
+async def ffmpeg_capabilities() -> Dict[str, bool]:
+    """
+    What the installed ffmpeg can do, probed once per process
+    
+    Returns:
+        Dict with 'ffmpeg', 'drawtext' (needs libfreetype) and 'ffprobe'
+    """
+    global _probe
+    if _probe is None:
+        _probe = asyncio.ensure_future(_probe_ffmpeg())
+    return await asyncio.shield(_probe)
+
+
+async def probe_video(video_path: str) -> Tuple[float, int, int]:
+    """
+    Duration and frame size of a video
+    
+    Returns:
+        Tuple of (seconds, width, height); zeros for what is unknown
+    """
+    if not (await ffmpeg_capabilities())['ffprobe']:
+        return 0.0, 0, 0
+    output = await _run_quiet(
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height:format=duration',
+        '-of', 'default=noprint_wrappers=1', video_path
+    )
+    values = dict(line.split('=', 1) for line in (output or '').splitlines() if '=' in line)
+
+    def number(key: str, cast):
+        try:
+            return cast(float(values.get(key, 0)))
+        except ValueError:
+            return cast(0)
+
+    return number('duration', float), number('width', int), number('height', int)
+
+
+def stamp_png(text: str, font_size: int) -> str:
+    """
+    The watermark stamp as a PNG file for ffmpeg's overlay filter
+    
+    Written once per (text, font size) to MEDIA_TEMP_DIR.
+    
+    Returns:
+        Path of the PNG
+    """
+    digest = hashlib.sha1(f"{WATERMARK_VERSION}:{text}:{font_size}".encode('utf-8')).hexdigest()[:16]
+    path = os.path.join(MEDIA_TEMP_DIR, f"stamp_{digest}.png")
+    if not os.path.exists(path):
+        os.makedirs(MEDIA_TEMP_DIR, exist_ok=True)
+        # Written under a temp name, so a concurrent encode never reads half a file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        get_stamp(text, font_size).save(temp_path, format='PNG')
+        os.replace(temp_path, path)
+    return path
+
+
+def _video_filter(profile: VideoProfile, mode: str, text: str, height: int) -> Tuple[List[str], str]:
+    """
+    ffmpeg inputs and filter graph of a watermark encode
+    
+    Args:
+        profile: Encode profile
+        mode: 'overlay' or 'drawtext'
+        text: Watermark text
+        height: Source height (0 if unknown)
+    
+    Returns:
+        Tuple of (extra input arguments, filter_complex graph ending in [v])
+    """
+    scale = ''
+    out_height = height
+    if profile.max_height and (not height or height > profile.max_height):
+        # -2 keeps the width even, as yuv420p needs
+        scale = f"scale=-2:'min({profile.max_height},ih)',"
+        out_height = profile.max_height
+
+    if mode == 'overlay':
+        stamp = stamp_png(text, max(1, (out_height or 720) // 20))
+        graph = f"[0:v]{scale}null[base];[base][1:v]overlay=W-w-{WATERMARK_MARGIN}:H-h-{WATERMARK_MARGIN}[v]"
+        return ['-i', stamp], graph
+
+    draw = (f"drawtext=text={_quote_drawtext(text)}:expansion=none:"
+            f"fontcolor=white@{WATERMARK_ALPHA / 255:.2f}:fontsize=h/20:x=w-tw-{WATERMARK_MARGIN}:y=h-th-{WATERMARK_MARGIN}")
+    return [], f"[0:v]{scale}{draw}[v]"
+
 
-def add_watermark_video(video_path: str, text: str = None) -> str:
+def _encode_args(profile: VideoProfile, threads: int) -> List[str]:
+    """libx264 output arguments of a profile"""
+    args = ['-c:v', 'libx264', '-preset', profile.preset, '-crf', str(profile.crf), '-pix_fmt', 'yuv420p']
+    if profile.maxrate:
+        # A buffer of two seconds at the peak rate
+        rate = profile.maxrate
+        value, unit = (rate[:-1], rate[-1]) if rate[-1].isalpha() else (rate, '')
+        args += ['-maxrate', rate, '-bufsize', f"{float(value) * 2:g}{unit}"]
+    if threads:
+        args += ['-threads', str(threads)]
+    # Audio is copied; the index moves to the front so Telegram can stream it
+    return args + ['-c:a', 'copy', '-movflags', '+faststart']
+
+
+def _quote_drawtext(text: str) -> str:
+    """Quote text for a drawtext option (a quote closes, escapes and reopens)"""
+    return "'" + text.replace("'", "'\\''") + "'"
+
+
+async def _read_progress(stream: asyncio.StreamReader, total: float,
+                         on_progress: Optional[VideoProgress]):
+    """Parse ffmpeg's -progress key=value lines"""
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        key, _, value = line.decode('ascii', 'replace').strip().partition('=')
+        # out_time_us (out_time_ms is also microseconds, despite the name)
+        if key == 'out_time_us' and on_progress and value.isdigit():
+            await on_progress(min(int(value) / 1_000_000, total) if total else int(value) / 1_000_000, total)
+
+
+async def add_watermark_video(video_path: str, text: str = None,
+                              on_progress: Optional[VideoProgress] = None,
+                              timeout: Optional[float] = None,
+                              profile: Optional[str] = None, mode: Optional[str] = None,
+                              threads: Optional[int] = None) -> Optional[str]:
     """
     Add watermark to video using ffmpeg
     
+    Runs ffmpeg as a subprocess without blocking the event loop, at most
+    VIDEO_ENCODE_WORKERS at a time. Cancelling the call kills ffmpeg.
+    Outputs are kept in the watermark cache, so the same video, text,
+    profile and mode again is a file link instead of an encode.
+    
     Args:
         video_path: Path to input video
         text: Watermark text
+        on_progress: Optional callback receiving encoded and total seconds
+        timeout: Seconds the encode may take (VIDEO_ENCODE_TIMEOUT by default)
+        profile: Name in VIDEO_PROFILES (VIDEO_PROFILE by default)
+        mode: 'overlay' or 'drawtext' (VIDEO_WATERMARK_MODE by default)
+        threads: Encoder threads, 0 for ffmpeg's choice (VIDEO_ENCODE_THREADS by default)
         
     Returns:
-        Path to output video (or input path if failed)
+        Path to output video, or None if ffmpeg is missing or failed
     """
-    # Check for ffmpeg
-    try:
-        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    except FileNotFoundError:
-        print("FFmpeg not found. Skipping video watermark.")
-        return video_path
+    profile = profile or VIDEO_PROFILE
+    if profile not in VIDEO_PROFILES:
+        profile = 'fast'
+    encode_profile = VIDEO_PROFILES[profile]
+    mode = mode or VIDEO_WATERMARK_MODE
+    if mode not in VIDEO_WATERMARK_MODES:
+        mode = 'overlay'
+
+    capabilities = await ffmpeg_capabilities()
+    if mode == 'drawtext' and capabilities['ffmpeg'] and not capabilities['drawtext']:
+        # ffmpeg without libfreetype can still overlay the PNG stamp
+        mode = 'overlay'
 
     if not text:
-        text = str(TARGET_CHANNEL_ID).replace('-100', '').replace('-', '')
-        text = f"@{text}" if not text.startswith('@') else text
-        
-    try:
-        output_path = video_path.replace('.mp4', '_watermarked.mp4')
-        
-        # FFmpeg command to add text watermark
+        text = default_watermark_text()
+    output_path = f"{os.path.splitext(video_path)[0]}_watermarked.mp4"
+
+    key = None
+    if watermark_cache.enabled:
+        # Hashing a large video is I/O bound; keep it off the event loop
+        source_hash = await asyncio.to_thread(content_hash, video_path)
+        key = cache_key(source_hash, 'video', WATERMARK_VERSION, text, profile, mode)
+        cached = watermark_cache.get(key, '.mp4')
+        if cached:
+            _remove(output_path)
+            watermark_cache.copy_to(cached, output_path)
+            print(f"🎬 Watermarked video from cache [{profile}, {mode}]")
+            return output_path
+
+    if not capabilities['ffmpeg']:
+        print("FFmpeg not found. Skipping video watermark.")
+        return None
+
+    timeout = timeout or VIDEO_ENCODE_TIMEOUT
+    threads = VIDEO_ENCODE_THREADS if threads is None else threads
+
+    async with _encode_slots:
+        total, _, height = await probe_video(video_path)
+        inputs, graph = _video_filter(encode_profile, mode, text, height)
+        # A leftover output may be a hard link into the cache; -y must not truncate that
+        _remove(output_path)
         cmd = [
-            'ffmpeg', '-y', '-i', video_path,
-            '-vf', f"drawtext=text='{text}':fontcolor=white@0.5:fontsize=h/20:x=w-tw-10:y=h-th-10",
-            '-c:a', 'copy', output_path
+            'ffmpeg', '-y', '-nostdin', '-hide_banner', '-loglevel', 'error',
+            '-progress', 'pipe:1', '-nostats', '-i', video_path, *inputs,
+            '-filter_complex', graph, '-map', '[v]', '-map', '0:a?',
+            *_encode_args(encode_profile, threads), output_path
         ]
-        
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        if os.path.exists(output_path):
-            return output_path
-        return video_path
-        
-    except Exception as e:
-        print(f"Video Watermark Error: {e}")
-        return video_path
+        started = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, stderr = await asyncio.wait_for(_communicate(process, total, on_progress), timeout=timeout)
+        except BaseException as e:
+            # Timeout, cancellation or a failing progress callback: stop ffmpeg
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            _remove(output_path)
+            if isinstance(e, asyncio.TimeoutError):
+                print(f"Video Watermark Error: ffmpeg timed out after {timeout:g}s")
+                return None
+            if isinstance(e, Exception):
+                print(f"Video Watermark Error: {e}")
+                return None
+            raise
+
+    if process.returncode != 0 or not os.path.exists(output_path):
+        print(f"Video Watermark Error: ffmpeg exited with {process.returncode}: "
+              f"{stderr.decode('utf-8', 'replace').strip()[-500:]}")
+        _remove(output_path)
+        return None
+
+    print(f"🎬 Watermarked video in {time.monotonic() - started:.1f}s"
+          + (f" ({total:.0f}s of video)" if total else "")
+          + f" [{profile}, {mode}]")
+    if key:
+        watermark_cache.put_file(key, '.mp4', output_path)
+    return output_path
+
+
+async def _communicate(process: asyncio.subprocess.Process, total: float,
+                       on_progress: Optional[VideoProgress]) -> Tuple[None, bytes]:
+    """Consume ffmpeg's progress and error output until it exits"""
+    _, stderr, _ = await asyncio.gather(
+        _read_progress(process.stdout, total, on_progress),
+        process.stderr.read(),
+        process.wait()
+    )
+    return None, stderr
+
+
+def _remove(path: str):
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError:
+        pass
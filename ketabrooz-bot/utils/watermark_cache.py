@@ -0,0 +1,183 @@
+"""
+Content-addressed cache of watermarked media
+
+Watermarking the same image or video again (a retry after a failed
+send, a re-post, another content using the same cover) gives the same
+output, so outputs are stored on disk under a key derived from the
+source's content hash and everything that affects the result (watermark
+text, WATERMARK_VERSION, video profile and mode).
+
+The directory is bounded by size: least recently used files are
+evicted first (a hit refreshes the file's mtime, which is the recency
+used across restarts).
+"""
+import hashlib
+import os
+import shutil
+import time
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+from config import WATERMARK_CACHE_DIR, WATERMARK_CACHE_MB
+
+
+def content_hash(source: Union[bytes, str, BinaryIO], chunk_size: int = 1024 * 1024) -> str:
+    """
+    SHA-256 of media content
+
+    Args:
+        source: Bytes, a file path, or a readable file object (read from
+            its start and rewound afterwards)
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, bytes):
+        digest.update(source)
+    elif isinstance(source, str):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    else:
+        source.seek(0)
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            digest.update(chunk)
+        source.seek(0)
+    return digest.hexdigest()
+
+
+def cache_key(source_hash: str, *params: object) -> str:
+    """Key of an output: source hash plus the parameters that shape it"""
+    return hashlib.sha256('\x1f'.join([source_hash, *map(str, params)]).encode('utf-8')).hexdigest()
+
+
+def _link_or_copy(source: str, target: str):
+    """Hard link (no copy of a large video) or, across filesystems, copy"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+class WatermarkCache:
+    """Size-bounded LRU directory of watermarked outputs"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        Initialize cache
+
+        Args:
+            directory: Where outputs are stored
+            max_bytes: Total size kept (0 disables the cache)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # name -> (size, last use); loaded from the directory on first use
+        self._entries: Optional[Dict[str, Tuple[int, float]]] = None
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _load(self) -> Dict[str, Tuple[int, float]]:
+        if self._entries is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._entries = {}
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    self._entries[entry.name] = (stat.st_size, stat.st_mtime)
+            self._total = sum(size for size, _ in self._entries.values())
+        return self._entries
+
+    def get(self, key: str, ext: str) -> Optional[str]:
+        """
+        Path of a cached output (None on a miss)
+
+        The file belongs to the cache: copy or link it, never move or delete it.
+        """
+        if not self.enabled:
+            return None
+        name = f"{key}{ext}"
+        entries = self._load()
+        path = os.path.join(self.directory, name)
+        if name not in entries or not os.path.exists(path):
+            if name in entries:
+                self._total -= entries.pop(name)[0]
+            self.misses += 1
+            return None
+
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        entries[name] = (entries[name][0], now)
+        self.hits += 1
+        return path
+
+    def get_bytes(self, key: str, ext: str) -> Optional[bytes]:
+        """Content of a cached output (None on a miss)"""
+        path = self.get(key, ext)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put_bytes(self, key: str, ext: str, data: bytes):
+        """Store an output"""
+        if self.enabled and len(data) <= self.max_bytes:
+            def write(temp_path: str):
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+            self._store(f"{key}{ext}", write)
+
+    def put_file(self, key: str, ext: str, path: str):
+        """Store an output file (the caller keeps and may delete its own path)"""
+        if self.enabled and os.path.getsize(path) <= self.max_bytes:
+            self._store(f"{key}{ext}", lambda temp_path: _link_or_copy(path, temp_path))
+
+    def copy_to(self, cached_path: str, target: str) -> str:
+        """Give the caller its own file for a cached output"""
+        _link_or_copy(cached_path, target)
+        return target
+
+    def _store(self, name: str, write):
+        entries = self._load()
+        path = os.path.join(self.directory, name)
+        # Written under a temp name, so readers never see half a file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            write(temp_path)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error caching watermark output: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        size = os.path.getsize(path)
+        if name in entries:
+            self._total -= entries[name][0]
+        entries[name] = (size, time.time())
+        self._total += size
+        self._evict()
+
+    def _evict(self):
+        """Remove least recently used outputs until the cache fits"""
+        if self._total <= self.max_bytes:
+            return
+        for name, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            del self._entries[name]
+            self._total -= size
+            if self._total <= self.max_bytes:
+                break
+
+
+watermark_cache = WatermarkCache(WATERMARK_CACHE_DIR, WATERMARK_CACHE_MB * 1024 * 1024)